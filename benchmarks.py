@@ -0,0 +1,347 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Directory of the project, where the modules to benchmark are stored.
+PROJECT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# File where the results of the suite are stored to detect regressions.
+BASELINES_FILE = os.path.join(PROJECT_DIRECTORY, "benchmark_baselines.json")
+
+# Number of times the bundled archive is replicated in the suite. Larger scales
+# (e.g. --scales 100, which needs several GB of memory) are only run on demand.
+SCALES = [1, 10]
+
+# Maximum time (in seconds) that importing each module in a fresh interpreter
+# should take. Short-lived workers pay this time on every spawn.
+IMPORT_BUDGETS = {"tennis_symbols": 0.02,
+                  "tennis_profiling": 0.02,
+                  "tennis_dates": 0.05,
+                  "tennis_rounds": 0.02,
+                  "tennis_queries": 0.05,
+                  "tennis_data_manipulation": 0.3,
+                  "tennis_data_reading": 0.3,
+                  "rankings": 0.3,
+                  "comparisons": 0.3,
+                  "ranking_metrics": 0.3,
+                  "tennis_filters": 0.3,
+                  "ranking_history": 0.3,
+                  "tennis_columnar": 0.3,
+                  "tennis_validation": 0.3,
+                  "win_probability": 0.3,
+                  "tennis_brackets": 0.3,
+                  "tennis_shards": 0.3,
+                  "upset_analytics": 0.3,
+                  "score_statistics": 0.3,
+                  "tennis_checkpoints": 0.3,
+                  "wta": 0.5}
+
+# Modules that should only be imported when they are actually used.
+LAZY_DEPENDENCIES = ["matplotlib"]
+
+def measure_import_time(module, repetitions = 5):
+    """
+    Assumes module is a string with the name of a module of the project, and
+    repetitions is a positive integer.
+    Imports the module in a new interpreter (so that nothing is cached) as many
+    times as repetitions.
+    Returns a dictionary with the minimum import time in seconds ("seconds") and
+    the list of lazy dependencies that were loaded by the import ("loaded").
+    """
+    code = ("import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import " + module + "\n"
+            "print(time.perf_counter() - start)\n"
+            "print(','.join(name for name in " + repr(LAZY_DEPENDENCIES) +
+            " if name in sys.modules))\n")
+    times = []
+    for repetition in range(repetitions):
+        output = subprocess.run([sys.executable, "-c", code], cwd = PROJECT_DIRECTORY,
+                                capture_output = True, text = True, check = True)
+        lines = output.stdout.strip().split("\n")
+        times.append(float(lines[0]))
+        loaded = [name for name in lines[1:] if name != ""]
+
+    return {"seconds": min(times), "loaded": loaded}
+
+def benchmark_startup(budgets = None, repetitions = 5):
+    """
+    Assumes budgets is a dictionary of module names and maximum import times in
+    seconds, which defaults to IMPORT_BUDGETS.
+    Measures the import time of each module and prints a report.
+    Returns a list with the modules that went over their budget or loaded a
+    lazy dependency (an empty list means the startup is within budget).
+    """
+    if budgets == None:
+        budgets = IMPORT_BUDGETS
+
+    failures = []
+    for module, budget in budgets.items():
+        result = measure_import_time(module, repetitions)
+        status = "ok"
+        if result["seconds"] > budget or result["loaded"] != []:
+            status = "OVER BUDGET"
+            failures.append(module)
+        print(module.ljust(28), str(round(result["seconds"] * 1000, 1)).rjust(8), "ms",
+              "(budget", str(round(budget * 1000)) + " ms)", status,
+              "loaded: " + ", ".join(result["loaded"]) if result["loaded"] else "")
+
+    return failures
+
+def write_scaled_archive(source_directory, target_directory, scale):
+    """
+    Assumes source_directory has csv files of WTA matches in '%YYYY.csv' format,
+    target_directory is an existing directory and scale is a positive integer.
+    Writes to target_directory the same csv files where each tournament appears
+    scale times in a row. Copy number n (from 1 on) appends " #n" to the names
+    of the tournament and the players, so that there are scale times as many
+    matches and players, and the rounds of each copy can still be inferred.
+    """
+    import tennis_data_reading as reading
+
+    for file in reading.get_csv_files_sorted(source_directory):
+        with open(file, newline = "") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = list(reader)
+
+        # Blocks of consecutive rows of the same tournament (name, start and end date).
+        blocks = []
+        for row in rows:
+            if blocks != [] and blocks[-1][0][:3] == row[:3]:
+                blocks[-1].append(row)
+            else:
+                blocks.append([row])
+
+        with open(os.path.join(target_directory, os.path.basename(file)), "w",
+                  newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for block in blocks:
+                for copy in range(scale):
+                    suffix = "" if copy == 0 else " #" + str(copy)
+                    for row in block:
+                        row = list(row)
+                        row[0] = row[0] + suffix
+                        row[4] = row[4].strip() + suffix
+                        row[5] = row[5].strip() + suffix
+                        if row[11].endswith("Retired"):
+                            row[11] = row[11].replace("Retired", "").strip() + suffix + " Retired"
+                        writer.writerow(row)
+
+def run_stage(name, function, n_rows, memory = True, repetitions = 3):
+    """
+    Assumes name is a string, function is a function without arguments and
+    n_rows is the number of matches the function processes. If n_rows is None,
+    the length of the result of the function is used (for the reading functions).
+    Runs the function up to repetitions times (while the runs take less than
+    two seconds in total) and keeps the fastest time, which is the least
+    affected by the load of the machine. If memory is True, it runs the function
+    once more with tracemalloc to measure its peak memory (tracing slows the
+    code down, so both measures are taken separately).
+    Returns the result of the function and a dictionary with the "stage",
+    "rows", "seconds", "rows_per_second" and "peak_memory_mb".
+    """
+    times = []
+    while len(times) < repetitions and sum(times) < 2:
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+
+    if n_rows == None:
+        n_rows = len(result)
+    peak_memory = None
+    if memory == True:
+        tracemalloc.start()
+        function()
+        peak_memory = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return result, {"stage": name,
+                    "rows": n_rows,
+                    "seconds": seconds,
+                    "rows_per_second": n_rows / seconds if seconds > 0 else float("inf"),
+                    "peak_memory_mb": peak_memory}
+
+def benchmark_archive(directory, memory = True):
+    """
+    Assumes directory has csv files of WTA matches in '%YYYY.csv' format
+    (the bundled data or a scaled archive).
+    Times ingestion, round inference, each query, the three rankings and the
+    comparison between the WTA and WbW rankings.
+    Returns a list with the dictionaries returned by run_stage.
+    """
+    import tennis_data_reading as reading
+    import tennis_rounds as rounds
+    import tennis_queries as queries
+    import rankings
+    import comparisons
+
+    results = []
+    files = reading.get_csv_files_sorted(directory)
+    largest_file = max(files, key = os.path.getsize)
+    results.append(run_stage("read_wta_csv", lambda: reading.read_wta_csv(largest_file),
+                             None, memory)[1])
+
+    matches, result = run_stage("read_append_all_csvs",
+                                lambda: reading.read_append_all_csvs(directory,
+                                                                     include_rounds = False),
+                                None, memory)
+    results.append(result)
+    n_rows = len(matches)
+
+    stages = [("add_round", lambda: rounds.add_round(matches)),
+              ("who_won", lambda: queries.who_won(matches, "US Open", 2021, "Final")),
+              ("who_vs_who", lambda: queries.who_vs_who(matches, "French Open", 2018,
+                                                        "Fourth Round")),
+              ("when_eliminated", lambda: queries.when_eliminated(matches, "Australian Open",
+                                                                  2011, "Williams V.")),
+              ("how_many_matches_played", lambda: queries.how_many_matches_played(
+                  matches, "Osaka N.", tournament_round = "Final")),
+              ("nr_duels_played_won", lambda: queries.nr_duels_played_won(
+                  matches, "Williams S.", "Williams V.")),
+              ("winners_win_ranking", lambda: rankings.winners_win_ranking(matches)),
+              ("winners_dont_lose_ranking", lambda: rankings.winners_dont_lose_ranking(matches)),
+              ("wbw_ranking", lambda: rankings.wbw_ranking(matches, year = 2021)),
+              ("compare_wta_wbw_rankings", lambda: comparisons.compare_wta_wbw_rankings(matches))]
+    for name, function in stages:
+        results.append(run_stage(name, function, n_rows, memory)[1])
+
+    return results
+
+def run_suite(scales = None, memory = True, synthetic = None):
+    """
+    Assumes scales is a list of positive integers (defaults to SCALES), and
+    synthetic is a list of numbers of tournaments per year (or None).
+    Runs benchmark_archive on the bundled data replicated by each scale and,
+    for each value of synthetic, on a synthetic archive of 15 years with that
+    many tournaments per year (see tennis_synthetic.write_synthetic_archive),
+    whose player pool grows with the number of tournaments.
+    Returns a dictionary of results, keyed by "scale/stage".
+    """
+    import tennis_synthetic as synthetic_archive
+
+    if scales == None:
+        scales = SCALES
+    if synthetic == None:
+        synthetic = []
+    data_directory = os.path.join(PROJECT_DIRECTORY, "data")
+
+    archives = [(str(scale) + "x", scale, None) for scale in scales]
+    archives += [("synthetic-" + str(n_tournaments), None, n_tournaments)
+                 for n_tournaments in synthetic]
+    suite = {}
+    for label, scale, n_tournaments in archives:
+        with tempfile.TemporaryDirectory() as directory:
+            if scale == 1:
+                directory = data_directory
+            elif scale != None:
+                write_scaled_archive(data_directory, directory, scale)
+            else:
+                synthetic_archive.write_synthetic_archive(
+                    directory, tournaments_per_year = n_tournaments,
+                    n_players = max(1000, n_tournaments * 20))
+            for result in benchmark_archive(directory, memory):
+                result["scale"] = label
+                suite[label + "/" + result["stage"]] = result
+                print_result(result)
+
+    return suite
+
+def print_result(result, baseline = None):
+    """
+    Assumes result is a dictionary as returned by run_stage (with its "scale"),
+    and baseline is the stored result of the same stage or None.
+    Prints one line of the report.
+    """
+    line = (str(result["scale"]).rjust(14) + " " + result["stage"].ljust(28) +
+            str(round(result["seconds"], 4)).rjust(10) + " s " +
+            str(int(result["rows_per_second"])).rjust(12) + " rows/s")
+    if result["peak_memory_mb"] != None:
+        line += str(round(result["peak_memory_mb"], 1)).rjust(10) + " MB"
+    if baseline != None:
+        line += "  (baseline " + str(round(baseline["seconds"], 4)) + " s)"
+    print(line)
+
+def compare_with_baselines(suite, tolerance = 0.25, file = BASELINES_FILE,
+                           min_seconds = 0.01):
+    """
+    Assumes suite is a dictionary as returned by run_suite, and tolerance is the
+    share of extra time allowed over the baseline.
+    Compares each stage with the baselines stored in file (stages without a
+    baseline, or whose baseline takes less than min_seconds and is mostly
+    noise, are skipped).
+    Returns a list with the keys of the stages that are slower than their
+    baseline by more than the tolerance.
+    """
+    if not os.path.exists(file):
+        print("There are no stored baselines in", file)
+        return []
+    with open(file) as f:
+        baselines = json.load(f)["results"]
+
+    regressions = []
+    for key, result in suite.items():
+        if key in baselines and baselines[key]["seconds"] >= min_seconds:
+            if result["seconds"] > baselines[key]["seconds"] * (1 + tolerance):
+                regressions.append(key)
+                print("REGRESSION", end = " ")
+                print_result(result, baselines[key])
+
+    return regressions
+
+def save_baselines(suite, file = BASELINES_FILE):
+    """
+    Assumes suite is a dictionary as returned by run_suite.
+    Stores it in file (as JSON) together with a description of the machine,
+    replacing the results of the same stages and keeping the rest.
+    """
+    baselines = {"results": {}}
+    if os.path.exists(file):
+        with open(file) as f:
+            baselines = json.load(f)
+    baselines["machine"] = {"python": platform.python_version(),
+                            "platform": platform.platform(),
+                            "processor": platform.machine()}
+    baselines["results"].update(suite)
+    with open(file, "w") as f:
+        json.dump(baselines, f, indent = 1, sort_keys = True)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Benchmarks of the WTA tennis software.")
+    parser.add_argument("--scales", type = int, nargs = "+", default = SCALES,
+                        help = "times the bundled archive is replicated")
+    parser.add_argument("--synthetic", type = int, nargs = "+", default = [],
+                        help = "tournaments per year of synthetic archives to benchmark")
+    parser.add_argument("--startup-only", action = "store_true",
+                        help = "only measure the import times")
+    parser.add_argument("--no-memory", action = "store_true",
+                        help = "skip the peak memory measures")
+    parser.add_argument("--save-baselines", action = "store_true",
+                        help = "store the results as the new baselines")
+    parser.add_argument("--tolerance", type = float, default = 0.25,
+                        help = "extra time allowed over the baselines")
+    arguments = parser.parse_args()
+
+    failures = benchmark_startup()
+    if arguments.startup_only == False:
+        suite = run_suite(arguments.scales, memory = not arguments.no_memory,
+                          synthetic = arguments.synthetic)
+        if arguments.save_baselines == True:
+            save_baselines(suite)
+        else:
+            failures += compare_with_baselines(suite, arguments.tolerance)
+
+    if failures != []:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
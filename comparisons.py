@@ -3,171 +3,447 @@ def main():
 
 import tennis_data_manipulation as manip
 import rankings
-import matplotlib.pyplot as plt
+import tennis_profiling as profiling
+import tennis_checkpoints as checkpoints
+# Matplotlib is imported inside the plotting functions, so that importing this
+# module to compute comparisons does not pay for it.
 import numpy as np
+from datetime import datetime as dt
+import os
 
+@profiling.profiled("get_first_appearances", profiling.count_first_argument)
+def get_first_appearances(matches, columns, year = 2008):
+    """
+    Assumes matches is a list of dictionaries, where each match is a dictionary,
+    and columns is the dictionary of arrays returned by
+    tennis_data_manipulation.get_match_columns for the same matches.
+    Year is an integer showing the beginning year from which comparisons will be made.
+
+    Finds the first appearance of each player in each tournament from the
+    beginning year on (tournaments splitted between the 31st of December and
+    the 1st of January count as one).
+    Returns a dictionary of arrays, with one value per appearance:
+        "player_id": the id of the player.
+        "wta_ranking": the WTA ranking of the player in that match.
+        "year": the year in which the tournament was played.
+        "tournament_id": the id of the tournament.
+        "group": a number identifying the tournament.
+        "ranking_key": the start date (ordinal) of the tournament for which the
+        ranking to compare with should be computed. It is -1 for the tournaments
+        that use the ranking of the previous year (those before the first change
+        of tournament).
+    """
+    in_year = columns["year"] == year
+    if not in_year.any():
+        raise ValueError("There are no matches in the beginning year.")
+    first_match = int(np.argmax(in_year))
+
+    tournament = columns["tournament_id"][first_match:]
+    start_ordinal = columns["start_ordinal"][first_match:]
+    n_matches = len(tournament)
+
+    # A block is a run of consecutive matches of the same tournament.
+    block_starts = np.flatnonzero(np.r_[True, tournament[1:] != tournament[:-1]])
+    block_lengths = np.diff(np.r_[block_starts, n_matches])
+
+    # First we walk through the blocks (not the matches) to decide, for each
+    # block, which group of players it belongs to (the players of a group are
+    # only counted the first time they appear) and which ranking it uses.
+    # Tournaments splitted between the 31st of December and the 1st of January
+    # recover the group and ranking of their first part.
+    tournament_list = tournament.tolist()
+    start_list = start_ordinal.tolist()
+    is_year_start = columns["is_year_start"][first_match:].tolist()
+    is_year_end = columns["is_year_end"][first_match:].tolist()
+    ranking_key = -1
+    group = 0
+    n_groups = 1
+    split_info = {}
+    block_groups = [group]
+    block_rankings = [ranking_key]
+    for start in block_starts[1:].tolist():
+        previous = start - 1
+        if is_year_end[previous]:
+            split_info[tournament_list[previous]] = (ranking_key, group)
+
+        if tournament_list[start] in split_info and is_year_start[start]:
+            ranking_key, group = split_info.pop(tournament_list[start])
+        else:
+            # Tournaments sharing the start date share the ranking.
+            if start_list[start] != start_list[previous]:
+                ranking_key = start_list[start]
+            group = n_groups
+            n_groups += 1
+
+        # After the first of January, tournaments cannot be splitted.
+        start_date = matches[first_match + start]["start_date"]
+        if start_date.day >= 2 and start_date.month != 12 and split_info != {}:
+            split_info = {}
+
+        block_groups.append(group)
+        block_rankings.append(ranking_key)
+
+    # Then we keep the first appearance of each player in each group, in the
+    # same order in which the players appear (player 1 before player 2).
+    players = np.column_stack([columns["player_1_id"][first_match:],
+                               columns["player_2_id"][first_match:]]).ravel()
+    wta_ranking = np.column_stack([columns["rank_1"][first_match:],
+                                   columns["rank_2"][first_match:]]).ravel()
+    player_group = np.repeat(np.repeat(block_groups, block_lengths), 2)
+    player_ranking = np.repeat(np.repeat(block_rankings, block_lengths), 2)
+    player_year = np.repeat(columns["year"][first_match:], 2)
+
+    n_players = int(players.max()) + 1
+    first_appearance = np.unique(player_group * n_players + players, return_index = True)[1]
+    first_appearance.sort()
+
+    return {"player_id": players[first_appearance],
+            "wta_ranking": wta_ranking[first_appearance],
+            "year": player_year[first_appearance],
+            "tournament_id": np.repeat(tournament, 2)[first_appearance],
+            "group": player_group[first_appearance],
+            "ranking_key": player_ranking[first_appearance]}
+
+def save_snapshot_checkpoint(file, parameters, snapshots):
+    """
+    Assumes file is the path of a '.npz' file, parameters is the dictionary of
+    the arguments of get_snapshot_rankings and snapshots is a dictionary keyed
+    by ranking key with the (players, scores, ranks) arrays of the rankings
+    computed since the last save.
+    Appends the snapshots (the players by name) as a new chunk of the checkpoint
+    (see tennis_checkpoints.save_checkpoint).
+    """
+    keys = list(snapshots)
+    players = [snapshots[key][0] for key in keys]
+    names, name_index = checkpoints.encode_players(np.concatenate(players) if keys != []
+                                                   else np.array([], dtype = np.int64))
+    checkpoints.save_checkpoint(file, parameters, {
+        "keys": np.array(keys, dtype = np.int64),
+        "row_key": np.repeat(np.array(keys, dtype = np.int64),
+                             [len(key_players) for key_players in players]),
+        "names": names, "name_index": name_index,
+        "score": np.concatenate([snapshots[key][1] for key in keys] + [np.array([])]),
+        "rank": np.concatenate([snapshots[key][2] for key in keys] +
+                               [np.array([], dtype = np.int64)])}, append = True)
+
+def load_snapshot_checkpoint(file, parameters):
+    """
+    Assumes file is None or the path of a checkpoint written by
+    save_snapshot_checkpoint (or of a file not written yet).
+    Returns the dictionary of the snapshots stored (empty if there is none).
+    """
+    chunks = checkpoints.load_checkpoint(file, parameters)
+    snapshots = {}
+    for chunk in chunks if chunks != None else []:
+        # The rows are grouped by key once, instead of comparing them with each key.
+        order = np.argsort(chunk["row_key"], kind = "stable")
+        row_key = chunk["row_key"][order]
+        players = checkpoints.decode_players(chunk["names"], chunk["name_index"])[order]
+        score = chunk["score"][order]
+        rank = chunk["rank"][order]
+        keys = chunk["keys"]
+        starts = np.searchsorted(row_key, keys).tolist()
+        ends = np.searchsorted(row_key, keys, side = "right").tolist()
+        for key, start, end in zip(keys.tolist(), starts, ends):
+            snapshots[key] = (players[start:end], score[start:end], rank[start:end])
+
+    return snapshots
+
+@profiling.profiled("get_snapshot_rankings", profiling.count_result)
+def get_snapshot_rankings(columns, player_ids, ranking_keys, year = 2008, n_weeks = 52,
+                          epsilon = 1e-4, ranking = "wbw", round_numbers = None,
+                          checkpoint = None, checkpoint_every = 20):
+    """
+    Assumes columns is the dictionary of arrays returned by
+    tennis_data_manipulation.get_match_columns, and player_ids and ranking_keys
+    are arrays of the same length as returned by get_first_appearances.
+    Year, n_weeks and epsilon work as in compare_wta_wbw_rankings.
+    Ranking can take three values: "winners_win", "winners_dont_lose" and "wbw".
+    Round_numbers (see rankings.get_round_numbers) is needed for "winners_dont_lose".
+
+    Computes each ranking once per ranking key (over the n_weeks before that
+    start date, or over the previous year for the key -1) and joins it with the
+    players. Returns a float array with the ranking of each player, or NaN if
+    the player was not ranked.
+
+    If checkpoint is the path of a '.npz' file, the snapshots computed are saved
+    to it every checkpoint_every ranking keys and at the end (see
+    save_snapshot_checkpoint), and the snapshots already in it are not computed
+    again, so that a long run killed midway resumes where it stopped. The
+    checkpoint is only resumed for the same arguments and matches (see
+    tennis_checkpoints.get_data_fingerprint).
+    """
+    if ranking not in ["winners_win", "winners_dont_lose", "wbw"]:
+        raise ValueError("Ranking should be winners_win, winners_dont_lose or wbw.")
+    if ranking == "winners_dont_lose" and round_numbers is None:
+        raise ValueError("Round_numbers are needed for the winners don't lose ranking.")
+
+    def compute_ranking(**window):
+        if ranking == "winners_win":
+            return rankings.winners_win_ranking_arrays(columns, **window)
+        elif ranking == "winners_dont_lose":
+            return rankings.winners_dont_lose_ranking_arrays(columns, round_numbers, **window)
+        elif "year" in window:
+            return rankings.wbw_ranking_arrays(columns, epsilon = epsilon, **window)
+        else:
+            return rankings.wbw_ranking_arrays(columns, **window)
+
+    # The table of rankings is stored as sorted (ranking key, player) codes.
+    n_players = int(columns["player_1_id"].max(initial = 0)) + 1
+    n_players = max(n_players, int(columns["player_2_id"].max(initial = 0)) + 1)
+    unique_keys = np.unique(ranking_keys)
+    parameters = {"ranking": ranking, "year": year, "n_weeks": n_weeks, "epsilon": epsilon}
+    if checkpoint != None:
+        parameters["data"] = checkpoints.get_data_fingerprint(columns)
+    snapshots = load_snapshot_checkpoint(checkpoint, parameters)
+    unsaved = {}
+    n_computed = 0
+    table_codes = [np.array([], dtype = np.int64)]
+    table_rankings = [np.array([], dtype = np.int64)]
+    for n_key, key in enumerate(unique_keys.tolist()):
+        if key not in snapshots:
+            if key == -1:
+                snapshots[key] = compute_ranking(year = year - 1)
+            else:
+                snapshots[key] = compute_ranking(weeks = n_weeks,
+                                                 start_date = dt.fromordinal(key))
+            unsaved[key] = snapshots[key]
+            n_computed += 1
+            if checkpoint != None and n_computed % checkpoint_every == 0:
+                save_snapshot_checkpoint(checkpoint, parameters, unsaved)
+                unsaved = {}
+        ranked, _, ranks = snapshots[key]
+        table_codes.append(n_key * n_players + ranked)
+        table_rankings.append(ranks)
+    if checkpoint != None and unsaved != {}:
+        save_snapshot_checkpoint(checkpoint, parameters, unsaved)
+
+    table_codes = np.concatenate(table_codes)
+    table_rankings = np.concatenate(table_rankings).astype(float)
+    if len(table_codes) == 0:
+        return np.full(len(player_ids), np.nan)
+    order = np.argsort(table_codes)
+    table_codes = table_codes[order]
+    table_rankings = table_rankings[order]
+
+    codes = np.searchsorted(unique_keys, ranking_keys) * n_players + player_ids
+    positions = np.minimum(np.searchsorted(table_codes, codes), len(table_codes) - 1)
+    found = table_codes[positions] == codes
+
+    return np.where(found, table_rankings[positions], np.nan)
+
+@profiling.profiled("compare_wta_wbw_rankings", profiling.count_first_argument)
 def compare_wta_wbw_rankings(matches, year = 2008, n_weeks = 52,
-                             epsilon = 1e-4):
+                             epsilon = 1e-4, checkpoint = None, checkpoint_every = 20):
     """
     Assumes matches is a list of dictionaries, where each match is a dictionary.
     Year is an integer showing the beginning year from which comparisons will be made.
     N_weeks is an integer showing the number of weeks before the start date of
     a tournament that will be used to calculate the wbw ranking.
-    Epsilon sets the criterion for convergence on the underlying wbw ranking
-    algorithm. If it is set higher, the comparison finishes earlier.
+    Epsilon sets the criterion for convergence of the wbw ranking of the year
+    previous to the beginning year, which is used for the first tournament.
 
     This function compares the rankings of players as calculated by the WTA
     with the WbW rankings taking into account the tournaments ended in the
-    52 weeks previous to the start of a tournament. If the player had not played in the
-    previous years, it sets its ranking to NaN.
-    It returns a dictionary with three lists,
+    n_weeks previous to the start of a tournament. If the player had not played in the
+    previous weeks, it sets its ranking to NaN.
+    It returns a dictionary with three NumPy arrays,
     two of them show the WbW and the WTA rankings of each player for each tournament.
-    The third list shows the year in which the tournament was played.
-    """
-    # Here we count the matches to begin with the first match of the desired year.
-    # The n_match of the whole dataset.
-    n_match = 0
-    for match in matches:
-        if match["start_date"].date().year == year:
-            break
-        n_match += 1
-
-    previous_tournament = matches[n_match]["tournament"]
-    previous_start_date = matches[n_match]["start_date"]
-    previous_end_date = matches[n_match]["end_date"]
-    updated_ranking = rankings.wbw_ranking(matches, year = year - 1, epsilon = epsilon)[1]
-
-    # This will serve as a basis for the comparisons between the WTA ranking and the WbW ranking.
-    # Players_included will be a dictionary that stores the players that have been
-    # already taken into account in the current tournament (so that we only record
-    # the first time they appear in each tournament).
-    comparison_dict = {"players_included": {},
-                       "wta_ranking": [],
-                       "wbw_ranking": [],
-                       "year": []}
-
-    # This dictionary is used to store information about players included in a
-    # possibly splitted tournament.
-    split_info = {}
+    The third array shows the year in which the tournament was played.
+    Checkpoint and checkpoint_every work as in get_snapshot_rankings.
+    """
+    columns = manip.get_match_columns(matches)
+    appearances = get_first_appearances(matches, columns, year = year)
+    wbw_ranking = get_snapshot_rankings(columns, appearances["player_id"],
+                                        appearances["ranking_key"], year = year,
+                                        n_weeks = n_weeks, epsilon = epsilon,
+                                        checkpoint = checkpoint,
+                                        checkpoint_every = checkpoint_every)
+
+    return {"wta_ranking": appearances["wta_ranking"],
+            "wbw_ranking": wbw_ranking,
+            "year": appearances["year"]}
 
-    for match in matches[n_match:]:
-        # If the current tournament is different from the previous one, we check whether
-        # it might be splitted, whether we should retrieve info from a splitted tournament,
-        # or if simply we should update the rankings for previous tournaments.
-        # Else: We assume we continue with the same tournament, and use the
-        # players already included in the dictionary.
-        if match["tournament"] != previous_tournament:
-            # We store the information of possible splitted tournaments.
-            if manip.get_day_month(previous_end_date) == [31, 12]:
-                split_info[previous_tournament] = {}
-                split_info[previous_tournament]["ranking_used"] = updated_ranking
-                split_info[previous_tournament]["players_included"] = comparison_dict["players_included"]
-
-            # If it is a splitted tournament, we retrieve its information and delete it.
-            if (match["tournament"] in split_info
-            and manip.get_day_month(match["start_date"]) == [1, 1]):
-                updated_ranking = split_info[match["tournament"]]["ranking_used"]
-                comparison_dict["players_included"] = split_info[match["tournament"]]["players_included"]
-                del split_info[match["tournament"]]
-
-
-            # Any other different non_splitted tournament should update the ranking
-            # (only if it does not share the same start_date) and renew the
-            # players whose rankings should be taken into account.
-            else:
-                if match["start_date"] != previous_start_date:
-                    updated_ranking = rankings.wbw_ranking(matches, weeks = 52, start_date = match["start_date"])[1]
-                    comparison_dict["players_included"] = {}
-                else:
-                    comparison_dict["players_included"] = {}
-
-            # After the first of January, tournaments cannot be splitted. Hence,
-            # if there is any remaining information about splitted tournaments,
-            # it should be eliminated. (.month != 12 to avoid splitted tournaments)
-            # info to be destroyed in December.
-            if (match["start_date"].day >= 2 and match["start_date"].month != 12
-            and split_info != {}):
-                split_info = {}
-
-        # Until we do not change tournament, we continue adding to the list
-        # rankings from players that have not appeared in this tournament.
-        if match["player_1"] not in comparison_dict["players_included"]:
-            comparison_dict["players_included"][match["player_1"]] = []
-            comparison_dict["wta_ranking"].append(match["rank_1"])
-            comparison_dict["year"].append(match["start_date"].date().year)
-            # Check if the player has played in the last year.
-            if match["player_1"] in updated_ranking:
-                comparison_dict["wbw_ranking"].append(updated_ranking[match["player_1"]][1])
-            # Otherwise: NaN.
-            else:
-                comparison_dict["wbw_ranking"].append(np.nan)
-
-        if match["player_2"] not in comparison_dict["players_included"]:
-            comparison_dict["players_included"][match["player_2"]] = []
-            comparison_dict["wta_ranking"].append(match["rank_2"])
-            comparison_dict["year"].append(match["start_date"].date().year)
-            if match["player_2"] in updated_ranking:
-                comparison_dict["wbw_ranking"].append(updated_ranking[match["player_2"]][1])
-            else:
-                comparison_dict["wbw_ranking"].append(np.nan)
 
-        # Finally, we set the information to be compared for the next match.
-        previous_tournament = match["tournament"]
-        previous_start_date = match["start_date"]
-        previous_end_date   = match["end_date"]
+def get_comparison_grid(wta_ranking_list, wbw_ranking_list, year, bin_size = 10,
+                        max_ranking = 350):
+    """
+    Assumes wta_ranking_list, wbw_ranking_list and year are lists (or arrays) of
+    the same length, as returned by compare_wta_wbw_rankings.
+    Bin_size is the width of each bin of rankings and max_ranking the highest
+    ranking included (pairs where one ranking is NaN or higher are left out).
+
+    Pre-aggregates the pairs of rankings into a grid of counts per year, so that
+    plotting does not depend on the number of pairs.
+    Returns a dictionary with the "years" (array), the "edges" of the bins (array)
+    and the "counts" (array of shape (years, WbW bins, WTA bins)).
+    """
+    wta_ranking = np.asarray(wta_ranking_list, dtype = float)
+    wbw_ranking = np.asarray(wbw_ranking_list, dtype = float)
+    year = np.asarray(year)
+    valid = ((wta_ranking <= max_ranking) & (wbw_ranking <= max_ranking))
+    years, year_index = np.unique(year[valid], return_inverse = True)
+
+    n_bins = int(np.ceil(max_ranking / bin_size)) + 1
+    wta_bin = (wta_ranking[valid] // bin_size).astype(np.int64)
+    wbw_bin = (wbw_ranking[valid] // bin_size).astype(np.int64)
+    codes = (year_index.ravel() * n_bins + wbw_bin) * n_bins + wta_bin
+    counts = np.bincount(codes, minlength = len(years) * n_bins * n_bins)
 
-    # After the loop we delete the sub-dictionary that stored information about
-    # the players included in the current tournament.
-    del comparison_dict["players_included"]
+    return {"years": years,
+            "edges": np.arange(n_bins + 1) * bin_size,
+            "counts": counts.reshape(len(years), n_bins, n_bins)}
 
-    return comparison_dict
+def draw_comparison_density(ax, wta_ranking_list, wbw_ranking_list, mode = "hexbin",
+                            gridsize = 50, grid = None, n_year = 0):
+    """
+    Assumes ax is a matplotlib Axes and wta_ranking_list and wbw_ranking_list
+    are lists (or arrays) of the same length.
+    Mode can take two values:
+        "hexbin": draws a hexagonal binning of the pairs, with gridsize hexagons
+        in the x axis.
+        "grid": draws the counts of a pre-aggregated grid (see get_comparison_grid).
+        If grid is None, it is computed from the lists. N_year is the position
+        of the year to draw in the grid.
+    Both modes use a logarithmic color scale.
+    Returns the artist drawn, to be used for the colorbar.
+    """
+    from matplotlib.colors import LogNorm
 
+    if mode == "hexbin":
+        wta_ranking = np.asarray(wta_ranking_list, dtype = float)
+        wbw_ranking = np.asarray(wbw_ranking_list, dtype = float)
+        valid = ~np.isnan(wta_ranking) & ~np.isnan(wbw_ranking)
+        return ax.hexbin(wta_ranking[valid], wbw_ranking[valid], gridsize = gridsize,
+                         bins = "log", mincnt = 1)
+    elif mode == "grid":
+        if grid == None:
+            grid = get_comparison_grid(wta_ranking_list, wbw_ranking_list,
+                                       np.zeros(len(wta_ranking_list)))
+        counts = np.ma.masked_equal(grid["counts"][n_year], 0)
+        return ax.pcolormesh(grid["edges"], grid["edges"], counts,
+                             norm = LogNorm(vmin = 1))
+    else:
+        raise ValueError("Mode should be hexbin or grid.")
 
-def plot_comparison_wbw_wta(wta_ranking_list, wbw_ranking_list, year, rescale = False):
+def set_comparison_labels(ax, title):
+    """
+    Assumes ax is a matplotlib Axes and title is a string.
+    Adds the perfect fit line, the labels and the title used by the comparison plots.
+    """
+    # We add a line to compare what would be a perfect fit.
+    ax.plot([0, 350], [0, 350], color = "k", alpha = 0.5)
+    ax.set_xlabel("WTA ranking", fontsize = 16)
+    ax.set_ylabel("WbW ranking (52 weeks before the start of the tournament)",
+                  fontsize = 16)
+    ax.set_title(title, fontsize = 18)
+    ax.tick_params(labelsize = 14)
+
+def plot_comparison_wbw_wta(wta_ranking_list, wbw_ranking_list, year, rescale = False,
+                            mode = "scatter", gridsize = 50, output_file = None):
     """
     Assumes wta_ranking_list, wbw_ranking_list and year are lists of the same length.
     Wta_ranking_list should represent the WbW and the WTA rankings of each player for each tournament.
     The year list shows the year in which the tournament was played.
     Rescale is an argument used to set a different x axis and y axis range. If set to True
     it makes both axis the same length.
-    Plots a scatterplot where of WbW against WTA, assigning a color to the year in
-    which the tournament was played.
+    Mode can take three values:
+        "scatter": plots a scatterplot of WbW against WTA, assigning a color to
+        the year in which the tournament was played.
+        "hexbin" and "grid": plot the density of the pairs (see
+        draw_comparison_density), which is much faster and more readable when
+        there are hundreds of thousands of pairs. The years are pooled together.
+    Gridsize is the number of hexagons in the x axis in "hexbin" mode.
+    If output_file (a string with the path of the file) is given, the plot is
+    saved there instead of being shown.
     """
-    # Source for the use of the legend:
+    # Source for the use of the legend:
     # https://matplotlib.org/stable/gallery/lines_bars_and_markers/scatter_with_legend.html
     # On changing the legend title font size:
-    # https://stackoverflow.com/questions/12402561/how-to-set-font-size-of-matplotlib-axis-legend
+    # https://stackoverflow.com/questions/12402561/how-to-set-font-size-of-matplotlib-axis-legend
+    if mode not in ["scatter", "hexbin", "grid"]:
+        raise ValueError("Mode should be scatter, hexbin or grid.")
+
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize = [15, 10])
-    scatter = plt.scatter(x = wta_ranking_list,
-                          y = wbw_ranking_list,
-                          c = year,
-                          alpha = 0.7)
+    if mode == "scatter":
+        scatter = plt.scatter(x = wta_ranking_list,
+                              y = wbw_ranking_list,
+                              c = year,
+                              alpha = 0.7)
 
-    # We add a line to compare what would be a perfect fit.
-    plt.plot([i for i in range(350)],
-             [i for i in range(350)],
-             color = "k",
-             alpha = 0.5)
-
-    legend = plt.legend(*scatter.legend_elements(),
-                        loc = (1.04, 0),
-                        title = "Year of the tournament",
-                        fontsize = 14)
-    legend.get_title().set_fontsize("14")
-    plt.xlabel("WTA ranking",
-               fontsize = 16)
-    plt.ylabel("WbW ranking (52 weeks before the start of the tournament)",
-               fontsize = 16)
-    plt.title(("A comparison of the WTA and WbW rankings for each player per tournament\n\
-    Black line shows a hypothetical perfect fit between WTA and WbW rankings"),
-              fontsize = 18)
-    plt.xticks(fontsize = 14)
-    plt.yticks(fontsize = 14)
+        legend = plt.legend(*scatter.legend_elements(),
+                            loc = (1.04, 0),
+                            title = "Year of the tournament",
+                            fontsize = 14)
+        legend.get_title().set_fontsize("14")
+    else:
+        density = draw_comparison_density(plt.gca(), wta_ranking_list, wbw_ranking_list,
+                                          mode = mode, gridsize = gridsize)
+        plt.colorbar(density).set_label("Number of players", fontsize = 14)
+
+    set_comparison_labels(plt.gca(),
+                          ("A comparison of the WTA and WbW rankings for each player per tournament\n\
+    Black line shows a hypothetical perfect fit between WTA and WbW rankings"))
     if rescale == True:
         plt.xlim(-5, 360)
         plt.ylim(-5, 360)
 
-    plt.show()
+    if output_file == None:
+        plt.show()
+    else:
+        plt.savefig(output_file)
+        plt.close()
+
+def plot_comparisons_by_year(wta_ranking_list, wbw_ranking_list, year, directory,
+                             mode = "grid", gridsize = 50, file_format = "png"):
+    """
+    Assumes wta_ranking_list, wbw_ranking_list and year are lists (or arrays) of
+    the same length, as returned by compare_wta_wbw_rankings, and directory is
+    the path of an existing directory.
+    Mode ("grid" or "hexbin") and gridsize work as in draw_comparison_density.
+
+    Saves one density plot per year in directory, named
+    'comparison_%YYYY.file_format'. The figures are created without pyplot, so
+    it works on servers without a display and does not open any window.
+    Returns a list with the paths of the files written.
+    """
+    if mode not in ["hexbin", "grid"]:
+        raise ValueError("Mode should be hexbin or grid.")
+
+    from matplotlib.figure import Figure
+
+    year = np.asarray(year)
+    wta_ranking = np.asarray(wta_ranking_list, dtype = float)
+    wbw_ranking = np.asarray(wbw_ranking_list, dtype = float)
+    # In grid mode the counts of every year are aggregated in a single pass.
+    if mode == "grid":
+        grid = get_comparison_grid(wta_ranking, wbw_ranking, year)
+        years = grid["years"].tolist()
+    else:
+        grid = None
+        years = np.unique(year).tolist()
+
+    files = []
+    for n_year, current_year in enumerate(years):
+        figure = Figure(figsize = [15, 10])
+        ax = figure.subplots()
+        in_year = year == current_year
+        density = draw_comparison_density(ax, wta_ranking[in_year], wbw_ranking[in_year],
+                                          mode = mode, gridsize = gridsize,
+                                          grid = grid, n_year = n_year)
+        figure.colorbar(density, ax = ax).set_label("Number of players", fontsize = 14)
+        set_comparison_labels(ax, "A comparison of the WTA and WbW rankings for each "
+                                  "player per tournament in " + str(current_year))
+        ax.set_xlim(-5, 360)
+        ax.set_ylim(-5, 360)
+
+        file = os.path.join(directory, "comparison_" + str(current_year) + "." + file_format)
+        figure.savefig(file)
+        files.append(file)
+
+    return files
 
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+def main():
+    print("Ranking history module")
+
+from datetime import datetime as dt, timedelta
+import numpy as np
+import tennis_checkpoints as checkpoints
+import tennis_symbols as symbols
+import rankings
+
+# A ranking history stores many ranking snapshots (snapshot date x player ->
+# score, rank) as flat columns sorted by player and date, so that the history
+# of a player is a contiguous slice found through the "player_start" index.
+HISTORY_COLUMNS = {"ordinal": np.int32, "player_id": np.int32, "score": np.float64,
+                   "rank": np.int32}
+
+def new_history(ranking = "wbw"):
+    """
+    Assumes ranking is a string describing the ranking stored (e.g. "wbw").
+    Returns an empty ranking history: a dictionary with the "ranking", the
+    "columns" (arrays "ordinal", "player_id", "score" and "rank", sorted by
+    player and date), the "player_start" index (the rows of player i are
+    player_start[i]:player_start[i + 1]), the "date_order" of the rows (to find
+    the snapshot of a date) and the "pending" snapshots not compacted yet.
+    """
+    return {"ranking": ranking,
+            "columns": {column: np.array([], dtype = dtype)
+                        for column, dtype in HISTORY_COLUMNS.items()},
+            "player_start": np.zeros(1, dtype = np.int64),
+            "date_order": np.array([], dtype = np.int64),
+            "pending": []}
+
+def add_snapshot(history, date, players, scores, ranks):
+    """
+    Assumes history is a ranking history, date is a datetime and players,
+    scores and ranks are the arrays returned by the array rankings (e.g.
+    rankings.wbw_ranking_arrays).
+    Adds the snapshot to the pending ones; compact_history must be called (it is
+    called by the queries) before querying it. A snapshot of a date already
+    stored replaces the previous one.
+    """
+    n_players = len(players)
+    history["pending"].append({"ordinal": np.full(n_players, date.toordinal()),
+                               "player_id": np.asarray(players),
+                               "score": np.asarray(scores),
+                               "rank": np.asarray(ranks)})
+
+def compact_history(history):
+    """
+    Assumes history is a ranking history.
+    Merges the pending snapshots into the columns and rebuilds the indexes.
+    """
+    if history["pending"] == []:
+        return
+
+    pending_ordinals = np.unique(np.concatenate([snapshot["ordinal"]
+                                                 for snapshot in history["pending"]]))
+    # Snapshots of dates already stored replace the old rows.
+    kept = ~np.isin(history["columns"]["ordinal"], pending_ordinals)
+    columns = {}
+    for column, dtype in HISTORY_COLUMNS.items():
+        columns[column] = np.concatenate([history["columns"][column][kept]] +
+                                         [snapshot[column].astype(dtype)
+                                          for snapshot in history["pending"]])
+    history["pending"] = []
+
+    # If the same date was added twice in the pending snapshots, the last one is kept.
+    n_rows = len(columns["ordinal"])
+    order = np.lexsort((-np.arange(n_rows), columns["ordinal"], columns["player_id"]))
+    columns = {column: values[order] for column, values in columns.items()}
+    repeated = np.r_[False, (columns["player_id"][1:] == columns["player_id"][:-1]) &
+                            (columns["ordinal"][1:] == columns["ordinal"][:-1])]
+    history["columns"] = {column: values[~repeated] for column, values in columns.items()}
+
+    player_ids = history["columns"]["player_id"]
+    history["player_start"] = np.searchsorted(player_ids,
+                                              np.arange(player_ids.max(initial = -1) + 2))
+    history["date_order"] = np.argsort(history["columns"]["ordinal"], kind = "stable")
+
+def get_dates(history):
+    """
+    Assumes history is a ranking history.
+    Returns the list of the dates (datetimes) of the snapshots stored.
+    """
+    compact_history(history)
+
+    ordinals = np.unique(history["columns"]["ordinal"]).tolist()
+
+    return [dt.fromordinal(ordinal) for ordinal in ordinals]
+
+def get_player_history(history, player, first_date = None, last_date = None):
+    """
+    Assumes history is a ranking history, player is the name of a player and
+    first_date and last_date are datetimes (or None not to limit the range).
+    Returns a dictionary with the "date" (list of datetimes), "score" and "rank"
+    (arrays) of the player in each snapshot between both dates, ordered by date.
+    It only reads the rows of the player.
+    """
+    compact_history(history)
+    player_id = symbols.get_symbol_id(symbols.PLAYERS, player)
+    start = end = 0
+    if player_id != None and player_id + 1 < len(history["player_start"]):
+        start = history["player_start"][player_id]
+        end = history["player_start"][player_id + 1]
+
+    ordinals = history["columns"]["ordinal"][start:end]
+    first = 0 if first_date == None else np.searchsorted(ordinals, first_date.toordinal())
+    last = len(ordinals) if last_date == None else np.searchsorted(ordinals, last_date.toordinal(),
+                                                                   side = "right")
+
+    return {"date": [dt.fromordinal(ordinal) for ordinal in ordinals[first:last].tolist()],
+            "score": history["columns"]["score"][start:end][first:last],
+            "rank": history["columns"]["rank"][start:end][first:last]}
+
+def get_snapshot(history, date, resolve_names = True):
+    """
+    Assumes history is a ranking history and date is a datetime.
+    Returns the snapshot stored for that date as a list of lists
+    [[player, score, ranking]] ordered by ranking (empty if there is none).
+    """
+    compact_history(history)
+    ordinal = date.toordinal()
+    sorted_ordinals = history["columns"]["ordinal"][history["date_order"]]
+    rows = history["date_order"][np.searchsorted(sorted_ordinals, ordinal):
+                                 np.searchsorted(sorted_ordinals, ordinal, side = "right")]
+    rows = rows[np.argsort(history["columns"]["rank"][rows], kind = "stable")]
+
+    players = history["columns"]["player_id"][rows].tolist()
+    if resolve_names == True:
+        players = symbols.get_symbol_names(symbols.PLAYERS, players)
+
+    return [[player, score, rank] for player, score, rank in
+            zip(players, history["columns"]["score"][rows].tolist(),
+                history["columns"]["rank"][rows].tolist())]
+
+def compute_weekly_history(columns, first_date, last_date, ranking = "wbw", weeks = 52,
+                           epsilon = 1e-4, round_numbers = None, mask = None, history = None,
+                           checkpoint = None, checkpoint_every = 52):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns, first_date and last_date are
+    datetimes and ranking can take three values: "winners_win",
+    "winners_dont_lose" (which needs round_numbers) and "wbw".
+    Weeks, epsilon and mask work as in rankings.wbw_ranking_arrays.
+    Computes the ranking over the previous weeks every week from first_date to
+    last_date, and adds each snapshot to history (a new one if None).
+    If checkpoint is the path of a '.npz' file, the snapshots computed and the
+    next week to compute are appended to it every checkpoint_every weeks and at
+    the end, and a run with the same arguments, matches (see
+    tennis_checkpoints.get_data_fingerprint) and mask resumes from it instead of
+    starting from first_date; last_date can be later than in the run that wrote
+    it. The history is then the one of the checkpoint, so it cannot be given too.
+    Returns the history, compacted.
+    """
+    if ranking not in ["winners_win", "winners_dont_lose", "wbw"]:
+        raise ValueError("Ranking should be winners_win, winners_dont_lose or wbw.")
+    if history != None and checkpoint != None:
+        raise ValueError("A history cannot be given with a checkpoint.")
+    date = first_date
+    if history == None:
+        history = new_history(ranking)
+    if checkpoint != None:
+        parameters = {"first_date": first_date.toordinal(), "ranking": ranking, "weeks": weeks,
+                      "epsilon": epsilon, "data": checkpoints.get_data_fingerprint(columns),
+                      "mask": checkpoints.get_mask_digest(mask)}
+        chunks = checkpoints.load_checkpoint(checkpoint, parameters)
+        for chunk in chunks if chunks != None else []:
+            history["pending"].append(get_history_from_arrays(chunk)["columns"])
+            date = dt.fromordinal(int(chunk["next_ordinal"]))
+    # Snapshots computed since the last save, which are the only ones saved.
+    unsaved = new_history(ranking)
+
+    def save():
+        checkpoints.save_checkpoint(checkpoint, parameters,
+                                    dict(get_history_arrays(unsaved),
+                                         next_ordinal = np.array(date.toordinal())),
+                                    append = True)
+
+    n_computed = 0
+    while date <= last_date:
+        window = {"weeks": weeks, "start_date": date, "mask": mask}
+        if ranking == "winners_win":
+            snapshot = rankings.winners_win_ranking_arrays(columns, **window)
+        elif ranking == "winners_dont_lose":
+            snapshot = rankings.winners_dont_lose_ranking_arrays(columns, round_numbers, **window)
+        else:
+            snapshot = rankings.wbw_ranking_arrays(columns, epsilon = epsilon, **window)
+        add_snapshot(history, date, *snapshot)
+        add_snapshot(unsaved, date, *snapshot)
+        date += timedelta(weeks = 1)
+        n_computed += 1
+        if checkpoint != None and n_computed % checkpoint_every == 0:
+            save()
+            unsaved = new_history(ranking)
+    if checkpoint != None and n_computed % checkpoint_every != 0:
+        save()
+    compact_history(history)
+
+    return history
+
+def get_history_arrays(history):
+    """
+    Assumes history is a ranking history.
+    Returns a dictionary of arrays with the history, with the names of the
+    players instead of their ids, so that it can be restored in another session
+    (see get_history_from_arrays).
+    """
+    compact_history(history)
+    player_ids = history["columns"]["player_id"]
+    stored_ids = np.unique(player_ids)
+    names = np.array(symbols.get_symbol_names(symbols.PLAYERS, stored_ids.tolist()), dtype = str)
+
+    return {"ranking": np.array(history["ranking"]), "names": names,
+            "ordinal": history["columns"]["ordinal"],
+            "name_index": np.searchsorted(stored_ids, player_ids).astype(np.int32),
+            "score": history["columns"]["score"],
+            "rank": history["columns"]["rank"]}
+
+def get_history_from_arrays(data):
+    """
+    Assumes data is a dictionary of arrays (or a loaded '.npz' file) as returned
+    by get_history_arrays.
+    Returns the ranking history, with the players keyed by their ids in the
+    shared symbol table (names not seen yet are added to it).
+    """
+    history = new_history(str(data["ranking"]))
+    player_ids = np.array([symbols.intern_symbol(symbols.PLAYERS, name)
+                           for name in data["names"].tolist()], dtype = np.int32)
+    history["pending"].append({"ordinal": data["ordinal"],
+                               "player_id": player_ids[data["name_index"]],
+                               "score": data["score"],
+                               "rank": data["rank"]})
+    compact_history(history)
+
+    return history
+
+def save_history(history, file):
+    """
+    Assumes history is a ranking history and file is the path of a '.npz' file.
+    Writes the history compressed, with the names of the players instead of
+    their ids, so that it can be loaded in another session.
+    """
+    np.savez_compressed(file, **get_history_arrays(history))
+
+def load_history(file):
+    """
+    Assumes file is a '.npz' file written by save_history.
+    Returns the ranking history, with the players keyed by their ids in the
+    shared symbol table (names not seen yet are added to it).
+    """
+    with np.load(file) as data:
+        return get_history_from_arrays(data)
+
+if __name__ == "__main__":
+    main()
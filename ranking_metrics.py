@@ -0,0 +1,196 @@
+def main():
+    print("Ranking metrics module")
+
+import tennis_data_manipulation as manip
+import tennis_symbols as symbols
+import rankings
+import comparisons
+import numpy as np
+
+def get_group_ranks(values, groups, method = "average"):
+    """
+    Assumes values is a float array and groups is an integer array of the same
+    length, showing the group of each value.
+    Method can take two values: "average", where tied values get the mean of
+    the positions they occupy, and "ordinal", where ties are broken by the order
+    in which the values appear.
+    Returns a float array with the rank (starting at 1) of each value within its group.
+    """
+    n_values = len(values)
+    order = np.lexsort((values, groups))
+    sorted_values = values[order]
+    sorted_groups = groups[order]
+    positions = np.arange(n_values)
+
+    new_group = np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]
+    group_first = np.maximum.accumulate(np.where(new_group, positions, 0))
+
+    if method == "ordinal":
+        sorted_ranks = positions - group_first + 1.0
+    elif method == "average":
+        # A run is a sequence of equal values in the same group.
+        new_run = new_group | np.r_[True, sorted_values[1:] != sorted_values[:-1]]
+        run_id = np.cumsum(new_run) - 1
+        run_first = positions[new_run]
+        run_last = np.r_[run_first[1:], n_values] - 1
+        sorted_ranks = ((run_first + run_last) / 2)[run_id] - group_first + 1
+    else:
+        raise ValueError("Method should be average or ordinal.")
+
+    ranks = np.empty(n_values)
+    ranks[order] = sorted_ranks
+    return ranks
+
+def spearman_by_group(x, y, groups, n_groups):
+    """
+    Assumes x and y are float arrays of rankings (without NaN) and groups is an
+    integer array with values from 0 to n_groups - 1.
+    Returns an array with the Spearman correlation of x and y in each group
+    (the Pearson correlation of their average ranks). Groups with less than two
+    values or without variation are NaN.
+    """
+    rank_x = get_group_ranks(x, groups)
+    rank_y = get_group_ranks(y, groups)
+    n_values = np.bincount(groups, minlength = n_groups)
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        deviation_x = rank_x - (np.bincount(groups, rank_x, n_groups) / n_values)[groups]
+        deviation_y = rank_y - (np.bincount(groups, rank_y, n_groups) / n_values)[groups]
+        covariance = np.bincount(groups, deviation_x * deviation_y, n_groups)
+        variance_x = np.bincount(groups, deviation_x ** 2, n_groups)
+        variance_y = np.bincount(groups, deviation_y ** 2, n_groups)
+        correlation = covariance / np.sqrt(variance_x * variance_y)
+
+    correlation[(n_values < 2) | (variance_x == 0) | (variance_y == 0)] = np.nan
+    return correlation
+
+def kendall_by_group(x, y, groups, n_groups, chunk_size = 1024):
+    """
+    Assumes x and y are float arrays of rankings (without NaN) and groups is an
+    integer array with values from 0 to n_groups - 1.
+    Chunk_size limits the number of rows compared at once, so that the memory
+    used is at most chunk_size times the size of the largest group.
+    Returns an array with the Kendall tau-b correlation of x and y in each group.
+    Groups with less than two values or without variation are NaN.
+    """
+    order = np.argsort(groups, kind = "stable")
+    sorted_groups = groups[order]
+    bounds = np.searchsorted(sorted_groups, np.arange(n_groups + 1))
+    correlation = np.full(n_groups, np.nan)
+
+    # The loop goes through groups (and chunks of big groups), never through pairs.
+    for group in range(n_groups):
+        members = order[bounds[group]:bounds[group + 1]]
+        if len(members) < 2:
+            continue
+        group_x = x[members]
+        group_y = y[members]
+        score = 0
+        untied_x = 0
+        untied_y = 0
+        for chunk in range(0, len(members), chunk_size):
+            sign_x = np.sign(group_x[chunk:chunk + chunk_size, None] - group_x[None, :])
+            sign_y = np.sign(group_y[chunk:chunk + chunk_size, None] - group_y[None, :])
+            score += np.sum(sign_x * sign_y)
+            untied_x += np.count_nonzero(sign_x)
+            untied_y += np.count_nonzero(sign_y)
+        if untied_x > 0 and untied_y > 0:
+            correlation[group] = score / np.sqrt(untied_x * untied_y)
+
+    return correlation
+
+def top_k_overlap_by_group(x, y, groups, n_groups, k = 10):
+    """
+    Assumes x and y are float arrays of rankings (without NaN) and groups is an
+    integer array with values from 0 to n_groups - 1. K is a positive integer.
+    Returns an array with the share of the top k players of each group according
+    to x that are also in the top k according to y (or the share of all the
+    players, if the group has less than k).
+    """
+    if k <= 0:
+        raise ValueError("K must be positive.")
+    in_top_x = get_group_ranks(x, groups, method = "ordinal") <= k
+    in_top_y = get_group_ranks(y, groups, method = "ordinal") <= k
+    n_values = np.bincount(groups, minlength = n_groups)
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return (np.bincount(groups, in_top_x & in_top_y, n_groups) /
+                np.minimum(k, n_values))
+
+def mean_absolute_error_by_group(x, y, groups, n_groups):
+    """
+    Assumes x and y are float arrays of rankings (without NaN) and groups is an
+    integer array with values from 0 to n_groups - 1.
+    Returns an array with the mean absolute difference between x and y in each group.
+    """
+    n_values = np.bincount(groups, minlength = n_groups)
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return np.bincount(groups, np.abs(x - y), n_groups) / n_values
+
+def get_ranking_metrics(x, y, groups, n_groups, k = 10):
+    """
+    Assumes x and y are float arrays of rankings (without NaN) and groups is an
+    integer array with values from 0 to n_groups - 1. K is used for the top k overlap.
+    Returns a dictionary of arrays with one value per group: "n_players",
+    "spearman", "kendall", "top_k_overlap" and "mean_absolute_error".
+    """
+    return {"n_players": np.bincount(groups, minlength = n_groups),
+            "spearman": spearman_by_group(x, y, groups, n_groups),
+            "kendall": kendall_by_group(x, y, groups, n_groups),
+            "top_k_overlap": top_k_overlap_by_group(x, y, groups, n_groups, k),
+            "mean_absolute_error": mean_absolute_error_by_group(x, y, groups, n_groups)}
+
+def compare_rankings_metrics(matches, ranking = "wbw", by = "year", year = 2008,
+                             n_weeks = 52, epsilon = 1e-4, k = 10):
+    """
+    Assumes matches is a list of dictionaries, where each match is a dictionary
+    (with the rounds added if ranking is "winners_dont_lose").
+    Ranking can take three values: "winners_win", "winners_dont_lose" and "wbw".
+    By can take two values: "year" or "tournament".
+    Year, n_weeks and epsilon work as in comparisons.compare_wta_wbw_rankings,
+    and k is used for the top k overlap.
+
+    For each tournament from the beginning year on, it pairs the WTA ranking
+    (rank_1 or rank_2) of each player with her ranking computed over the n_weeks
+    before the start of the tournament, as in compare_wta_wbw_rankings. Players
+    without one of both rankings are left out. When by is "year", the
+    appearances of all the tournaments of a year are pooled together.
+    Returns a dictionary of arrays with one value per year (or per tournament):
+    the metrics of get_ranking_metrics, the "year" and, when by is "tournament",
+    the name of the "tournament".
+    """
+    if by not in ["year", "tournament"]:
+        raise ValueError("By should be year or tournament.")
+
+    columns = manip.get_match_columns(matches)
+    appearances = comparisons.get_first_appearances(matches, columns, year = year)
+    round_numbers = None
+    if ranking == "winners_dont_lose":
+        round_numbers = rankings.get_round_numbers(matches)
+    other_ranking = comparisons.get_snapshot_rankings(columns, appearances["player_id"],
+                                                      appearances["ranking_key"],
+                                                      year = year, n_weeks = n_weeks,
+                                                      epsilon = epsilon, ranking = ranking,
+                                                      round_numbers = round_numbers)
+
+    valid = ~np.isnan(appearances["wta_ranking"]) & ~np.isnan(other_ranking)
+    if by == "year":
+        labels = appearances["year"][valid]
+    else:
+        labels = appearances["group"][valid]
+    unique_labels, first_index, groups = np.unique(labels, return_index = True,
+                                                   return_inverse = True)
+
+    metrics = get_ranking_metrics(appearances["wta_ranking"][valid], other_ranking[valid],
+                                  groups.ravel(), len(unique_labels), k = k)
+    metrics["year"] = appearances["year"][valid][first_index]
+    if by == "tournament":
+        tournament_ids = appearances["tournament_id"][valid][first_index]
+        metrics["tournament"] = symbols.get_symbol_names(symbols.TOURNAMENTS, tournament_ids)
+
+    return metrics
+
+
+if __name__ == "__main__":
+    main()
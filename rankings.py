@@ -2,7 +2,11 @@ def main():
     print("Rankings module")
 
 from datetime import timedelta
+import json
+import math
 import numpy as np
+import tennis_symbols as symbols
+import tennis_profiling as profiling
 
 # Winners win ranking functions:
 def get_winners_win_dict(matches, year = None):
@@ -12,6 +16,8 @@ def get_winners_win_dict(matches, year = None):
     Assumes year is an integer that defaults to None, it specifies whether
     the number of matches won should be computed throughout the whole dataset
     or for a particular year.
+    Returns a dictionary where the keys are the ids of the players and the values
+    the number of matches won.
     """
     winners_dict = {}
     for match in matches:
@@ -19,24 +25,22 @@ def get_winners_win_dict(matches, year = None):
         if year != None:
             # Assumes matches are chronologically ordered.
             # Matches before our year are skipped
-            if match["start_date"].date().year < year:
+            if match["year"] < year:
                 continue
             # We break the loop after we have finished with the matches of a year.
-            elif match["start_date"].date().year > year:
+            elif match["year"] > year:
                 break
 
         # And now we include the victories of the players.
-        if match["player_1"] not in winners_dict:
-            winners_dict[match["player_1"]] = 0
-        if match["player_2"] not in winners_dict:
-            winners_dict[match["player_2"]] = 0
-        if match["player_1"] == match["winner"]:
-             winners_dict[match["player_1"]] += 1
-        else:
-             winners_dict[match["player_2"]] += 1
+        if match["player_1_id"] not in winners_dict:
+            winners_dict[match["player_1_id"]] = 0
+        if match["player_2_id"] not in winners_dict:
+            winners_dict[match["player_2_id"]] = 0
+        winners_dict[match["winner_id"]] += 1
 
     return winners_dict
 
+@profiling.profiled("winners_win_ranking", profiling.count_first_argument)
 def winners_win_ranking(matches, year = None):
     """
     Assumes matches is a list of dictionaries, where each dictionary is a match.
@@ -56,9 +60,11 @@ def winners_win_ranking(matches, year = None):
     winners_dict = get_winners_win_dict(matches, year)
     # Source for using winners_dict.get:
     # https://stackoverflow.com/a/3177911/15459665
+    # The ids are translated to names only when building the output.
     for winner in sorted(winners_dict, key = winners_dict.get, reverse = True):
         ranking += 1
-        winners_list.append([winner, winners_dict[winner], ranking])
+        winners_list.append([symbols.get_symbol_name(symbols.PLAYERS, winner),
+                             winners_dict[winner], ranking])
 
     return winners_list
 
@@ -69,30 +75,30 @@ def get_dict_tournaments_rounds(matches):
     """
     Assumes matches is a list of dictionaries, where each dictionary is a match.
     Returns a dictionary of dictionaries, where we can retrieve the round number
-    of a round in a certain tournament.
+    of a round in a certain tournament (identified by its id) and start date.
 
-    E.g., {"US Open":{2007: {"First Round": 1, ..., "Final": 5},
-                      2008: {"Third Round": 3, "Fourth Round": 4, ..., "Final": 6]}}
+    E.g., {12: {2007-08-27: {"First Round": 1, ..., "Final": 5},
+                2008-08-25: {"Third Round": 3, "Fourth Round": 4, ..., "Final": 6]}}
     """
     tournaments_dict = {}
     n_round = 0
     for match in matches:
-        if match["tournament"] in tournaments_dict:
-            if match["start_date"] in tournaments_dict[match["tournament"]]:
+        if match["tournament_id"] in tournaments_dict:
+            if match["start_date"] in tournaments_dict[match["tournament_id"]]:
                 if match["round"] in \
-                tournaments_dict[match["tournament"]][match["start_date"]]:
+                tournaments_dict[match["tournament_id"]][match["start_date"]]:
                     continue
 
             # Tournament in dictionary, but in a different year.
             else:
-                tournaments_dict[match["tournament"]][match["start_date"]] = {}
+                tournaments_dict[match["tournament_id"]][match["start_date"]] = {}
                 n_round = 0
 
         # New tournament in the dataset. In both cases (new year and new tournament)
         # we reset n_round.
-        elif match["tournament"] not in tournaments_dict:
-            tournaments_dict[match["tournament"]] = {}
-            tournaments_dict[match["tournament"]][match["start_date"]] = {}
+        elif match["tournament_id"] not in tournaments_dict:
+            tournaments_dict[match["tournament_id"]] = {}
+            tournaments_dict[match["tournament_id"]][match["start_date"]] = {}
             n_round = 0
 
 
@@ -103,15 +109,15 @@ def get_dict_tournaments_rounds(matches):
         # Set the final at the same level of the Third Place match if there is one.
         # (Here we are assuming that the matches are chronologically ordered)
         elif (match["round"] == "Final"
-        and "Third Place" in tournaments_dict[match["tournament"]][match["start_date"]]):
-            n_round = tournaments_dict[match["tournament"]][match["start_date"]]["Third Place"]
+        and "Third Place" in tournaments_dict[match["tournament_id"]][match["start_date"]]):
+            n_round = tournaments_dict[match["tournament_id"]][match["start_date"]]["Third Place"]
 
         # In any other circumstance, the number of rounds increases by one.
         else:
             n_round += 1
 
 
-        tournaments_dict[match["tournament"]][match["start_date"]][match["round"]] = n_round
+        tournaments_dict[match["tournament_id"]][match["start_date"]][match["round"]] = n_round
 
     return tournaments_dict
 
@@ -121,36 +127,39 @@ def get_winners_dont_lose_dict(matches, year = None):
     Assumes year is an integer that defaults to None, it specifies whether
     the number of matches won should be computed throughout the whole dataset
     or for a particular year.
+    Returns a dictionary where the keys are the ids of the players and the values
+    their scores.
     """
     winners_dict = {}
     tournaments_dict = get_dict_tournaments_rounds(matches)
     for match in matches:
         # Same procedure as in get_winners_win_dict to check for the desired year
         if year != None:
-            if match["start_date"].date().year < year:
+            if match["year"] < year:
                 continue
-            elif match["start_date"].date().year > year:
+            elif match["year"] > year:
                 break
 
         # Initialize the player in the dict
-        if match["player_1"] not in winners_dict:
-            winners_dict[match["player_1"]] = 0
-        if match["player_2"] not in winners_dict:
-            winners_dict[match["player_2"]] = 0
+        if match["player_1_id"] not in winners_dict:
+            winners_dict[match["player_1_id"]] = 0
+        if match["player_2_id"] not in winners_dict:
+            winners_dict[match["player_2_id"]] = 0
 
         # Retrieve the match round.
-        r = tournaments_dict[match["tournament"]][match["start_date"]][match["round"]]
+        r = tournaments_dict[match["tournament_id"]][match["start_date"]][match["round"]]
 
         # Add or substract points depending on r
-        if match["player_1"] == match["winner"]:
-            winners_dict[match["player_1"]] += 1 * r
-            winners_dict[match["player_2"]] -= 1 / r
+        if match["player_1_id"] == match["winner_id"]:
+            winners_dict[match["player_1_id"]] += 1 * r
+            winners_dict[match["player_2_id"]] -= 1 / r
         else:
-            winners_dict[match["player_1"]] -= 1 / r
-            winners_dict[match["player_2"]] += 1 * r
+            winners_dict[match["player_1_id"]] -= 1 / r
+            winners_dict[match["player_2_id"]] += 1 * r
 
     return winners_dict
 
+@profiling.profiled("winners_dont_lose_ranking", profiling.count_first_argument)
 def winners_dont_lose_ranking(matches, year = None):
     """
     Assumes matches is a list of dictionaries, where each dictionary is a match.
@@ -170,12 +179,14 @@ def winners_dont_lose_ranking(matches, year = None):
     winners_dict = get_winners_dont_lose_dict(matches, year)
     for winner in sorted(winners_dict, key = winners_dict.get, reverse = True):
         ranking += 1
-        winners_list.append([winner, winners_dict[winner], ranking])
+        winners_list.append([symbols.get_symbol_name(symbols.PLAYERS, winner),
+                             winners_dict[winner], ranking])
 
     return winners_list
 
 
 # Winners beat other winners rankings
+@profiling.profiled("get_wbw_dict", profiling.count_first_argument)
 def get_wbw_dict(matches, year = None, weeks = None, start_date = None):
     """
     Assumes matches is a list of dictionaries, where each dictionary represents
@@ -185,9 +196,10 @@ def get_wbw_dict(matches, year = None, weeks = None, start_date = None):
     all matches ended in the previous n weeks to a certain date.
     Year should not be used together with weeks and start_date.
 
-    This function returns a dictionary of players, showing the number of times
-    they lost "n_losses" and a dictionary called "lost_to" that represents
-    the players to whom they lost and how many times this happened.
+    This function returns a dictionary of players (keyed by their ids), showing
+    the number of times they lost "n_losses" and a dictionary called "lost_to"
+    that represents the players (ids) to whom they lost and how many times
+    this happened.
     """
     if start_date != None and weeks != None and year != None:
         raise ValueError("Year parameter cannot be specified together with weeks and start_date.")
@@ -201,9 +213,9 @@ def get_wbw_dict(matches, year = None, weeks = None, start_date = None):
         # Same counting as in get_winners_win_dict
         if weeks == None and start_date == None:
             if year != None:
-                if match["start_date"].date().year < year:
+                if match["year"] < year:
                     continue
-                elif match["start_date"].date().year > year:
+                elif match["year"] > year:
                     break
 
         # Or the weeks procedure:
@@ -218,35 +230,35 @@ def get_wbw_dict(matches, year = None, weeks = None, start_date = None):
                 break
 
         # If the players do not appear in the dictionary yet, we include them.
-        if match["player_1"] not in losers_dict:
-            losers_dict[match["player_1"]] = {}
-            losers_dict[match["player_1"]]["n_losses"] = 0
-            losers_dict[match["player_1"]]["lost_to"] = {}
-        if match["player_2"] not in losers_dict:
-            losers_dict[match["player_2"]] = {}
-            losers_dict[match["player_2"]]["n_losses"] = 0
-            losers_dict[match["player_2"]]["lost_to"] = {}
+        player_1 = match["player_1_id"]
+        player_2 = match["player_2_id"]
+        if player_1 not in losers_dict:
+            losers_dict[player_1] = {}
+            losers_dict[player_1]["n_losses"] = 0
+            losers_dict[player_1]["lost_to"] = {}
+        if player_2 not in losers_dict:
+            losers_dict[player_2] = {}
+            losers_dict[player_2]["n_losses"] = 0
+            losers_dict[player_2]["lost_to"] = {}
 
         # The loser adds one loss, and we create a dictionary with the players to
         # whom she has lost and the number of times this has happened.
-        if match["player_1"] != match["winner"]:
-            losers_dict[match["player_1"]]["n_losses"] += 1
-            if match["player_2"] not in losers_dict[match["player_1"]]["lost_to"]:
-                losers_dict[match["player_1"]]["lost_to"][match["player_2"]] = 1
-            else:
-                losers_dict[match["player_1"]]["lost_to"][match["player_2"]] += 1
+        if player_1 != match["winner_id"]:
+            loser, winner = player_1, player_2
         else:
-            losers_dict[match["player_2"]]["n_losses"] += 1
-            if match["player_1"] not in losers_dict[match["player_2"]]["lost_to"]:
-                losers_dict[match["player_2"]]["lost_to"][match["player_1"]] = 1
-            else:
-                losers_dict[match["player_2"]]["lost_to"][match["player_1"]] += 1
+            loser, winner = player_2, player_1
+        losers_dict[loser]["n_losses"] += 1
+        if winner not in losers_dict[loser]["lost_to"]:
+            losers_dict[loser]["lost_to"][winner] = 1
+        else:
+            losers_dict[loser]["lost_to"][winner] += 1
 
     return losers_dict
 
 
+@profiling.profiled("wbw_ranking", profiling.count_first_argument)
 def wbw_ranking(matches, year = None, weeks = None, start_date = None,
-                epsilon = 1e-10, max_iterations = 150):
+                epsilon = 1e-10, max_iterations = 150, resolve_names = True):
     """
     Assumes matches is a list of dictionaries, where each dictionary is a match.
     Year is an integer that shows the year for which the ranking should be calculated.
@@ -261,6 +273,10 @@ def wbw_ranking(matches, year = None, weeks = None, start_date = None,
     On the other hand, max_iterations shows the number of maximum iterations that
     the algorithm should run; it works as a stopping rule in case there is no
     convergence.
+    Resolve_names defaults to True, meaning that players are identified by their
+    names in the output. If set to False, players are identified by their ids
+    (see tennis_symbols), which is cheaper when the output is used for further
+    computations.
 
     This algorithm implements the WbW (winners beat other winners) ranking.
     It returns two objects:
@@ -353,6 +369,7 @@ def wbw_ranking(matches, year = None, weeks = None, start_date = None,
 
         sd = (sum_squared_differences_between_scores / n_players) ** (1 / 2)
         n_iterations += 1
+    profiling.add_count("iterations", n_iterations)
 
 
     # We create a list for the printing procedure, and a dictionary if we want
@@ -365,9 +382,568 @@ def wbw_ranking(matches, year = None, weeks = None, start_date = None,
         ranking_list.append([loser, ranking_dict[loser][0], ranking])
         ranking_dict[loser].append(ranking)
 
+    if resolve_names == True:
+        names = symbols.PLAYERS["names"]
+        for player in ranking_list:
+            player[0] = names[player[0]]
+        ranking_dict = {names[player]: ranking_dict[player] for player in ranking_dict}
+
     return ranking_list, ranking_dict
 
 
+# Array versions of the rankings, used to compute many rankings at once
+# (e.g. one per tournament). They take the columns returned by
+# tennis_data_manipulation.get_match_columns instead of the list of matches.
+def get_ranking_window(columns, year = None, weeks = None, start_date = None, mask = None):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns (matches ordered by date).
+    Year, weeks and start_date work as in wbw_ranking. Mask is None or a
+    boolean array selecting a subset of the matches (see tennis_filters).
+
+    Returns a boolean array marking the matches that get_wbw_dict takes into
+    account for those arguments (including its early stop once the matches
+    go beyond the requested year or start date), restricted to the mask.
+    """
+    window = get_date_window(columns, year = year, weeks = weeks, start_date = start_date)
+    if mask is not None:
+        window &= mask
+
+    return window
+
+def get_date_window(columns, year = None, weeks = None, start_date = None):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns (matches ordered by date).
+    Returns the boolean array of get_ranking_window without a mask.
+    """
+    if start_date != None and weeks != None and year != None:
+        raise ValueError("Year parameter cannot be specified together with weeks and start_date.")
+    if weeks != None and weeks <= 0:
+        raise ValueError("The number of previous weeks to take into account must be positive.")
+    n_matches = len(columns["year"])
+    positions = np.arange(n_matches)
+
+    if weeks == None or start_date == None:
+        if year == None:
+            return np.ones(n_matches, dtype = bool)
+        after = columns["year"] > year
+        stop = np.argmax(after) if after.any() else n_matches
+        return (columns["year"] == year) & (positions < stop)
+
+    first_week = (start_date - timedelta(weeks = weeks)).toordinal()
+    after = columns["end_ordinal"] > start_date.toordinal()
+    stop = np.argmax(after) if after.any() else n_matches
+    return (columns["end_ordinal"] >= first_week) & (positions < stop)
+
+def get_players_in_order(player_1, player_2):
+    """
+    Assumes player_1 and player_2 are integer arrays with the ids of the players
+    of each match.
+    Numbers the players in order of first appearance (player 1 before player 2),
+    which is the order in which the dictionaries of the ranking functions
+    include them, so that ties are broken in the same way.
+    Returns three arrays: the ids of the players in that order, and the
+    position of player 1 and player 2 of each match in the first array.
+    """
+    pairs = np.column_stack([player_1, player_2]).ravel()
+    sorted_players, first_index, inverse = np.unique(pairs, return_index = True,
+                                                     return_inverse = True)
+    order = np.argsort(first_index)
+    position = np.empty(len(order), dtype = np.int64)
+    position[order] = np.arange(len(order))
+    positions = position[inverse.ravel()]
+
+    return sorted_players[order], positions[0::2], positions[1::2]
+
+def sort_ranking_arrays(players, scores):
+    """
+    Assumes players and scores are arrays, with the players in order of first
+    appearance (see get_players_in_order).
+    Returns three arrays ordered by ranking: the ids of the players, their
+    scores and their rankings. Ties keep the order of appearance.
+    """
+    order = np.argsort(-scores, kind = "stable")
+
+    return players[order], scores[order], np.arange(1, len(players) + 1)
+
+def winners_win_ranking_arrays(columns, year = None, weeks = None, start_date = None,
+                               mask = None):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns. Year, weeks and start_date
+    select the matches as in wbw_ranking, and mask as in get_ranking_window.
+    Array version of winners_win_ranking. Returns three arrays ordered by
+    ranking: the ids of the players, their number of matches won and their rankings.
+    """
+    window = get_ranking_window(columns, year = year, weeks = weeks, start_date = start_date,
+                                mask = mask)
+    players, player_1, player_2 = get_players_in_order(columns["player_1_id"][window],
+                                                       columns["player_2_id"][window])
+    winner = np.where(columns["winner_side"][window] == 1, player_1, player_2)
+    scores = np.bincount(winner, minlength = len(players))
+
+    return sort_ranking_arrays(players, scores)
+
+def get_round_numbers(matches):
+    """
+    Assumes matches is a list of dictionaries, where each dictionary is a match
+    with its round already added.
+    Returns an integer array with the round number of each match, as used by
+    the winners don't lose ranking (see get_dict_tournaments_rounds).
+    """
+    tournaments_dict = get_dict_tournaments_rounds(matches)
+
+    return np.array([tournaments_dict[match["tournament_id"]][match["start_date"]][match["round"]]
+                     for match in matches], dtype = np.int64)
+
+def winners_dont_lose_ranking_arrays(columns, round_numbers, year = None, weeks = None,
+                                     start_date = None, mask = None):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns, and round_numbers is the array
+    returned by get_round_numbers for the same matches. Year, weeks and
+    start_date select the matches as in wbw_ranking, and mask as in
+    get_ranking_window.
+    Array version of winners_dont_lose_ranking. Returns three arrays ordered by
+    ranking: the ids of the players, their scores and their rankings.
+    """
+    window = get_ranking_window(columns, year = year, weeks = weeks, start_date = start_date,
+                                mask = mask)
+    players, player_1, player_2 = get_players_in_order(columns["player_1_id"][window],
+                                                       columns["player_2_id"][window])
+    player_1_won = columns["winner_side"][window] == 1
+    winner = np.where(player_1_won, player_1, player_2)
+    loser = np.where(player_1_won, player_2, player_1)
+    r = round_numbers[window]
+    # The points are added match by match (winner and loser interleaved), the
+    # same order as in get_winners_dont_lose_dict, so that the sums are equal.
+    scores = np.bincount(np.column_stack([winner, loser]).ravel(),
+                         weights = np.column_stack([r, -1 / r]).ravel(),
+                         minlength = len(players))
+
+    return sort_ranking_arrays(players, scores)
+
+@profiling.profiled("solve_wbw", profiling.count_first_argument)
+def solve_wbw(player_1, player_2, winner_side, epsilon = 1e-10, max_iterations = 150):
+    """
+    Assumes player_1 and player_2 are integer arrays with the ids of the
+    players of each match to be ranked, and winner_side shows who won each
+    match (1 or 2). Epsilon and max_iterations work as in wbw_ranking.
+
+    Runs the same iterations as wbw_ranking, but with array operations over the
+    loser -> winner edges instead of dictionaries.
+    Returns two arrays: the ids of the players (in order of first appearance)
+    and their scores.
+    """
+    players, player_1, player_2 = get_players_in_order(player_1, player_2)
+    n_players = len(players)
+    if n_players == 0:
+        return players, np.array([], dtype = float)
+
+    player_1_won = winner_side == 1
+    winner = np.where(player_1_won, player_1, player_2)
+    loser = np.where(player_1_won, player_2, player_1)
+    n_losses = np.bincount(loser, minlength = n_players)
+    never_lost = n_losses == 0
+    safe_n_losses = np.where(never_lost, 1, n_losses)
+
+    def iterate(score):
+        share = np.where(never_lost, 0, score / safe_n_losses)
+        new_score = np.bincount(winner, weights = share[loser], minlength = n_players)
+        new_score += np.where(never_lost, score, 0)
+        return (new_score * 0.85) + (0.15 / n_players)
+
+    score = iterate(np.full(n_players, 1 / n_players))
+    sd = np.inf
+    n_iterations = 1
+    while sd > epsilon and n_iterations < max_iterations:
+        new_score = iterate(score)
+        sd = np.sqrt(np.mean((new_score - score) ** 2))
+        score = new_score
+        n_iterations += 1
+    profiling.add_count("iterations", n_iterations)
+
+    return players, score
+
+def wbw_ranking_arrays(columns, year = None, weeks = None, start_date = None,
+                       epsilon = 1e-10, max_iterations = 150, mask = None):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns. Mask works as in
+    get_ranking_window, and the rest of the arguments as in wbw_ranking.
+    Array version of wbw_ranking. Returns three arrays ordered by ranking:
+    the ids of the players, their scores and their rankings.
+    """
+    window = get_ranking_window(columns, year = year, weeks = weeks, start_date = start_date,
+                                mask = mask)
+    players, scores = solve_wbw(columns["player_1_id"][window],
+                                columns["player_2_id"][window],
+                                columns["winner_side"][window],
+                                epsilon = epsilon, max_iterations = max_iterations)
+
+    return sort_ranking_arrays(players, scores)
+
+
+
+# Time-decayed WbW ranking. Instead of counting the losses of a window equally,
+# each loser -> winner edge is weighted by the age of the match, so that the
+# ranking changes smoothly from one week to the next.
+DECAYS = ["exponential", "linear"]
+
+def get_decay_weights(ages, decay = "exponential", half_life_weeks = 26,
+                      max_age_weeks = None):
+    """
+    Assumes ages is a float array with the age of each match in days.
+    Decay can take two values: "exponential", where the weight halves every
+    half_life_weeks, and "linear", where the weight falls from 1 to 0 over
+    max_age_weeks (which is then required).
+    Returns a float array with the weight of each match.
+    """
+    if decay == "exponential":
+        return 0.5 ** (ages / (7 * half_life_weeks))
+    elif decay == "linear":
+        if max_age_weeks == None:
+            raise ValueError("The linear decay needs max_age_weeks.")
+        return np.maximum(0, 1 - ages / (7 * max_age_weeks))
+    else:
+        raise ValueError("Decay should be exponential or linear.")
+
+def build_decayed_wbw_graph(columns, round_numbers = None, round_weight = 0.0):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns. Round_numbers (see
+    get_round_numbers) is needed if round_weight is not 0: the edge of a match
+    in round n is then weighted by 1 + round_weight * (n - 1), so that losses in
+    the late rounds of a tournament count more.
+    Builds the loser -> winner edges of all the matches once, sorted by end
+    date, so that the ranking at any date only takes a slice of them.
+    Returns a dictionary with the arrays "loser", "winner", "end_ordinal" and
+    "weight" (the weight before the decay).
+    """
+    if round_weight != 0 and round_numbers is None:
+        raise ValueError("Round_numbers are needed to weight the rounds.")
+
+    order = np.argsort(columns["end_ordinal"], kind = "stable")
+    weight = np.ones(len(order))
+    if round_weight != 0:
+        weight = 1 + round_weight * (round_numbers[order] - 1)
+
+    return {"loser": columns["loser_id"][order],
+            "winner": columns["winner_id"][order],
+            "end_ordinal": columns["end_ordinal"][order],
+            "weight": weight}
+
+def solve_weighted_wbw(loser, winner, weights, n_players, epsilon = 1e-10,
+                       max_iterations = 150, initial_score = None):
+    """
+    Assumes loser and winner are integer arrays with the positions (from 0 to
+    n_players - 1) of the loser and the winner of each edge, and weights is a
+    float array with the positive weight of each edge.
+    Initial_score is an array with a starting score for each player (e.g. the
+    scores of the previous week), or None to start from equal scores.
+    Runs the WbW iterations where each loser gives her score to the players who
+    beat her in proportion to the weights of the losses, instead of their number.
+    Returns the array of scores.
+    """
+    loss_weight = np.bincount(loser, weights = weights, minlength = n_players)
+    never_lost = loss_weight == 0
+    edge_share = weights / np.where(never_lost, 1, loss_weight)[loser]
+
+    def iterate(score):
+        new_score = np.bincount(winner, weights = score[loser] * edge_share,
+                                minlength = n_players)
+        new_score += np.where(never_lost, score, 0)
+        return (new_score * 0.85) + (0.15 / n_players)
+
+    if initial_score is None:
+        initial_score = np.full(n_players, 1 / n_players)
+    score = iterate(initial_score)
+    sd = np.inf
+    n_iterations = 1
+    while sd > epsilon and n_iterations < max_iterations:
+        new_score = iterate(score)
+        sd = np.sqrt(np.mean((new_score - score) ** 2))
+        score = new_score
+        n_iterations += 1
+    profiling.add_count("iterations", n_iterations)
+
+    return score
+
+@profiling.profiled("decayed_wbw_ranking_arrays")
+def decayed_wbw_ranking_arrays(graph, date, decay = "exponential", half_life_weeks = 26,
+                               max_age_weeks = None, epsilon = 1e-10, max_iterations = 150,
+                               previous_ranking = None):
+    """
+    Assumes graph is a dictionary as returned by build_decayed_wbw_graph and date
+    is a datetime. Decay, half_life_weeks and max_age_weeks work as in
+    get_decay_weights; max_age_weeks also leaves out older matches with the
+    exponential decay (None takes all the matches). Epsilon and max_iterations
+    work as in wbw_ranking.
+    Previous_ranking is None or the (players, scores) arrays of a previous
+    call, used as the starting point of the iterations: when the date moves on
+    by a week, the exponential weights of the old matches are all rescaled by
+    the same factor, which does not change their shares, so the previous scores
+    are already close to the solution.
+
+    Ranks the players of the matches ended up to the date, with each match
+    weighted by its age (and round, see build_decayed_wbw_graph).
+    Returns three arrays ordered by ranking: the ids of the players, their
+    scores and their rankings.
+    """
+    ordinal = date.toordinal()
+    last = np.searchsorted(graph["end_ordinal"], ordinal, side = "right")
+    first = 0
+    if max_age_weeks != None:
+        first = np.searchsorted(graph["end_ordinal"], ordinal - 7 * max_age_weeks)
+
+    weights = graph["weight"][first:last] * get_decay_weights(
+        ordinal - graph["end_ordinal"][first:last], decay = decay,
+        half_life_weeks = half_life_weeks, max_age_weeks = max_age_weeks)
+    kept = weights > 0
+    players, loser, winner = get_players_in_order(graph["loser"][first:last][kept],
+                                                  graph["winner"][first:last][kept])
+    n_players = len(players)
+    if n_players == 0:
+        return players, np.array([], dtype = float), np.array([], dtype = np.int64)
+
+    initial_score = None
+    if previous_ranking != None:
+        previous_players, previous_scores = previous_ranking
+        scores_by_id = np.full(max(players.max(), previous_players.max(initial = 0)) + 1,
+                               1 / n_players)
+        scores_by_id[previous_players] = previous_scores
+        initial_score = scores_by_id[players]
+        initial_score = initial_score / initial_score.sum()
+
+    scores = solve_weighted_wbw(loser, winner, weights[kept], n_players, epsilon = epsilon,
+                                max_iterations = max_iterations,
+                                initial_score = initial_score)
+
+    return sort_ranking_arrays(players, scores)
+
+def weekly_decayed_wbw_rankings(graph, first_date, last_date, **decay_arguments):
+    """
+    Assumes graph is a dictionary as returned by build_decayed_wbw_graph,
+    first_date and last_date are datetimes, and decay_arguments are keyword
+    arguments of decayed_wbw_ranking_arrays.
+    Computes the decayed ranking every week from first_date to last_date, each
+    one starting from the scores of the previous week.
+    Returns a list of (date, players, scores, rankings) tuples.
+    """
+    weekly_rankings = []
+    previous_ranking = None
+    date = first_date
+    while date <= last_date:
+        players, scores, ranks = decayed_wbw_ranking_arrays(graph, date,
+                                                            previous_ranking = previous_ranking,
+                                                            **decay_arguments)
+        weekly_rankings.append((date, players, scores, ranks))
+        if len(players) > 0:
+            previous_ranking = (players, scores)
+        date += timedelta(weeks = 1)
+
+    return weekly_rankings
+
+
+# Streaming rating engine. Unlike the previous rankings, which are recomputed
+# from all the matches of a window, ratings are updated match by match in
+# chronological order, with constant work per match. The state is a dictionary
+# that can be saved, loaded and updated again with new matches.
+RATING_SYSTEMS = ["elo", "glicko"]
+
+def new_rating_state(system = "elo", initial_rating = 1500.0, k_factor = 32.0,
+                     initial_deviation = 350.0, min_deviation = 30.0,
+                     deviation_growth = 35.0, rating_period_days = 30):
+    """
+    Assumes system is "elo" or "glicko".
+    Initial_rating is the rating of a player before her first match. K_factor is
+    the maximum change of an Elo rating in a match.
+    The rest of the arguments are used by Glicko: initial_deviation is the
+    deviation of a new player (and the maximum deviation), min_deviation the
+    minimum one, and deviation_growth is how much the deviation of a player
+    grows for each rating period (of rating_period_days) without playing.
+
+    Returns a rating state: a dictionary with the "system", its "parameters",
+    the number of matches processed ("n_matches"), the end date (ordinal) of the
+    last match processed ("last_ordinal") and the "players", a dictionary keyed
+    by player id with the "rating", "deviation", "last_played" (ordinal of the
+    last match) and number of "matches" of each player.
+    """
+    if system not in RATING_SYSTEMS:
+        raise ValueError("System should be elo or glicko.")
+    if k_factor <= 0 or min_deviation <= 0 or initial_deviation < min_deviation:
+        raise ValueError("K_factor and the deviations must be positive, and the "
+                         "initial deviation cannot be lower than the minimum one.")
+
+    return {"system": system,
+            "parameters": {"initial_rating": initial_rating, "k_factor": k_factor,
+                           "initial_deviation": initial_deviation,
+                           "min_deviation": min_deviation,
+                           "deviation_growth": deviation_growth,
+                           "rating_period_days": rating_period_days},
+            "n_matches": 0,
+            "last_ordinal": None,
+            "players": {}}
+
+def get_current_deviation(state, player, ordinal):
+    """
+    Assumes state is a rating state, player a dictionary of state["players"] and
+    ordinal a date ordinal not earlier than her last match.
+    Returns the Glicko deviation of the player at that date, which grows with
+    the time passed since her last match.
+    """
+    parameters = state["parameters"]
+    periods = (ordinal - player["last_played"]) / parameters["rating_period_days"]
+    deviation = math.sqrt(player["deviation"] ** 2 +
+                          parameters["deviation_growth"] ** 2 * periods)
+
+    return min(deviation, parameters["initial_deviation"])
+
+def update_rating(state, match):
+    """
+    Assumes state is a rating state and match is a dictionary with a match that
+    was played after the ones already processed.
+    Updates the ratings of both players with the result of the match.
+    """
+    parameters = state["parameters"]
+    ordinal = match["end_ordinal"]
+    players = state["players"]
+    for player_id in [match["player_1_id"], match["player_2_id"]]:
+        if player_id not in players:
+            players[player_id] = {"rating": parameters["initial_rating"],
+                                  "deviation": parameters["initial_deviation"],
+                                  "last_played": ordinal, "matches": 0}
+    winner = players[match["winner_id"]]
+    if match["player_1_id"] == match["winner_id"]:
+        loser = players[match["player_2_id"]]
+    else:
+        loser = players[match["player_1_id"]]
+
+    if state["system"] == "elo":
+        expected = 1 / (1 + 10 ** ((loser["rating"] - winner["rating"]) / 400))
+        change = parameters["k_factor"] * (1 - expected)
+        winner["rating"] += change
+        loser["rating"] -= change
+    else:
+        # Glicko update of a rating period with a single game, computed for
+        # both players from their ratings before the match.
+        q = math.log(10) / 400
+        deviations = [get_current_deviation(state, winner, ordinal),
+                      get_current_deviation(state, loser, ordinal)]
+        new_values = []
+        for n_player, (player, opponent, score) in enumerate([(winner, loser, 1),
+                                                              (loser, winner, 0)]):
+            deviation = deviations[n_player]
+            opponent_g = 1 / math.sqrt(1 + 3 * q ** 2 * deviations[1 - n_player] ** 2 /
+                                       math.pi ** 2)
+            expected = 1 / (1 + 10 ** (-opponent_g * (player["rating"] - opponent["rating"]) /
+                                       400))
+            inverse_variance = (1 / deviation ** 2 +
+                                q ** 2 * opponent_g ** 2 * expected * (1 - expected))
+            rating = player["rating"] + q / inverse_variance * opponent_g * (score - expected)
+            deviation = max(math.sqrt(1 / inverse_variance), parameters["min_deviation"])
+            new_values.append((rating, deviation))
+        for player, (rating, deviation) in zip([winner, loser], new_values):
+            player["rating"] = rating
+            player["deviation"] = deviation
+
+    for player in [winner, loser]:
+        player["last_played"] = ordinal
+        player["matches"] += 1
+    state["n_matches"] += 1
+    state["last_ordinal"] = ordinal
+
+@profiling.profiled("update_ratings", profiling.count_first_argument)
+def update_ratings(matches, state, until_date = None):
+    """
+    Assumes matches is a list of dictionaries ordered by date, where each
+    dictionary is a match, and state is a rating state whose first
+    state["n_matches"] matches were already processed: those are skipped, so
+    the same growing list (e.g. during a tournament week) can be passed again
+    and only the new matches are processed.
+    Until_date (datetime) stops the updates before the first match ended after
+    that date.
+    Returns the state, updated in place.
+    """
+    until_ordinal = None
+    if until_date != None:
+        until_ordinal = until_date.toordinal()
+
+    for n_match in range(state["n_matches"], len(matches)):
+        match = matches[n_match]
+        if until_ordinal != None and match["end_ordinal"] > until_ordinal:
+            break
+        update_rating(state, match)
+
+    return state
+
+def rating_ranking(state, date = None, min_matches = 1, resolve_names = True,
+                   active_since = None):
+    """
+    Assumes state is a rating state, date is a datetime (or None for the date of
+    the last match processed) and min_matches is the minimum number of matches
+    for a player to be ranked. Active_since is None or a datetime: only the
+    players whose last match ended on or after it are ranked (e.g. to leave out
+    the retired players), otherwise every player seen is.
+    The ratings are those of the state as it is: date is only the "now" at which
+    the Glicko deviations are decayed, it does not select the matches. For the
+    ratings at a past date, the state must be updated until it (see the
+    until_date of update_ratings).
+    Returns a snapshot of the ratings, as wbw_ranking does: a list of lists
+    [[player, rating, ranking]] ordered by ranking and a dictionary
+    {player: [rating, ranking]}. With Glicko, the dictionary also stores the
+    deviation at that date: {player: [rating, ranking, deviation]}.
+    """
+    ordinal = state["last_ordinal"]
+    if date != None:
+        ordinal = date.toordinal()
+
+    first_ordinal = active_since.toordinal() if active_since != None else None
+    ranked = [player_id for player_id, player in state["players"].items()
+              if player["matches"] >= min_matches and
+              (first_ordinal == None or player["last_played"] >= first_ordinal)]
+    ranked.sort(key = lambda player_id: state["players"][player_id]["rating"], reverse = True)
+    ranking_list = []
+    ranking_dict = {}
+    for ranking, player_id in enumerate(ranked, 1):
+        player = state["players"][player_id]
+        name = player_id
+        if resolve_names == True:
+            name = symbols.get_symbol_name(symbols.PLAYERS, player_id)
+        ranking_list.append([name, player["rating"], ranking])
+        ranking_dict[name] = [player["rating"], ranking]
+        if state["system"] == "glicko":
+            ranking_dict[name].append(get_current_deviation(state, player,
+                                                            max(ordinal, player["last_played"])))
+
+    return ranking_list, ranking_dict
+
+def save_rating_state(state, file):
+    """
+    Assumes state is a rating state and file is the path of a json file.
+    Writes the state, with the players keyed by name so that it can be loaded
+    in a session where the ids are assigned differently.
+    """
+    names = symbols.PLAYERS["names"]
+    data = dict(state, players = {names[player_id]: player
+                                  for player_id, player in state["players"].items()})
+    with open(file, "w") as f:
+        json.dump(data, f)
+
+def load_rating_state(file):
+    """
+    Assumes file is a json file written by save_rating_state.
+    Returns the rating state, with the players keyed by their ids in the
+    shared symbol table (names not seen yet are added to it).
+    """
+    with open(file) as f:
+        data = json.load(f)
+    data["players"] = {symbols.intern_symbol(symbols.PLAYERS, name): player
+                       for name, player in data["players"].items()}
+
+    return data
+
 def print_top_n_ranking(matches, ranking_function, top_n_players, year = None,
                         epsilon = 1e-10, max_iterations = 150):
     """
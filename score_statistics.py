@@ -0,0 +1,148 @@
+def main():
+    print("Score statistics module")
+
+import numpy as np
+import rankings
+import tennis_columnar as columnar
+import tennis_data_manipulation as manip
+import tennis_symbols as symbols
+
+# Statistics computed for each player, in this order. The percentages are
+# computed from the counts that precede them.
+SCORE_STATISTICS = ["matches", "games_won", "games_played", "games_won_percentage",
+                    "tiebreaks_won", "tiebreaks_played", "tiebreaks_won_percentage",
+                    "deciding_sets_won", "deciding_sets_played", "deciding_sets_won_percentage",
+                    "bagels_won", "bagels_lost"]
+
+def add_set_scores(index, matches):
+    """
+    Assumes index is a dictionary as returned by tennis_filters.build_match_index
+    for matches.
+    Stores in index the games of every set as an integer array of shape (number
+    of matches, number of sets, 2) under "sets_games" (see
+    tennis_data_manipulation.get_sets_games), once for all the statistics.
+    Returns index.
+    """
+    if "sets_games" not in index:
+        index["sets_games"] = manip.get_sets_games(matches, columnar.get_sets_columns(matches))
+
+    return index
+
+def get_side_counts(sets_games, best_of, retired_side):
+    """
+    Assumes sets_games is an integer array as returned by
+    tennis_data_manipulation.get_sets_games, and best_of and retired_side are
+    the arrays of the same matches.
+    Returns two integer arrays of shape (number of matches, 7) with the counts
+    of player 1 and player 2 in each match: games won, games played, tiebreaks
+    won and played, deciding sets won and played (only in completed matches
+    that went the distance) and bagels (6-0 sets) won.
+    """
+    games_1 = sets_games[:, :, 0].astype(np.int64)
+    games_2 = sets_games[:, :, 1].astype(np.int64)
+    played = games_1 >= 0
+    won_1 = played & (games_1 > games_2)
+    won_2 = played & (games_2 > games_1)
+    tiebreak = played & (np.maximum(games_1, games_2) == 7) & (np.minimum(games_1, games_2) == 6)
+    n_played = played.sum(axis = 1)
+
+    deciding = (n_played == best_of) & (retired_side == 0)
+    last_set = np.maximum(n_played - 1, 0)
+    last_won_1 = won_1[np.arange(len(n_played)), last_set]
+    games_played = np.where(played, games_1 + games_2, 0).sum(axis = 1)
+    tiebreaks_played = tiebreak.sum(axis = 1)
+
+    counts_1 = np.column_stack([np.where(played, games_1, 0).sum(axis = 1), games_played,
+                                (tiebreak & won_1).sum(axis = 1), tiebreaks_played,
+                                deciding & last_won_1, deciding,
+                                (played & (games_1 == 6) & (games_2 == 0)).sum(axis = 1)])
+    counts_2 = np.column_stack([np.where(played, games_2, 0).sum(axis = 1), games_played,
+                                (tiebreak & won_2).sum(axis = 1), tiebreaks_played,
+                                deciding & ~last_won_1, deciding,
+                                (played & (games_2 == 6) & (games_1 == 0)).sum(axis = 1)])
+
+    return counts_1.astype(np.int64), counts_2.astype(np.int64)
+
+def get_score_statistics(index, mask = None, year = None, weeks = None, start_date = None,
+                         min_matches = 1):
+    """
+    Assumes index is a dictionary as returned by tennis_filters.build_match_index
+    with the set scores added (see add_set_scores). Mask is None or a boolean
+    array selecting a subset of the matches (see tennis_filters.get_filter_mask),
+    and year, weeks and start_date select the window of matches as in
+    rankings.wbw_ranking.
+    Computes the counts of every player at once, adding the counts of the
+    matches where she was player 1 and those where she was player 2.
+    Returns a dictionary of arrays with the "player_id" of the players with at
+    least min_matches matches and each of SCORE_STATISTICS (the percentages are
+    NaN when nothing was played).
+    """
+    columns = index["columns"]
+    window = rankings.get_ranking_window(columns, year = year, weeks = weeks,
+                                         start_date = start_date, mask = mask)
+    counts_1, counts_2 = get_side_counts(index["sets_games"][window], columns["best_of"][window],
+                                         columns["retired_side"][window])
+    bagels_lost_1 = counts_2[:, 6]
+    bagels_lost_2 = counts_1[:, 6]
+    counts = np.r_[np.column_stack([np.ones(len(counts_1), dtype = np.int64), counts_1,
+                                    bagels_lost_1]),
+                   np.column_stack([np.ones(len(counts_2), dtype = np.int64), counts_2,
+                                    bagels_lost_2])]
+    player_ids = np.r_[columns["player_1_id"][window], columns["player_2_id"][window]]
+
+    n_ids = int(player_ids.max(initial = -1)) + 1
+    totals = np.column_stack([np.bincount(player_ids, weights = counts[:, n_count],
+                                          minlength = n_ids)
+                              for n_count in range(counts.shape[1])]).astype(np.int64)
+    players = np.flatnonzero(totals[:, 0] >= max(min_matches, 1))
+    totals = totals[players]
+
+    def percentage(won, played):
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            return np.where(played > 0, 100 * won / played, np.nan)
+
+    statistics = {"player_id": players, "matches": totals[:, 0],
+                  "games_won": totals[:, 1], "games_played": totals[:, 2],
+                  "tiebreaks_won": totals[:, 3], "tiebreaks_played": totals[:, 4],
+                  "deciding_sets_won": totals[:, 5], "deciding_sets_played": totals[:, 6],
+                  "bagels_won": totals[:, 7], "bagels_lost": totals[:, 8]}
+    for count in ["games", "tiebreaks", "deciding_sets"]:
+        statistics[count + "_won_percentage"] = percentage(statistics[count + "_won"],
+                                                           statistics[count + "_played"])
+
+    return statistics
+
+def get_player_score_statistics(statistics, player):
+    """
+    Assumes statistics is a dictionary as returned by get_score_statistics and
+    player is the name of a player.
+    Returns a dictionary with the SCORE_STATISTICS of the player, or None if she
+    is not in the statistics.
+    """
+    player_id = symbols.get_symbol_id(symbols.PLAYERS, player)
+    position = np.flatnonzero(statistics["player_id"] == player_id)
+    if player_id == None or len(position) == 0:
+        return None
+
+    return {statistic: statistics[statistic][position[0]].item()
+            for statistic in SCORE_STATISTICS}
+
+def get_score_statistics_table(statistics, sort_by = "games_won_percentage", top = None):
+    """
+    Assumes statistics is a dictionary as returned by get_score_statistics and
+    sort_by is one of SCORE_STATISTICS.
+    Returns a list of [player, SCORE_STATISTICS...] rows sorted by sort_by in
+    descending order (NaN last), with at most top rows (all if None).
+    """
+    values = statistics[sort_by].astype(float)
+    order = np.argsort(-np.nan_to_num(values, nan = -np.inf), kind = "stable")
+    if top != None:
+        order = order[:top]
+    names = symbols.get_symbol_names(symbols.PLAYERS, statistics["player_id"][order].tolist())
+    columns = [statistics[statistic][order].tolist() for statistic in SCORE_STATISTICS]
+
+    return [[name] + list(row) for name, row in zip(names, zip(*columns))]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+def main():
+    print("Tennis brackets module")
+
+import numpy as np
+import tennis_data_manipulation as manip
+import tennis_profiling as profiling
+import tennis_symbols as symbols
+
+# Rounds that are not part of the knockout draw.
+ROUNDS_OUT_OF_DRAW = ["Round Robin", "Third Place"]
+
+@profiling.profiled("build_brackets", profiling.count_first_argument)
+def build_brackets(matches):
+    """
+    Assumes matches is a list of dictionaries ordered by date, where each
+    dictionary is a match with its round added (see tennis_rounds.add_round).
+    Reconstructs the draw tree of every edition of every tournament at once.
+    An edition is a block of matches of the same tournament (the two parts of a
+    tournament splitted between the 31st of December and the 1st of January are
+    one edition). In the tree, each knockout match is fed by the previous
+    matches of its two players, and feeds the next match of its winner.
+
+    Returns the brackets: a dictionary of arrays with one value per match,
+        "edition": the edition of the match.
+        "in_draw": False for the matches of ROUNDS_OUT_OF_DRAW.
+        "child_1" and "child_2": the previous match of player 1 and player 2 in
+        the draw (-1 for the first match of a player, e.g. after a bye).
+        "parent": the next match of the winner in the draw (-1 after the final).
+        "round_id", "player_1_id", "player_2_id" and "winner_id".
+    and the tables:
+        "rounds": the symbol table of the round names.
+        "editions": a dictionary keyed by (tournament id, year of the last match)
+        with the number of the edition.
+        "edition_root": the last match of the draw of each edition (its final).
+        "appearance_key", "appearance_match": the matches of each player in each
+        edition, sorted by (edition, player) keys and date, to find the path
+        of a player with a binary search.
+    """
+    columns = manip.get_match_columns(matches)
+    n_matches = len(matches)
+    rounds = symbols.new_symbol_table()
+    round_id = np.array([symbols.intern_symbol(rounds, match["round"]) for match in matches],
+                        dtype = np.int64)
+    out_of_draw = [symbols.get_symbol_id(rounds, name) for name in ROUNDS_OUT_OF_DRAW]
+    in_draw = ~np.isin(round_id, [symbol_id for symbol_id in out_of_draw if symbol_id != None])
+
+    # Blocks of matches of the same tournament and start date. As in add_round,
+    # a block starting on the 1st of January continues the previous block of the
+    # same tournament if it ended on the 31st of December (the December parts of
+    # several splitted tournaments may come before their January parts).
+    tournament_id = columns["tournament_id"]
+    start = columns["start_ordinal"]
+    new_block = np.r_[True, (tournament_id[1:] != tournament_id[:-1]) |
+                            (start[1:] != start[:-1])]
+    block = np.cumsum(new_block) - 1
+    block_first = np.flatnonzero(new_block)
+    block_last = np.r_[block_first[1:] - 1, n_matches - 1]
+    block_tournament = tournament_id[block_first]
+    block_order = np.lexsort((np.arange(len(block_first)), block_tournament))
+    same_tournament = block_tournament[block_order[1:]] == block_tournament[block_order[:-1]]
+    continues = (same_tournament & columns["is_year_end"][block_last[block_order[:-1]]] &
+                 columns["is_year_start"][block_first[block_order[1:]]])
+    previous_block = np.arange(len(block_first))
+    previous_block[block_order[1:][continues]] = block_order[:-1][continues]
+    new_edition = previous_block == np.arange(len(block_first))
+    block_edition = np.cumsum(new_edition) - 1
+    block_edition = block_edition[previous_block]
+    edition = block_edition[block]
+    n_editions = int(new_edition.sum())
+    n_ids = int(max(columns["player_1_id"].max(initial = 0),
+                    columns["player_2_id"].max(initial = 0))) + 1
+
+    # Appearances of the players in the draw, sorted by edition, player and date:
+    # consecutive appearances of a player are linked in the tree.
+    draw_matches = np.flatnonzero(in_draw)
+    appearance_match = np.r_[draw_matches, draw_matches]
+    appearance_player = np.r_[columns["player_1_id"][draw_matches],
+                              columns["player_2_id"][draw_matches]]
+    appearance_side = np.r_[np.ones(len(draw_matches), dtype = np.int64),
+                            np.full(len(draw_matches), 2, dtype = np.int64)]
+    appearance_key = edition[appearance_match] * n_ids + appearance_player
+    order = np.lexsort((appearance_match, appearance_key))
+    appearance_key = appearance_key[order]
+    appearance_match = appearance_match[order]
+    appearance_side = appearance_side[order]
+
+    linked = np.flatnonzero(appearance_key[1:] == appearance_key[:-1])
+    previous_match = appearance_match[linked]
+    next_match = appearance_match[linked + 1]
+    next_side = appearance_side[linked + 1]
+    child_1 = np.full(n_matches, -1, dtype = np.int64)
+    child_2 = np.full(n_matches, -1, dtype = np.int64)
+    parent = np.full(n_matches, -1, dtype = np.int64)
+    child_1[next_match[next_side == 1]] = previous_match[next_side == 1]
+    child_2[next_match[next_side == 2]] = previous_match[next_side == 2]
+    parent[previous_match] = next_match
+
+    # The root of each edition is its last match in the draw without a parent.
+    roots = draw_matches[parent[draw_matches] == -1]
+    edition_root = np.full(n_editions, -1, dtype = np.int64)
+    np.maximum.at(edition_root, edition[roots], roots)
+    last_match = np.full(n_editions, -1, dtype = np.int64)
+    np.maximum.at(last_match, edition, np.arange(n_matches))
+    editions = {(tournament, year): n_edition for n_edition, (tournament, year) in
+                enumerate(zip(tournament_id[last_match].tolist(),
+                              columns["year"][last_match].tolist()))}
+
+    return {"edition": edition, "in_draw": in_draw, "child_1": child_1, "child_2": child_2,
+            "parent": parent, "round_id": round_id,
+            "player_1_id": columns["player_1_id"], "player_2_id": columns["player_2_id"],
+            "winner_id": columns["winner_id"], "rounds": rounds, "editions": editions,
+            "edition_root": edition_root, "n_ids": n_ids,
+            "appearance_key": appearance_key, "appearance_match": appearance_match}
+
+def get_edition(brackets, tournament, year):
+    """
+    Assumes brackets is a dictionary as returned by build_brackets, tournament
+    is the name of a tournament and year is an integer (the year of its final).
+    Returns the number of the edition, or None if it is not in the brackets.
+    """
+    tournament_id = symbols.get_symbol_id(symbols.TOURNAMENTS, tournament)
+
+    return brackets["editions"].get((tournament_id, year))
+
+def get_player_matches(brackets, edition, player_id):
+    """
+    Assumes brackets is a dictionary as returned by build_brackets, edition is
+    the number of an edition and player_id the id of a player.
+    Returns the array of the matches of the player in the draw of the edition,
+    in the order they were played.
+    """
+    key = edition * brackets["n_ids"] + player_id
+    first = np.searchsorted(brackets["appearance_key"], key)
+    last = np.searchsorted(brackets["appearance_key"], key, side = "right")
+
+    return brackets["appearance_match"][first:last]
+
+def get_path(brackets, tournament, year, player):
+    """
+    Assumes brackets is a dictionary as returned by build_brackets, tournament
+    and player are names and year is the year of the final of the tournament.
+    Returns the path of the player in the draw: a list of dictionaries with the
+    "round", the "opponent" and whether the player "won" each match (an empty
+    list if she did not play the draw).
+    """
+    edition = get_edition(brackets, tournament, year)
+    player_id = symbols.get_symbol_id(symbols.PLAYERS, player)
+    if edition == None or player_id == None:
+        return []
+
+    path = []
+    for match in get_player_matches(brackets, edition, player_id).tolist():
+        opponent = brackets["player_2_id"][match]
+        if opponent == player_id:
+            opponent = brackets["player_1_id"][match]
+        path.append({"round": symbols.get_symbol_name(brackets["rounds"],
+                                                      brackets["round_id"][match]),
+                     "opponent": symbols.get_symbol_name(symbols.PLAYERS, opponent),
+                     "won": bool(brackets["winner_id"][match] == player_id)})
+
+    return path
+
+def get_subtree_players(brackets, match):
+    """
+    Assumes brackets is a dictionary as returned by build_brackets and match is a
+    match of the draw.
+    Returns the list of ids of the players who played the matches that fed this
+    one (including it): the players who could have reached it.
+    """
+    players = []
+    stack = [match]
+    while stack != []:
+        match = stack.pop()
+        players.extend([int(brackets["player_1_id"][match]), int(brackets["player_2_id"][match])])
+        for child in [brackets["child_1"][match], brackets["child_2"][match]]:
+            if child != -1:
+                stack.append(int(child))
+
+    return sorted(set(players))
+
+def get_potential_opponents(brackets, tournament, year, player):
+    """
+    Assumes brackets is a dictionary as returned by build_brackets, tournament
+    and player are names and year is the year of the final of the tournament.
+    Walks up the draw from the first match of the player to the final. At each
+    round, the potential opponents of the player are the players of the other
+    half of the draw that met hers in that round, whether or not she got there.
+    Returns a list of (round, list of player names) tuples, from her first round
+    to the final (an empty list if she did not play the draw).
+    """
+    edition = get_edition(brackets, tournament, year)
+    player_id = symbols.get_symbol_id(symbols.PLAYERS, player)
+    if edition == None or player_id == None:
+        return []
+    player_matches = get_player_matches(brackets, edition, player_id)
+    if len(player_matches) == 0:
+        return []
+
+    current = int(player_matches[0])
+    opponent = brackets["player_2_id"][current]
+    if opponent == player_id:
+        opponent = brackets["player_1_id"][current]
+    opponents = [(symbols.get_symbol_name(brackets["rounds"], brackets["round_id"][current]),
+                  [symbols.get_symbol_name(symbols.PLAYERS, opponent)])]
+    own_players = set(get_subtree_players(brackets, current))
+
+    while brackets["parent"][current] != -1:
+        match = int(brackets["parent"][current])
+        if brackets["child_1"][match] == current:
+            sibling, side_player = brackets["child_2"][match], brackets["player_2_id"][match]
+        else:
+            sibling, side_player = brackets["child_1"][match], brackets["player_1_id"][match]
+        # Without a previous match, the player of the other side had a bye.
+        if sibling == -1:
+            players = [int(side_player)]
+        else:
+            players = [other for other in get_subtree_players(brackets, int(sibling))
+                       if other not in own_players]
+        opponents.append((symbols.get_symbol_name(brackets["rounds"], brackets["round_id"][match]),
+                          symbols.get_symbol_names(symbols.PLAYERS, players)))
+        own_players.update(players)
+        current = match
+
+    return opponents
+
+
+if __name__ == "__main__":
+    main()
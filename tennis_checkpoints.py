@@ -0,0 +1,141 @@
+def main():
+    print("Tennis checkpoints module")
+
+import hashlib
+import json
+import os
+import numpy as np
+import tennis_symbols as symbols
+
+def get_chunk_file(file, n_chunk):
+    """
+    Assumes file is the path of a checkpoint and n_chunk a non-negative integer.
+    Returns the path of the file of that chunk of the checkpoint.
+    """
+    return file + "." + str(n_chunk) + ".npz"
+
+def write_npz(file, arrays):
+    """
+    Assumes file is the path of a '.npz' file and arrays is a dictionary of
+    NumPy arrays.
+    Writes the arrays to a temporary file and then replaces the previous file,
+    so that a process killed while writing leaves the previous one whole.
+    """
+    temporary_file = file + ".tmp.npz"
+    np.savez_compressed(temporary_file, **arrays)
+    os.replace(temporary_file, file)
+
+def save_checkpoint(file, parameters, arrays, append = False):
+    """
+    Assumes file is the path of the checkpoint ('.npz'), parameters is a
+    dictionary of the arguments that define the computation (numbers, strings
+    and dictionaries of them) and arrays is a dictionary of NumPy arrays with
+    its state.
+    If append is True, arrays only has the state computed since the last save
+    and is added as a new chunk of the checkpoint, so that each save costs the
+    new state only; otherwise it replaces the whole checkpoint.
+    The chunk is written to its own file ('file.<n>.npz') before the checkpoint,
+    which only stores the parameters and the number of chunks, is replaced: a
+    process killed while writing leaves the last checkpoint whole.
+    """
+    n_chunks = 0
+    if append and os.path.exists(file):
+        with np.load(file) as data:
+            n_chunks = int(data["n_chunks"])
+    write_npz(get_chunk_file(file, n_chunks), arrays)
+    write_npz(file, {"parameters": np.array(json.dumps(parameters)),
+                     "n_chunks": np.array(n_chunks + 1)})
+
+def load_checkpoint(file, parameters):
+    """
+    Assumes file is the path of a checkpoint written by save_checkpoint (or of a
+    file not written yet) and parameters is the dictionary of the arguments of
+    the computation to resume.
+    Returns the list of the chunks of the checkpoint in the order they were
+    saved, each one a dictionary of arrays, or None if the file does not exist.
+    Raises a ValueError if the checkpoint was written with other parameters.
+    """
+    if file == None or not os.path.exists(file):
+        return None
+
+    with np.load(file) as data:
+        stored_parameters = json.loads(str(data["parameters"]))
+        n_chunks = int(data["n_chunks"])
+    if stored_parameters != json.loads(json.dumps(parameters)):
+        raise ValueError("The checkpoint " + file + " was written with other parameters: " +
+                         str(stored_parameters))
+
+    chunks = []
+    for n_chunk in range(n_chunks):
+        with np.load(get_chunk_file(file, n_chunk)) as data:
+            chunks.append({name: data[name] for name in data.files})
+    return chunks
+
+def encode_players(player_ids):
+    """
+    Assumes player_ids is an integer array of ids of the shared symbol table.
+    Returns two arrays: the names of the distinct players and the position of
+    each player in them, which do not depend on the order in which the names
+    were added to the table in the session that wrote them.
+    """
+    stored_ids, name_index = np.unique(player_ids, return_inverse = True)
+    names = np.array(symbols.get_symbol_names(symbols.PLAYERS, stored_ids.tolist()), dtype = str)
+
+    return names, name_index.astype(np.int32)
+
+def decode_players(names, name_index):
+    """
+    Assumes names and name_index are arrays as returned by encode_players.
+    Returns the integer array of the ids of the players in the shared symbol
+    table (names not seen yet are added to it).
+    """
+    player_ids = np.array([symbols.intern_symbol(symbols.PLAYERS, name)
+                           for name in names.tolist()], dtype = np.int64)
+
+    return player_ids[name_index] if len(player_ids) > 0 else np.array([], dtype = np.int64)
+
+def get_data_fingerprint(columns):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns.
+    Returns a dictionary that identifies the matches, to be stored with the
+    parameters of a checkpoint: the number of matches, the start ordinal of the
+    first one, the end ordinal of the last one and a digest of the players,
+    winners and ordinals (computed from the names, so that it is the same in
+    every session).
+    """
+    n_matches = len(columns["start_ordinal"])
+    names, name_index = encode_players(np.concatenate([columns["player_1_id"],
+                                                       columns["player_2_id"],
+                                                       columns["winner_id"]]))
+    name_order = np.argsort(names)
+    name_rank = np.empty(len(names), dtype = np.int64)
+    name_rank[name_order] = np.arange(len(names))
+
+    digest = hashlib.sha256("\n".join(names[name_order].tolist()).encode())
+    for values in [name_rank[name_index], columns["start_ordinal"], columns["end_ordinal"]]:
+        digest.update(np.ascontiguousarray(values, dtype = np.int64).tobytes())
+
+    return {"n_matches": n_matches,
+            "first_ordinal": int(columns["start_ordinal"][0]) if n_matches > 0 else None,
+            "last_ordinal": int(columns["end_ordinal"][-1]) if n_matches > 0 else None,
+            "digest": digest.hexdigest()}
+
+def get_mask_digest(mask):
+    """
+    Assumes mask is None or a boolean array selecting matches.
+    Returns a digest of the mask to be stored with the parameters of a
+    checkpoint (None if there is no mask).
+    """
+    if mask is None:
+        return None
+
+    mask = np.asarray(mask, dtype = bool)
+    digest = hashlib.sha256(str(len(mask)).encode())
+    digest.update(np.packbits(mask).tobytes())
+
+    return digest.hexdigest()
+
+
+if __name__ == "__main__":
+    main()
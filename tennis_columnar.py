@@ -0,0 +1,221 @@
+def main():
+    print("Tennis columnar module")
+
+import importlib.util
+import json
+import math
+import os
+from datetime import datetime as dt
+import numpy as np
+import tennis_data_manipulation as manip
+import tennis_dates as dates
+import tennis_symbols as symbols
+
+# Columns stored for each match (the sets are added as "set_n_1" and "set_n_2",
+# with the games of each player or -1 if the set was not played). The rest of
+# the fields of the matches are derived from them when loading.
+EXPORT_COLUMNS = {"tournament": str, "start_ordinal": np.int32, "end_ordinal": np.int32,
+                  "year": np.int16, "best_of": np.int8, "player_1": str, "player_2": str,
+                  "rank_1": np.float64, "rank_2": np.float64, "comment": str,
+                  "winner_side": np.int8, "retired_side": np.int8, "round": str}
+
+# Name of the index file of the NumPy format, which stores one '.npz' file per year.
+NPZ_INDEX_FILE = "index.json"
+
+def has_pyarrow():
+    """
+    Returns True if pyarrow is installed, without importing it.
+    """
+    return importlib.util.find_spec("pyarrow") != None
+
+def get_sets_columns(matches):
+    """
+    Assumes matches is a list of dictionaries, where each dictionary is a match.
+    Returns the list of set fields of the matches ("set_1", "set_2", ...).
+    """
+    if matches == []:
+        return []
+    sets_columns = [field for field in matches[0] if field.startswith("set_")]
+    sets_columns.sort(key = lambda field: int(field[4:]))
+
+    return sets_columns
+
+def get_export_columns(matches):
+    """
+    Assumes matches is a list of dictionaries, where each dictionary is a match
+    as returned by the reading functions (with or without rounds).
+    Returns a dictionary of NumPy arrays with the columns of EXPORT_COLUMNS and
+    the games of each set.
+    """
+    columns = {}
+    for column, dtype in EXPORT_COLUMNS.items():
+        if column == "round":
+            columns[column] = np.array([match.get("round", "") for match in matches], dtype = str)
+        else:
+            columns[column] = np.array([match[column] for match in matches], dtype = dtype)
+
+    sets_columns = get_sets_columns(matches)
+    sets_games = manip.get_sets_games(matches, sets_columns).astype(np.int8)
+    for n_set, set_column in enumerate(sets_columns):
+        columns[set_column + "_1"] = sets_games[:, n_set, 0]
+        columns[set_column + "_2"] = sets_games[:, n_set, 1]
+
+    return columns
+
+def export_matches(matches, path, file_format = None):
+    """
+    Assumes matches is a list of dictionaries ordered by date, as returned by
+    tennis_data_reading.read_append_all_csvs, and path is the file (Parquet) or
+    directory (NumPy) to write.
+    File_format can take three values: "parquet", "npz" and None, which chooses
+    Parquet if pyarrow is installed, or the NumPy format otherwise.
+    Both formats store the data by columns with one group of rows per year, so
+    that read_match_columns can skip the years and columns it does not need.
+    Returns the format used.
+    """
+    if file_format == None:
+        file_format = "parquet" if has_pyarrow() else "npz"
+    if file_format not in ["parquet", "npz"]:
+        raise ValueError("File_format should be parquet or npz.")
+
+    columns = get_export_columns(matches)
+    years = np.unique(columns["year"]).tolist()
+    if file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = None
+        writer = None
+        for year in years:
+            rows = columns["year"] == year
+            table = pa.table({column: values[rows] for column, values in columns.items()})
+            if writer == None:
+                schema = table.schema.with_metadata({"row_group_years": json.dumps(years)})
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table.cast(schema), row_group_size = len(table))
+        if writer != None:
+            writer.close()
+    else:
+        os.makedirs(path, exist_ok = True)
+        for year in years:
+            rows = columns["year"] == year
+            np.savez_compressed(os.path.join(path, str(year) + ".npz"),
+                                **{column: values[rows] for column, values in columns.items()})
+        with open(os.path.join(path, NPZ_INDEX_FILE), "w") as f:
+            json.dump({"years": years, "columns": list(columns)}, f)
+
+    return file_format
+
+def get_stored_years(path):
+    """
+    Assumes path was written by export_matches.
+    Returns the list of years stored, reading only the index or the metadata.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, NPZ_INDEX_FILE)) as f:
+            return json.load(f)["years"]
+
+    import pyarrow.parquet as pq
+
+    return json.loads(pq.ParquetFile(path).schema_arrow.metadata[b"row_group_years"])
+
+def read_match_columns(path, years = None, columns = None):
+    """
+    Assumes path was written by export_matches (a Parquet file or a directory
+    in the NumPy format), years is None or an iterable of the years to read
+    and columns is None or a list of the columns to read.
+    Only the groups of rows of those years and the columns asked are read.
+    Returns a dictionary of NumPy arrays, one per column.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, NPZ_INDEX_FILE)) as f:
+            index = json.load(f)
+        stored_years = index["years"]
+        if columns == None:
+            columns = index["columns"]
+        if years != None:
+            stored_years = [year for year in stored_years if year in set(years)]
+
+        parts = {column: [] for column in columns}
+        for year in stored_years:
+            # Each array of a '.npz' file is only decompressed when accessed.
+            with np.load(os.path.join(path, str(year) + ".npz")) as data:
+                for column in columns:
+                    parts[column].append(data[column])
+        return {column: np.concatenate(values) if values != [] else np.array([])
+                for column, values in parts.items()}
+
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    stored_years = json.loads(parquet_file.schema_arrow.metadata[b"row_group_years"])
+    row_groups = list(range(len(stored_years)))
+    if years != None:
+        row_groups = [n_group for n_group in row_groups if stored_years[n_group] in set(years)]
+    table = parquet_file.read_row_groups(row_groups, columns = columns)
+
+    result = {}
+    for column in table.column_names:
+        values = table.column(column).to_numpy(zero_copy_only = False)
+        if values.dtype == object:
+            values = values.astype(str)
+        result[column] = values
+    return result
+
+def load_matches(path, years = None):
+    """
+    Assumes path was written by export_matches and years is None or an iterable
+    of the years to load. The names are interned in the shared symbol tables,
+    as in tennis_data_reading.read_wta_csv.
+    Returns the list of dictionaries of the matches, with the same fields as
+    tennis_data_reading.read_append_all_csvs (the "round" only if it was
+    exported), without parsing the csv files or inferring the rounds again.
+    """
+    players = symbols.PLAYERS
+    tournaments = symbols.TOURNAMENTS
+
+    columns = read_match_columns(path, years = years)
+    n_sets = len([column for column in columns
+                  if column.startswith("set_") and column.endswith("_1")])
+    has_round = len(columns["round"]) > 0 and columns["round"][0] != ""
+
+    date_fields = {}
+    matches = []
+    lists = {column: values.tolist() for column, values in columns.items()}
+    for n_match in range(len(lists["year"])):
+        ordinals = (lists["start_ordinal"][n_match], lists["end_ordinal"][n_match])
+        if ordinals not in date_fields:
+            date_fields[ordinals] = dates.get_date_fields(
+                dt.fromordinal(ordinals[0]).strftime("%Y-%m-%d"),
+                dt.fromordinal(ordinals[1]).strftime("%Y-%m-%d"))
+        player_1_id = symbols.intern_symbol(players, lists["player_1"][n_match])
+        player_2_id = symbols.intern_symbol(players, lists["player_2"][n_match])
+        tournament_id = symbols.intern_symbol(tournaments, lists["tournament"][n_match])
+
+        match = {"tournament": symbols.get_symbol_name(tournaments, tournament_id),
+                 "best_of": lists["best_of"][n_match],
+                 "player_1": symbols.get_symbol_name(players, player_1_id),
+                 "player_2": symbols.get_symbol_name(players, player_2_id),
+                 "rank_1": lists["rank_1"][n_match],
+                 "rank_2": lists["rank_2"][n_match]}
+        for n_set in range(1, n_sets + 1):
+            games = [lists["set_" + str(n_set) + "_1"][n_match],
+                     lists["set_" + str(n_set) + "_2"][n_match]]
+            match["set_" + str(n_set)] = games if games[0] >= 0 else math.nan
+        match["comment"] = lists["comment"][n_match]
+        match.update(date_fields[ordinals])
+        match["player_1_id"] = player_1_id
+        match["player_2_id"] = player_2_id
+        match["tournament_id"] = tournament_id
+        match["retired_side"] = lists["retired_side"][n_match]
+        match["winner_side"] = lists["winner_side"][n_match]
+        match["winner_id"] = player_1_id if match["winner_side"] == 1 else player_2_id
+        if has_round:
+            match["round"] = lists["round"][n_match]
+        matches.append(match)
+
+    return matches
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 def main():
     print("Tennis data manipulation module")
 
+import numpy as np
+import tennis_profiling as profiling
+
 def clean_ranking(rank):
     """
     Assumes rank is inputted as a string with float format.
@@ -28,7 +31,9 @@ def sum_sets(match, best_of):
     Also uses best_of as an integer to determine the number of sets won needed
     to win a match.
     Iterates through the sets from the last to the first until one winner is found.
-    Returns the name of the winner."""
+    Returns the id of the winner.
+    This is the per-row procedure; reading functions use get_winners_sides instead,
+    which computes the winners of all the matches at once."""
     sets_pl_1 = 0
     sets_pl_2 = 0
     last_set = best_of
@@ -44,18 +49,21 @@ def sum_sets(match, best_of):
         last_set -= 1
 
     if sets_pl_1 > sets_pl_2:
-        return match["player_1"]
+        return match["player_1_id"]
     else:
-        return match["player_2"]
+        return match["player_2_id"]
 
 def get_winner(match):
     """
-    Assumes match is given as a dictionary representing a match of the WTA.
-    It returns the name of the winner of the match.
+    Assumes match is given as a dictionary representing a match of the WTA,
+    with the ids of both players already assigned ("player_1_id" and "player_2_id").
+    It returns the id of the winner of the match.
     If the match was completed, it checks whether the first two matches were won
     by the same player; otherwise, it sums all the numbers of sets won until
     one player satisfies the best of sets wonrequirement.
     If one player retired, the other is deemed winner.
+    This is the per-row procedure; reading functions use get_winners_sides instead,
+    which computes the winners of all the matches at once.
     """
     best_of = match["best_of"]
     last_set = "set_" + str(best_of)
@@ -68,9 +76,9 @@ def get_winner(match):
         # match
         if type(match[last_set]) != list:
             if match[previous_set][0] > match[previous_set][1]:
-                return match["player_1"]
+                return match["player_1_id"]
             else:
-                return match["player_2"]
+                return match["player_2_id"]
 
         # Otherwise, we sum the results of the three sets.
         else:
@@ -79,9 +87,112 @@ def get_winner(match):
     # Otherwise, one of the players retired
     else:
         if match["player_1"] == match["comment"].replace("Retired", "").strip():
-            return match["player_2"]
+            return match["player_2_id"]
         else:
-            return match["player_1"]
+            return match["player_1_id"]
+
+def get_retired_side(match):
+    """
+    Assumes match is given as a dictionary representing a match of the WTA.
+    Parses the comment of the match, which is either "Completed" or
+    "Name of the player Retired".
+    Returns 0 if the match was completed, 1 if player 1 retired and 2 otherwise
+    (as in get_winner, any comment that does not name player 1 is deemed a
+    retirement of player 2).
+    """
+    if match["comment"].endswith("ompleted"):
+        return 0
+    elif match["player_1"] == match["comment"].replace("Retired", "").strip():
+        return 1
+    else:
+        return 2
+
+def get_sets_games(matches, sets_columns):
+    """
+    Assumes matches is a list of dictionaries, where each dictionary is a match
+    whose sets have been cleaned with clean_set. Sets_columns is a list with the
+    names of the set fields (e.g. ["set_1", "set_2", "set_3"]).
+    Returns an integer array of shape (number of matches, number of sets, 2) with
+    the games won by each player in each set. Sets that were not played are
+    stored as [-1, -1].
+    """
+    not_played = [-1, -1]
+    sets_games = [[match[set_column] if type(match[set_column]) == list else not_played
+                   for set_column in sets_columns]
+                  for match in matches]
+
+    return np.array(sets_games, dtype = np.int16).reshape(-1, len(sets_columns), 2)
+
+def get_winners_sides(sets_games, retired_sides):
+    """
+    Assumes sets_games is an integer array of shape (number of matches, number of
+    sets, 2) as returned by get_sets_games, and retired_sides is a sequence with
+    the side of the player that retired in each match (0, 1 or 2, as returned by
+    get_retired_side).
+    Computes the winners of all the matches at once, so it works for best of 3
+    and best of 5 matches alike:
+        1) If one player retired, the other is deemed winner.
+        2) Otherwise, the winner is the player who won more of the sets played.
+        If both won the same number of sets, the winner of the last set played
+        wins the match (the same result that get_winner gives when it only looks
+        at the second set of a match without a third one).
+    Returns an integer array with the side of the winner of each match (1 or 2).
+    """
+    retired_sides = np.asarray(retired_sides)
+    played = sets_games[:, :, 0] >= 0
+    won_by_player_1 = played & (sets_games[:, :, 0] > sets_games[:, :, 1])
+    won_by_player_2 = played & ~won_by_player_1
+    sets_player_1 = won_by_player_1.sum(axis = 1)
+    sets_player_2 = won_by_player_2.sum(axis = 1)
+
+    # Position of the last set played in each match.
+    last_set = played.shape[1] - 1 - np.argmax(played[:, ::-1], axis = 1)
+    last_set_player_1 = won_by_player_1[np.arange(len(last_set)), last_set]
+
+    winners_sides = np.where(sets_player_1 > sets_player_2, 1,
+                             np.where(sets_player_2 > sets_player_1, 2,
+                                      np.where(last_set_player_1, 1, 2)))
+    winners_sides[retired_sides == 1] = 2
+    winners_sides[retired_sides == 2] = 1
+
+    return winners_sides
+
+def get_winner_mismatches(matches):
+    """
+    Assumes matches is a list of dictionaries as returned by the reading
+    functions, whose "winner_id" was computed by get_winners_sides.
+    Checks the vectorized winners against the per-row reference get_winner.
+    Returns the list of positions of the matches where they disagree.
+    """
+    return [n_match for n_match, match in enumerate(matches)
+            if get_winner(match) != match["winner_id"]]
+
+@profiling.profiled("get_match_columns", profiling.count_first_argument)
+def get_match_columns(matches):
+    """
+    Assumes matches is a list of dictionaries, where each dictionary is a match
+    as returned by the reading functions.
+    Returns a dictionary of NumPy arrays (one value per match, in the same order
+    as matches), so that computations over all the matches can be done at once:
+    "tournament_id", "start_ordinal", "end_ordinal", "year", "is_year_start",
+    "is_year_end", "best_of", "player_1_id", "player_2_id", "winner_id",
+    "loser_id", "winner_side", "retired_side", "rank_1" and "rank_2".
+    """
+    integer_fields = ["tournament_id", "start_ordinal", "end_ordinal", "year",
+                      "best_of", "player_1_id", "player_2_id", "winner_id",
+                      "winner_side", "retired_side"]
+    columns = {}
+    for field in integer_fields:
+        columns[field] = np.array([match[field] for match in matches], dtype = np.int64)
+    for field in ["is_year_start", "is_year_end"]:
+        columns[field] = np.array([match[field] for match in matches], dtype = bool)
+    for field in ["rank_1", "rank_2"]:
+        columns[field] = np.array([match[field] for match in matches], dtype = float)
+
+    columns["loser_id"] = np.where(columns["winner_side"] == 1,
+                                   columns["player_2_id"], columns["player_1_id"])
+
+    return columns
 
 def get_day_month(datetime):
     """
@@ -3,8 +3,11 @@ def main():
 
 import tennis_data_manipulation as manip
 import tennis_rounds as rounds
+import tennis_symbols as symbols
+import tennis_dates as dates
+import tennis_profiling as profiling
+import tennis_validation as validation
 import csv
-from datetime import datetime as dt
 import os
 
 def get_csv_files_sorted(directory):
@@ -19,18 +22,39 @@ def get_csv_files_sorted(directory):
     return files
 
 
-def read_wta_csv(file):
+@profiling.profiled("read_wta_csv", profiling.count_result)
+def read_wta_csv(file, issues = None):
     """
     Assumes that file is a csv that represents WTA matches (with one match per row
     and several variables related to the match in it).
+    The names of players and tournaments are given integer ids in the shared
+    symbol tables tennis_symbols.PLAYERS and tennis_symbols.TOURNAMENTS, which
+    the queries and rankings use to resolve them.
     It reads the file, formats the output of each variable, gets the winner of each
     match and stores each row as a dictionary.
+    Each match stores the ids of both players ("player_1_id", "player_2_id"),
+    of the tournament ("tournament_id") and of the winner ("winner_id").
+    It also stores the side of the winner ("winner_side", 1 or 2) and the side of
+    the player who retired ("retired_side", 0 if the match was completed), and the
+    date fields computed by tennis_dates.get_date_fields.
+    If issues is a list, the rows are first checked with
+    tennis_validation.validate_rows: the problems found are appended to issues,
+    and the rows that cannot be parsed are left out instead of stopping the load.
     Finally, it returns a list of dictionaries that represent all the WTA matches
     played in one year
     """
+    players = symbols.PLAYERS
+    tournaments = symbols.TOURNAMENTS
+
     with open(file) as f:
         header_variables = f.readline().strip().lower().replace(" ", "_").split(",")
+        sets_columns = [variable for variable in header_variables
+                        if variable.startswith("set_")]
         reader = csv.reader(f)
+        if issues != None:
+            rows = list(reader)
+            valid = validation.validate_rows(header_variables, rows, file, issues)
+            reader = [row for row, is_valid in zip(rows, valid.tolist()) if is_valid]
         matches = []
         # Source of unpacking an iterable:
         # https://realpython.com/python-zip-function/
@@ -40,23 +64,41 @@ def read_wta_csv(file):
             match = dict(zip(header_variables, line))
 
             # Data cleaning that relies on other modules functions.
-            match["start_date"] = dt.strptime(match["start_date"], "%Y-%m-%d")
-            match["end_date"] = dt.strptime(match["end_date"], "%Y-%m-%d")
-            match["player_1"] = match["player_1"].strip()
-            match["player_2"] = match["player_2"].strip()
+            # Adds start_date, end_date, their ordinals, year and the
+            # is_year_start and is_year_end flags.
+            match.update(dates.get_date_fields(match["start_date"], match["end_date"]))
+            # Names are replaced by the copy stored in the symbol table, so that
+            # every match shares the same string object for a player.
+            match["player_1_id"] = symbols.intern_symbol(players, match["player_1"].strip())
+            match["player_2_id"] = symbols.intern_symbol(players, match["player_2"].strip())
+            match["player_1"] = symbols.get_symbol_name(players, match["player_1_id"])
+            match["player_2"] = symbols.get_symbol_name(players, match["player_2_id"])
+            match["tournament_id"] = symbols.intern_symbol(tournaments, match["tournament"])
+            match["tournament"] = symbols.get_symbol_name(tournaments, match["tournament_id"])
             match["best_of"] = int(match["best_of"])
             match["rank_1"] = manip.clean_ranking(match["rank_1"])
             match["rank_2"] = manip.clean_ranking(match["rank_2"])
-            match["set_1"] = manip.clean_set(match["set_1"])
-            match["set_2"] = manip.clean_set(match["set_2"])
-            match["set_3"] = manip.clean_set(match["set_3"])
-            match["winner"] = manip.get_winner(match)
+            for set_column in sets_columns:
+                match[set_column] = manip.clean_set(match[set_column])
+            match["retired_side"] = manip.get_retired_side(match)
             # Finally, it is appended to the list (list of dictionaries).
             matches.append(match)
+
+        # The winners of all the matches are computed at once from the games of
+        # each set and the retirements.
+        winners_sides = manip.get_winners_sides(manip.get_sets_games(matches, sets_columns),
+                                                [match["retired_side"] for match in matches])
+        for match, winner_side in zip(matches, winners_sides.tolist()):
+            match["winner_side"] = winner_side
+            if winner_side == 1:
+                match["winner_id"] = match["player_1_id"]
+            else:
+                match["winner_id"] = match["player_2_id"]
         return matches
 
 
-def read_append_all_csvs(directory, include_rounds = True):
+@profiling.profiled("read_append_all_csvs", profiling.count_result)
+def read_append_all_csvs(directory, include_rounds = True, issues = None):
     """
     Takes as input a directory of the computer, where csv files with the
     format '%YYYY.csv' are stored. Assumes these csv files represent matches
@@ -64,6 +106,8 @@ def read_append_all_csvs(directory, include_rounds = True):
     The include_rounds argument asks whether the rounds of the matches should be added
     as another field of each dictionary in the list.
     It defaults to True.
+    Issues works as in read_wta_csv: if it is a list, the files are validated
+    and the problems found are appended to it.
 
     Reads and formats the csvs ordered by year, preparing the variables to be
     analyzed in the context of WTA matches, and returns a list of dictionaries
@@ -71,7 +115,7 @@ def read_append_all_csvs(directory, include_rounds = True):
     """
     all_csvs = []
     for csv_year in get_csv_files_sorted(directory):
-        all_csvs.extend(read_wta_csv(csv_year))
+        all_csvs.extend(read_wta_csv(csv_year, issues = issues))
 
     if include_rounds == True:
         rounds.add_round(all_csvs)
@@ -0,0 +1,45 @@
+def main():
+    print("Tennis dates module")
+
+from datetime import datetime as dt
+from functools import lru_cache
+
+@lru_cache(maxsize = None)
+def parse_iso_date(date_string):
+    """
+    Assumes date_string is a date with the format '%Y-%m-%d' (e.g. '2021-01-06').
+    Returns the datetime object of that date.
+    The date is sliced at fixed positions instead of using strptime, and the
+    result is cached: all the matches of a tournament share the same dates, so
+    most calls only look up the cache.
+    """
+    return dt(int(date_string[0:4]), int(date_string[5:7]), int(date_string[8:10]))
+
+@lru_cache(maxsize = None)
+def get_date_fields(start_date_string, end_date_string):
+    """
+    Assumes start_date_string and end_date_string are dates with the format
+    '%Y-%m-%d', representing the start and end dates of a tournament.
+    Returns a dictionary with the fields that are precomputed for each match:
+        "start_date" and "end_date": datetime objects.
+        "start_ordinal" and "end_ordinal": integer day ordinals of the dates
+        (see datetime.toordinal), cheaper to compare than datetimes.
+        "year": the year of the start date.
+        "is_year_start": True if the tournament starts on the 1st of January.
+        "is_year_end": True if the tournament ends on the 31st of December.
+    The dictionary is cached and shared between calls, so it should not be modified.
+    """
+    start_date = parse_iso_date(start_date_string)
+    end_date = parse_iso_date(end_date_string)
+
+    return {"start_date": start_date,
+            "end_date": end_date,
+            "start_ordinal": start_date.toordinal(),
+            "end_ordinal": end_date.toordinal(),
+            "year": start_date.year,
+            "is_year_start": start_date.month == 1 and start_date.day == 1,
+            "is_year_end": end_date.month == 12 and end_date.day == 31}
+
+
+if __name__ == "__main__":
+    main()
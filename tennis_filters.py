@@ -0,0 +1,146 @@
+def main():
+    print("Tennis filters module")
+
+import numpy as np
+import tennis_data_manipulation as manip
+import tennis_symbols as symbols
+import rankings
+
+def build_match_index(matches):
+    """
+    Assumes matches is a list of dictionaries, where each dictionary is a match
+    (ordered by date), with or without the rounds added.
+    Builds once everything the filters and the array rankings need, so that
+    any number of subsets can be ranked without copying or looping over the
+    matches again.
+    Returns a dictionary with:
+        "columns": the arrays of tennis_data_manipulation.get_match_columns.
+        "round_id" and "rounds": the id of the round of each match (-1 if the
+        rounds were not added) and the symbol table of the round names.
+        "round_numbers": the array of rankings.get_round_numbers (None if the
+        rounds were not added), used by the winners don't lose ranking.
+        "masks": a cache of the masks of each filter already used.
+    """
+    columns = manip.get_match_columns(matches)
+    rounds = symbols.new_symbol_table()
+    round_numbers = None
+    if len(matches) > 0 and "round" in matches[0]:
+        round_id = np.array([symbols.intern_symbol(rounds, match["round"])
+                             for match in matches], dtype = np.int64)
+        round_numbers = rankings.get_round_numbers(matches)
+    else:
+        round_id = np.full(len(matches), -1, dtype = np.int64)
+
+    return {"columns": columns, "round_id": round_id, "rounds": rounds,
+            "round_numbers": round_numbers, "masks": {}}
+
+def get_cached_mask(index, key, compute_mask):
+    """
+    Assumes index is a dictionary as returned by build_match_index, key is a
+    hashable description of a filter and compute_mask a function without
+    arguments that returns its boolean array.
+    Returns the mask, computing it only the first time the key is used.
+    """
+    if key not in index["masks"]:
+        index["masks"][key] = compute_mask()
+
+    return index["masks"][key]
+
+def get_filter_mask(index, tournaments = None, best_of = None, rounds = None,
+                    rank_range = None, both_ranked = True, first_date = None,
+                    last_date = None):
+    """
+    Assumes index is a dictionary as returned by build_match_index. The filters
+    left as None are not applied:
+        - tournaments: list of tournament names.
+        - best_of: list of numbers of sets (e.g. [5]).
+        - rounds: list of round names (e.g. ["Semifinals", "Final"]).
+        - rank_range: (lowest, highest) WTA rankings, both included. If
+        both_ranked is True, both players must be in the range; otherwise, one
+        of them is enough. Unranked players are out of any range.
+        - first_date and last_date (datetimes): only the tournaments that start on
+        or after first_date and end on or before last_date.
+    Returns a boolean array selecting the matches that pass all the filters.
+    Masks can be combined with &, | and ~ to build other expressions.
+    """
+    columns = index["columns"]
+    mask = np.ones(len(columns["year"]), dtype = bool)
+
+    if tournaments != None:
+        tournament_ids = [symbols.get_symbol_id(symbols.TOURNAMENTS, tournament)
+                          for tournament in tournaments]
+        tournament_ids = [tournament_id for tournament_id in tournament_ids
+                          if tournament_id != None]
+        mask &= get_cached_mask(index, ("tournaments", tuple(sorted(tournament_ids))),
+                                lambda: np.isin(columns["tournament_id"], tournament_ids))
+    if best_of != None:
+        mask &= get_cached_mask(index, ("best_of", tuple(sorted(best_of))),
+                                lambda: np.isin(columns["best_of"], best_of))
+    if rounds != None:
+        if index["round_numbers"] is None:
+            raise ValueError("The rounds should be added to the matches to filter by round.")
+        round_ids = [symbols.get_symbol_id(index["rounds"], tournament_round)
+                     for tournament_round in rounds]
+        round_ids = [round_id for round_id in round_ids if round_id != None]
+        mask &= get_cached_mask(index, ("rounds", tuple(sorted(round_ids))),
+                                lambda: np.isin(index["round_id"], round_ids))
+    if rank_range != None:
+        lowest, highest = rank_range
+        def compute_rank_mask():
+            # Comparisons with NaN (unranked) are False.
+            in_range_1 = (columns["rank_1"] >= lowest) & (columns["rank_1"] <= highest)
+            in_range_2 = (columns["rank_2"] >= lowest) & (columns["rank_2"] <= highest)
+            if both_ranked:
+                return in_range_1 & in_range_2
+            return in_range_1 | in_range_2
+        mask &= get_cached_mask(index, ("rank_range", lowest, highest, both_ranked),
+                                compute_rank_mask)
+    if first_date != None:
+        mask &= columns["start_ordinal"] >= first_date.toordinal()
+    if last_date != None:
+        mask &= columns["end_ordinal"] <= last_date.toordinal()
+
+    return mask
+
+def filtered_ranking(index, ranking = "wbw", mask = None, year = None, weeks = None,
+                     start_date = None, epsilon = 1e-10, max_iterations = 150,
+                     resolve_names = True, **filters):
+    """
+    Assumes index is a dictionary as returned by build_match_index.
+    Ranking can take three values: "winners_win", "winners_dont_lose" and "wbw".
+    The matches are selected by mask (a boolean array, e.g. a combination of
+    masks of get_filter_mask) or, if mask is None, by the filters, which are
+    keyword arguments of get_filter_mask. Year, weeks, start_date, epsilon and
+    max_iterations work as in rankings.wbw_ranking.
+    Returns a list of lists [[player, score, ranking]] ordered by ranking, as the
+    ranking functions of the rankings module.
+    """
+    if mask is None:
+        mask = get_filter_mask(index, **filters)
+    elif filters != {}:
+        raise ValueError("Filters cannot be specified together with a mask.")
+    window = {"year": year, "weeks": weeks, "start_date": start_date, "mask": mask}
+
+    if ranking == "winners_win":
+        players, scores, ranks = rankings.winners_win_ranking_arrays(index["columns"], **window)
+    elif ranking == "winners_dont_lose":
+        if index["round_numbers"] is None:
+            raise ValueError("The rounds should be added to the matches for this ranking.")
+        players, scores, ranks = rankings.winners_dont_lose_ranking_arrays(
+            index["columns"], index["round_numbers"], **window)
+    elif ranking == "wbw":
+        players, scores, ranks = rankings.wbw_ranking_arrays(index["columns"], epsilon = epsilon,
+                                                             max_iterations = max_iterations,
+                                                             **window)
+    else:
+        raise ValueError("Ranking should be winners_win, winners_dont_lose or wbw.")
+
+    if resolve_names == True:
+        players = symbols.get_symbol_names(symbols.PLAYERS, players)
+
+    return [[player, score, rank] for player, score, rank in zip(players, scores.tolist(),
+                                                                 ranks.tolist())]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+def main():
+    print("Tennis profiling module")
+
+import functools
+import time
+from contextlib import contextmanager
+# Json and tracemalloc are imported inside the functions that use them, so that
+# importing the profiled modules does not pay for them.
+
+# State of the instrumentation. It is disabled by default: the profiled
+# functions then only check the "enabled" flag before running as usual.
+#     "memory": True if allocations are measured with tracemalloc.
+#     "started_tracemalloc": True if enable_profiling started tracemalloc (and
+#     disable_profiling must stop it), False if it was already tracing.
+#     "profiler": the cProfile.Profile object capturing the calls, or None.
+#     "stages": dictionary of the records of each stage, keyed by its name.
+#     "stack": list with the stages running at the moment (the last one is the
+#     innermost), used to assign counters and nested memory peaks.
+PROFILE = {"enabled": False, "memory": False, "started_tracemalloc": False, "profiler": None,
+           "stages": {}, "stack": []}
+
+def enable_profiling(memory = False, cprofile = False):
+    """
+    Assumes memory and cprofile are booleans.
+    Starts recording the wall time, rows and counters of the profiled stages.
+    If memory is True, the allocations of each stage are also measured (with
+    tracemalloc, which slows the code down). If cprofile is True, every call is
+    captured with cProfile, to be inspected with get_cprofile_stats.
+    Previous records are discarded.
+    """
+    import tracemalloc
+
+    reset_profiling()
+    PROFILE["memory"] = memory
+    PROFILE["started_tracemalloc"] = memory and not tracemalloc.is_tracing()
+    if PROFILE["started_tracemalloc"]:
+        tracemalloc.start()
+    if cprofile:
+        import cProfile
+        PROFILE["profiler"] = cProfile.Profile()
+        PROFILE["profiler"].enable()
+    PROFILE["enabled"] = True
+
+def disable_profiling():
+    """
+    Stops recording. The records are kept until the next call to
+    enable_profiling or reset_profiling. Tracemalloc is only stopped if
+    enable_profiling started it.
+    """
+    PROFILE["enabled"] = False
+    if PROFILE["started_tracemalloc"]:
+        import tracemalloc
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+    PROFILE["started_tracemalloc"] = False
+    if PROFILE["profiler"] != None:
+        PROFILE["profiler"].disable()
+
+def reset_profiling():
+    """
+    Discards the records of the stages and the cProfile capture.
+    """
+    PROFILE["stages"] = {}
+    PROFILE["stack"] = []
+    PROFILE["profiler"] = None
+
+def start_stage(name):
+    """
+    Assumes name is a string. Starts a record of the stage and returns it; it
+    must be closed with end_stage.
+    """
+    record = {"name": name, "start": time.perf_counter(), "counters": {},
+              "start_memory": 0, "peak_memory": 0}
+    if PROFILE["memory"]:
+        import tracemalloc
+
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        # Resetting the peak would lose that of the running stage, so it is kept first.
+        if PROFILE["stack"] != []:
+            parent = PROFILE["stack"][-1]
+            parent["peak_memory"] = max(parent["peak_memory"], peak_memory)
+        record["start_memory"] = current_memory
+        tracemalloc.reset_peak()
+    PROFILE["stack"].append(record)
+
+    return record
+
+def end_stage(record, n_rows = None):
+    """
+    Assumes record was returned by start_stage and n_rows is the number of rows
+    (matches or players) processed by the stage, or None if unknown.
+    Adds the wall time, rows, counters and allocations of the stage to its total.
+    Nested stages are included in the time and memory of the stages that run them.
+    """
+    seconds = time.perf_counter() - record["start"]
+    PROFILE["stack"].pop()
+    stage = PROFILE["stages"].setdefault(record["name"], {"calls": 0, "seconds": 0.0,
+                                                          "rows": 0, "counters": {},
+                                                          "allocated_mb": 0.0,
+                                                          "peak_memory_mb": 0.0})
+    stage["calls"] += 1
+    stage["seconds"] += seconds
+    if n_rows != None:
+        stage["rows"] += n_rows
+    for counter, value in record["counters"].items():
+        stage["counters"][counter] = stage["counters"].get(counter, 0) + value
+
+    if PROFILE["memory"]:
+        import tracemalloc
+
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        # The peak was reset by the nested stages, so theirs are taken into account.
+        peak_memory = max(peak_memory, record["peak_memory"])
+        stage["allocated_mb"] += (current_memory - record["start_memory"]) / 2 ** 20
+        stage["peak_memory_mb"] = max(stage["peak_memory_mb"],
+                                      (peak_memory - record["start_memory"]) / 2 ** 20)
+        if PROFILE["stack"] != []:
+            parent = PROFILE["stack"][-1]
+            parent["peak_memory"] = max(parent["peak_memory"], peak_memory)
+
+def add_count(counter, value = 1):
+    """
+    Assumes counter is a string and value a number.
+    Adds value to the counter (e.g. "iterations") of the innermost running stage.
+    Does nothing if the profiling is disabled or no stage is running.
+    """
+    if PROFILE["enabled"] and PROFILE["stack"] != []:
+        counters = PROFILE["stack"][-1]["counters"]
+        counters[counter] = counters.get(counter, 0) + value
+
+def profiled(name, count_rows = None):
+    """
+    Assumes name is a string and count_rows is None or a function that takes the
+    arguments (a tuple and a dictionary) and the result of the profiled function
+    and returns the number of rows it processed.
+    Decorator that records each call of the function as a stage called name
+    while the profiling is enabled.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILE["enabled"]:
+                return function(*args, **kwargs)
+            record = start_stage(name)
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                PROFILE["stack"].pop()
+                raise
+            n_rows = None
+            if count_rows != None:
+                n_rows = count_rows(args, kwargs, result)
+            end_stage(record, n_rows)
+            return result
+        return wrapper
+    return decorator
+
+def count_first_argument(args, kwargs, result):
+    """
+    Row counter for profiled: the length of the first argument (e.g. the matches).
+    """
+    return len(args[0])
+
+def count_result(args, kwargs, result):
+    """
+    Row counter for profiled: the length of the result (e.g. the matches read).
+    """
+    return len(result)
+
+@contextmanager
+def profile_stage(name, n_rows = None):
+    """
+    Assumes name is a string and n_rows is the number of rows the stage
+    processes, or None.
+    Context manager that records the code of the with block as a stage, e.g. to
+    time the whole nightly pipeline. It does nothing if the profiling is disabled.
+    """
+    if not PROFILE["enabled"]:
+        yield
+        return
+    record = start_stage(name)
+    try:
+        yield
+    except BaseException:
+        PROFILE["stack"].pop()
+        raise
+    end_stage(record, n_rows)
+
+def merge_profile_stages(stages):
+    """
+    Assumes stages is a dictionary of stage records as PROFILE["stages"], e.g.
+    recorded in a worker process.
+    Adds them to the records of this process: the calls, seconds, rows,
+    counters and allocations are added and the peaks are combined. The seconds
+    of stages run in parallel add up, so they can exceed the wall time of the
+    stage that ran them.
+    """
+    for name, record in stages.items():
+        stage = PROFILE["stages"].setdefault(name, {"calls": 0, "seconds": 0.0, "rows": 0,
+                                                    "counters": {}, "allocated_mb": 0.0,
+                                                    "peak_memory_mb": 0.0})
+        for field in ["calls", "seconds", "rows", "allocated_mb"]:
+            stage[field] += record[field]
+        stage["peak_memory_mb"] = max(stage["peak_memory_mb"], record["peak_memory_mb"])
+        for counter, value in record["counters"].items():
+            stage["counters"][counter] = stage["counters"].get(counter, 0) + value
+
+def get_profile_report():
+    """
+    Returns the records as a dictionary keyed by stage name (in the order the
+    stages first finished). Each stage has the number of "calls", the total
+    wall "seconds", the "rows" processed, "rows_per_second", the "counters"
+    (e.g. iterations) and, if the memory was measured, the net "allocated_mb"
+    and the highest "peak_memory_mb" above the memory at the start of a call.
+    """
+    report = {}
+    for name, stage in PROFILE["stages"].items():
+        report[name] = dict(stage, counters = dict(stage["counters"]))
+        report[name]["rows_per_second"] = None
+        if stage["rows"] > 0 and stage["seconds"] > 0:
+            report[name]["rows_per_second"] = stage["rows"] / stage["seconds"]
+
+    return report
+
+def print_profile_report(report = None):
+    """
+    Assumes report is a dictionary as returned by get_profile_report (the
+    current one by default). Prints one line per stage.
+    """
+    if report == None:
+        report = get_profile_report()
+
+    for name, stage in report.items():
+        line = (name.ljust(32) + str(stage["calls"]).rjust(6) + " calls" +
+                str(round(stage["seconds"], 4)).rjust(10) + " s" +
+                str(stage["rows"]).rjust(12) + " rows")
+        if stage["rows_per_second"] != None:
+            line += str(round(stage["rows_per_second"])).rjust(12) + " rows/s"
+        if PROFILE["memory"]:
+            line += str(round(stage["peak_memory_mb"], 1)).rjust(9) + " MB peak"
+        for counter, value in stage["counters"].items():
+            line += "  " + counter + ": " + str(value)
+        print(line)
+
+def write_profile_report(file, report = None):
+    """
+    Assumes file is the path of a json file and report is a dictionary as
+    returned by get_profile_report (the current one by default).
+    Writes the report, so that it can be compared between runs.
+    """
+    if report == None:
+        report = get_profile_report()
+
+    import json
+
+    with open(file, "w") as f:
+        json.dump(report, f, indent = 2)
+
+def get_cprofile_stats(sort_by = "cumulative", top_n = 25):
+    """
+    Assumes the profiling was enabled with cprofile = True.
+    Returns a string with the top_n functions of the cProfile capture, sorted
+    by sort_by (see pstats.Stats.sort_stats).
+    """
+    import io
+    import pstats
+
+    if PROFILE["profiler"] == None:
+        raise ValueError("The profiling was not enabled with cprofile.")
+    stream = io.StringIO()
+    pstats.Stats(PROFILE["profiler"], stream = stream).sort_stats(sort_by).print_stats(top_n)
+
+    return stream.getvalue()
+
+
+if __name__ == "__main__":
+    main()
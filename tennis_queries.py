@@ -3,6 +3,7 @@ def main():
 
 from datetime import datetime as dt
 import tennis_rounds as rounds
+import tennis_symbols as symbols
 
 def who_won(matches, tournament, year, tournament_round, order = 1):
     """
@@ -16,18 +17,20 @@ def who_won(matches, tournament, year, tournament_round, order = 1):
     if year < 2007 or year > 2021:
         raise ValueError("There is no data availability before 2007 or after 2021.")
     winners = []
+    # Names are translated to ids only here; the loop compares integers.
+    tournament_id = symbols.get_symbol_id(symbols.TOURNAMENTS, tournament)
 
     for match in matches[::order]:
-        if (match["tournament"] == tournament
-        and match["start_date"].date().year == year
+        if (match["tournament_id"] == tournament_id
+        and match["year"] == year
         and match["round"] == tournament_round):
             # Only one winner
             if tournament_round == "Final":
-                return match["winner"]
+                return symbols.get_symbol_name(symbols.PLAYERS, match["winner_id"])
             else:
-                winners.append(match["winner"])
+                winners.append(match["winner_id"])
 
-    return winners
+    return symbols.get_symbol_names(symbols.PLAYERS, winners)
 
 def who_vs_who(matches, tournament, year, tournament_round):
     """
@@ -38,10 +41,11 @@ def who_vs_who(matches, tournament, year, tournament_round):
     if year < 2007 or year > 2021:
         raise ValueError("There is no data availability before 2007 or after 2021.")
     players = []
+    tournament_id = symbols.get_symbol_id(symbols.TOURNAMENTS, tournament)
 
     for match in matches:
-        if (match["tournament"] == tournament
-        and match["start_date"].date().year == year
+        if (match["tournament_id"] == tournament_id
+        and match["year"] == year
         and match["round"] == tournament_round):
             players.append([match["player_1"], match["player_2"]])
 
@@ -59,16 +63,18 @@ def when_eliminated(matches, tournament, year, player, order = 1):
     if year < 2007 or year > 2021:
         raise ValueError("There is no data availability before 2007 or after 2021.")
     winners = []
+    tournament_id = symbols.get_symbol_id(symbols.TOURNAMENTS, tournament)
+    player_id = symbols.get_symbol_id(symbols.PLAYERS, player)
 
 
     if not rounds.has_round_robin(tournament, dt(year, 1, 1, 0, 0)):
         for match in matches[::order]:
-            if (match["tournament"] == tournament
-            and match["start_date"].date().year == year
-            and player in [match["player_1"], match["player_2"]]):
-                if player != match["winner"]:
+            if (match["tournament_id"] == tournament_id
+            and match["year"] == year
+            and player_id in (match["player_1_id"], match["player_2_id"])):
+                if player_id != match["winner_id"]:
                     return match["round"]
-                elif player == match["winner"] and match["round"] == "Final":
+                elif player_id == match["winner_id"] and match["round"] == "Final":
                     return "Winner of the tournament."
 
             else:
@@ -82,18 +88,18 @@ def when_eliminated(matches, tournament, year, player, order = 1):
         rounds_from_round_robin = 0
         appeared_in_tournament = 0
         for match in matches:
-            if (match["tournament"] == tournament
-            and match["start_date"].date().year == year
-            and player in [match["player_1"], match["player_2"]]):
+            if (match["tournament_id"] == tournament_id
+            and match["year"] == year
+            and player_id in (match["player_1_id"], match["player_2_id"])):
                 if match["round"] == "Round Robin":
                     appeared_in_tournament = 1
 
                 elif (match["round"] == "Semifinals"
-                and player != match["winner"]):
+                and player_id != match["winner_id"]):
                     return match["round"]
 
                 elif match["round"] == "Final":
-                    if player != match["winner"]:
+                    if player_id != match["winner_id"]:
                         return match["round"]
                     else:
                         return "Winner of the tournament."
@@ -111,23 +117,25 @@ def how_many_matches_played(matches, player, tournament = None, tournament_round
     Returns the number of matches a player has played of a certain round and tournament.
     """
     n_matches = 0
+    player_id = symbols.get_symbol_id(symbols.PLAYERS, player)
+    tournament_id = symbols.get_symbol_id(symbols.TOURNAMENTS, tournament)
     if tournament != None and tournament_round != None:
         for match in matches:
             if (match["round"] == tournament_round
-            and match["tournament"] == tournament
-            and player in [match["player_1"], match["player_2"]]):
+            and match["tournament_id"] == tournament_id
+            and player_id in (match["player_1_id"], match["player_2_id"])):
                 n_matches += 1
 
     elif tournament == None:
         for match in matches:
             if (match["round"] == tournament_round
-            and player in [match["player_1"], match["player_2"]]):
+            and player_id in (match["player_1_id"], match["player_2_id"])):
                 n_matches += 1
 
     elif tournament_round == None:
         for match in matches:
-            if (match["tournament"] == tournament
-            and player in [match["player_1"], match["player_2"]]):
+            if (match["tournament_id"] == tournament_id
+            and player_id in (match["player_1_id"], match["player_2_id"])):
                 n_matches += 1
 
     return n_matches
@@ -142,11 +150,13 @@ def nr_duels_played_won(matches, player_1, player_2):
     n_matches = 0
     n_wins_player_1 = 0
     n_wins_player_2 = 0
+    player_1_id = symbols.get_symbol_id(symbols.PLAYERS, player_1)
+    player_2_id = symbols.get_symbol_id(symbols.PLAYERS, player_2)
     for match in matches:
-        if (player_1 in [match["player_1"], match["player_2"]]
-        and player_2 in [match["player_1"], match["player_2"]]):
+        if (player_1_id in (match["player_1_id"], match["player_2_id"])
+        and player_2_id in (match["player_1_id"], match["player_2_id"])):
             n_matches += 1
-            if player_1 == match["winner"]:
+            if player_1_id == match["winner_id"]:
                 n_wins_player_1 += 1
             else:
                 n_wins_player_2 += 1
@@ -1,7 +1,7 @@
 def main():
     print("Tennis rounds module")
 
-import tennis_data_manipulation as manip
+import tennis_profiling as profiling
 
 def get_round_linear(rounds_from_beginning):
     """
@@ -70,7 +70,7 @@ def has_round_robin(tournament, start_date):
 def get_round_forward(matches):
     """
     Assumes that matches is a list of ordered matches, which take the shape of
-    a dictionary.
+    a dictionary (with the ids and date fields assigned when reading).
     Iterates through them in chronological order
     (assuming they are chronologically ordered),
     setting the round of a match based on previous observations.
@@ -88,74 +88,77 @@ def get_round_forward(matches):
         previous tournament finished on the 31st of December, we store its information.
     """
     rounds_from_beginning = 1
-    previous_tournament = matches[0]["tournament"]
-    previous_start_date = matches[0]["start_date"]
-    previous_end_date = matches[0]["end_date"]
+    previous_tournament = matches[0]["tournament_id"]
+    previous_start_date = matches[0]["start_ordinal"]
+    previous_end_date = matches[0]["end_ordinal"]
+    previous_is_year_end = matches[0]["is_year_end"]
     winners_dict = {}
     splitted_tournaments = {}
 
     for match in matches:
         # First option:
-        if ((previous_tournament == match["tournament"]
-        and previous_start_date == match["start_date"]
-        and previous_end_date == match["end_date"])
+        if ((previous_tournament == match["tournament_id"]
+        and previous_start_date == match["start_ordinal"]
+        and previous_end_date == match["end_ordinal"])
         or
         # Check for the case when the tournaments continue ordered
         # between the 31st of December and the first of January and acknowledge
         # that they are the same tournament.
-        (previous_tournament == match["tournament"]
-        and manip.get_day_month(previous_end_date) == [31, 12]
-        and manip.get_day_month(match["start_date"]) == [1, 1])):
-            if match["winner"] not in winners_dict:
-                winners_dict[match["winner"]] = []
+        (previous_tournament == match["tournament_id"]
+        and previous_is_year_end
+        and match["is_year_start"])):
+            if match["winner_id"] not in winners_dict:
+                winners_dict[match["winner_id"]] = []
                 match["round"] = get_round_linear(rounds_from_beginning)
             else:
                 # If the winner repeats, we are in a different round (Round Robin
                 # matches will be controlled for in the other function)
                 winners_dict = {}
-                winners_dict[match["winner"]] = []
+                winners_dict[match["winner_id"]] = []
                 rounds_from_beginning += 1
                 match["round"] = get_round_linear(rounds_from_beginning)
 
         # Second option
-        elif (previous_tournament != match["tournament"]
-        and manip.get_day_month(match["start_date"]) == [1, 1]
-        and match["start_date"].date().year > 2007
-        and match["tournament"] in splitted_tournaments):
+        elif (previous_tournament != match["tournament_id"]
+        and match["is_year_start"]
+        and match["year"] > 2007
+        and match["tournament_id"] in splitted_tournaments):
             # Store info when needed
-            if manip.get_day_month(previous_end_date) == [31, 12]:
+            if previous_is_year_end:
                 splitted_tournaments[previous_tournament] = {"winners_dict" : winners_dict,
                                                              "rounds_from_beginning": rounds_from_beginning}
 
-            winners_dict = splitted_tournaments[match["tournament"]]["winners_dict"]
-            rounds_from_beginning = splitted_tournaments[match["tournament"]]["rounds_from_beginning"]
-            previous_tournament = match["tournament"]
-            previous_start_date = match["start_date"]
-            previous_end_date = match["end_date"]
-            del splitted_tournaments[match["tournament"]]
+            winners_dict = splitted_tournaments[match["tournament_id"]]["winners_dict"]
+            rounds_from_beginning = splitted_tournaments[match["tournament_id"]]["rounds_from_beginning"]
+            previous_tournament = match["tournament_id"]
+            previous_start_date = match["start_ordinal"]
+            previous_end_date = match["end_ordinal"]
+            previous_is_year_end = match["is_year_end"]
+            del splitted_tournaments[match["tournament_id"]]
 
-            if match["winner"] not in winners_dict:
-                winners_dict[match["winner"]] = []
+            if match["winner_id"] not in winners_dict:
+                winners_dict[match["winner_id"]] = []
                 match["round"] = get_round_linear(rounds_from_beginning)
 
             else:
                 winners_dict = {}
-                winners_dict[match["winner"]] = []
+                winners_dict[match["winner_id"]] = []
                 rounds_from_beginning += 1
                 match["round"] = get_round_linear(rounds_from_beginning)
 
         # Third option:
         else:
             # Store info
-            if manip.get_day_month(previous_end_date) == [31, 12]:
+            if previous_is_year_end:
                 splitted_tournaments[previous_tournament] = {"winners_dict" : winners_dict,
                                                              "rounds_from_beginning": rounds_from_beginning}
 
-            previous_tournament = match["tournament"]
-            previous_start_date = match["start_date"]
-            previous_end_date = match["end_date"]
+            previous_tournament = match["tournament_id"]
+            previous_start_date = match["start_ordinal"]
+            previous_end_date = match["end_ordinal"]
+            previous_is_year_end = match["is_year_end"]
             winners_dict = {}
-            winners_dict[match["winner"]] = []
+            winners_dict[match["winner_id"]] = []
             rounds_from_beginning = 1
             match["round"] = get_round_linear(rounds_from_beginning)
 
@@ -164,7 +167,7 @@ def get_round_forward(matches):
 def get_round_backwards(matches):
     """
     Assumes that matches is a list of ordered matches, which take the shape of
-    a dictionary.
+    a dictionary (with the ids and date fields assigned when reading).
     Iterates through them backwards in time
     (assuming they are chronologically ordered),
     setting the round of a match based on 'future' observations.
@@ -181,17 +184,18 @@ def get_round_backwards(matches):
     n_matches_played = 0
     rounds_from_final = 0
     winners_dict = {}
-    previous_tournament = matches[-1]["tournament"]
-    previous_start_date = matches[-1]["start_date"]
-    previous_end_date = matches[-1]["end_date"]
+    previous_tournament = matches[-1]["tournament_id"]
+    previous_start_date = matches[-1]["start_ordinal"]
+    previous_end_date = matches[-1]["end_ordinal"]
+    previous_is_year_start = matches[-1]["is_year_start"]
     splitted_tournaments = {}
 
     for match in matches[::-1]:
 
         # Before checking the cases, we store the information of a possible splitted
         # tournament in a dictionary.
-        if (match["tournament"] != previous_tournament
-        and manip.get_day_month(previous_start_date) == [1, 1]):
+        if (match["tournament_id"] != previous_tournament
+        and previous_is_year_start):
             splitted_tournaments[previous_tournament] = {"rounds_from_final": rounds_from_final,
                                                         "n_matches_played": n_matches_played}
 
@@ -200,35 +204,35 @@ def get_round_backwards(matches):
         # Also Second case, if the tournament was splitted, we retrieve the information
         # from previous matches.
         if (
-        (match["tournament"] == previous_tournament
-        and match["start_date"] == previous_start_date
-        and match["end_date"] == previous_end_date )
+        (match["tournament_id"] == previous_tournament
+        and match["start_ordinal"] == previous_start_date
+        and match["end_ordinal"] == previous_end_date )
         or
-        (match["tournament"] == previous_tournament
-        and manip.get_day_month(match["end_date"]) == [31, 12]
-        and manip.get_day_month(previous_start_date) == [1, 1])
+        (match["tournament_id"] == previous_tournament
+        and match["is_year_end"]
+        and previous_is_year_start)
         or
-        (match["tournament"] != previous_tournament
-        and match["tournament"] in splitted_tournaments
-        and manip.get_day_month(match["end_date"]) == [31, 12])):
+        (match["tournament_id"] != previous_tournament
+        and match["tournament_id"] in splitted_tournaments
+        and match["is_year_end"])):
 
             # Second case:
-            if (manip.get_day_month(match["end_date"]) == [31, 12] and
-            match["tournament"] in splitted_tournaments):
+            if (match["is_year_end"] and
+            match["tournament_id"] in splitted_tournaments):
 
-                rounds_from_final = splitted_tournaments[match["tournament"]]["rounds_from_final"]
-                n_matches_played = splitted_tournaments[match["tournament"]]["n_matches_played"]
-                del splitted_tournaments[match["tournament"]]
+                rounds_from_final = splitted_tournaments[match["tournament_id"]]["rounds_from_final"]
+                n_matches_played = splitted_tournaments[match["tournament_id"]]["n_matches_played"]
+                del splitted_tournaments[match["tournament_id"]]
 
 
             if rounds_from_final == 0:
                 match["round"] = "Final"
                 rounds_from_final += 1
-                final_players = {match["player_1"]:[], match["player_2"]:[]}
+                final_players = {match["player_1_id"]:[], match["player_2_id"]:[]}
 
             # Handle the Third Place match or the Semifinals.
             elif rounds_from_final == 1:
-                if match["winner"] not in final_players:
+                if match["winner_id"] not in final_players:
                     match["round"] = "Third Place"
                 else:
                     n_matches_played += 1
@@ -256,16 +260,18 @@ def get_round_backwards(matches):
         else:
             match["round"] = "Final"
             rounds_from_final = 1
-            final_players = {match["player_1"] : [], match["player_2"] : []}
+            final_players = {match["player_1_id"] : [], match["player_2_id"] : []}
             n_matches_played = 0
 
 
 
-        previous_start_date = match["start_date"]
-        previous_end_date = match["end_date"]
-        previous_tournament = match["tournament"]
+        previous_start_date = match["start_ordinal"]
+        previous_end_date = match["end_ordinal"]
+        previous_is_year_start = match["is_year_start"]
+        previous_tournament = match["tournament_id"]
 
 
+@profiling.profiled("add_round", profiling.count_first_argument)
 def add_round(matches):
     """
     Takes a list of dictionaries, where each dictionary stores the information
@@ -292,6 +298,8 @@ def add_round(matches):
     Hence, it modifies the list of matches in place, creating a new field for each
     match: 'Round'.
     """
+    if matches == []:
+        return
 
     get_round_forward(matches)
     get_round_backwards(matches)
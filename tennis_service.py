@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import tennis_data_reading as reading
+import tennis_dates as dates
+import tennis_queries as queries
+import rankings
+
+# Dataset used by the queries of this process. The service loads it once, and
+# each worker process of a process pool loads its own copy (see load_dataset).
+DATASET = {"directory": None, "matches": None}
+
+# Arguments given as '%Y-%m-%d' strings by the clients and passed as datetimes.
+DATE_ARGUMENTS = ["start_date"]
+
+def wbw_ranking_list(matches, **arguments):
+    """
+    Returns only the ranking list of rankings.wbw_ranking (its dictionary
+    repeats the same information).
+    """
+    return rankings.wbw_ranking(matches, **arguments)[0]
+
+# Functions served, keyed by the name used in the requests. All of them take
+# the list of matches as first argument.
+SERVICE_FUNCTIONS = {"who_won": queries.who_won,
+                     "who_vs_who": queries.who_vs_who,
+                     "when_eliminated": queries.when_eliminated,
+                     "how_many_matches_played": queries.how_many_matches_played,
+                     "nr_duels_played_won": queries.nr_duels_played_won,
+                     "winners_win_ranking": rankings.winners_win_ranking,
+                     "winners_dont_lose_ranking": rankings.winners_dont_lose_ranking,
+                     "wbw_ranking": wbw_ranking_list}
+
+def load_dataset(directory):
+    """
+    Assumes directory has the csv files of WTA matches ('%YYYY.csv').
+    Reads the matches (with their rounds) into DATASET, unless they were
+    already read from the same directory. It is also the initializer of the
+    worker processes.
+    """
+    if DATASET["directory"] != directory:
+        DATASET["matches"] = reading.read_append_all_csvs(directory)
+        DATASET["directory"] = directory
+
+def run_query(function_name, arguments):
+    """
+    Assumes function_name is a key of SERVICE_FUNCTIONS and arguments is a
+    dictionary with the rest of its arguments.
+    Runs the function over the dataset of this process and returns its result.
+    """
+    arguments = dict(arguments)
+    for argument in DATE_ARGUMENTS:
+        if isinstance(arguments.get(argument), str):
+            arguments[argument] = dates.parse_iso_date(arguments[argument])
+
+    return SERVICE_FUNCTIONS[function_name](DATASET["matches"], **arguments)
+
+def new_service(directory, executor = "thread", max_workers = None, cache_size = 1024):
+    """
+    Assumes directory has the csv files of WTA matches ('%YYYY.csv').
+    Executor can take two values: "thread", where the queries run in a pool of
+    threads sharing the dataset of this process, and "process", where they run
+    in max_workers processes, each one with its own copy of the dataset (the
+    event loop and the other queries are not slowed down by the CPU-bound work).
+    Cache_size is the maximum number of results kept.
+    Returns a service: a dictionary with the "executor", the "in_flight" queries
+    (futures keyed by request), the "cache" of results and the "stats" of the calls.
+    """
+    if executor not in ["thread", "process"]:
+        raise ValueError("Executor should be thread or process.")
+
+    if executor == "thread":
+        load_dataset(directory)
+        pool = ThreadPoolExecutor(max_workers = max_workers)
+    else:
+        pool = ProcessPoolExecutor(max_workers = max_workers, initializer = load_dataset,
+                                   initargs = (directory,))
+
+    return {"executor": pool, "in_flight": {}, "cache": OrderedDict(),
+            "cache_size": cache_size,
+            "stats": {"calls": 0, "cache_hits": 0, "coalesced": 0, "executed": 0,
+                      "errors": 0}}
+
+def close_service(service):
+    """
+    Assumes service is a dictionary as returned by new_service.
+    Waits for the running queries and shuts its pool down.
+    """
+    service["executor"].shutdown(wait = True)
+
+async def call_service(service, function_name, arguments):
+    """
+    Assumes service is a dictionary as returned by new_service, function_name
+    is a key of SERVICE_FUNCTIONS and arguments is a dictionary with the rest
+    of its arguments (in json types).
+    Returns the result of the query without blocking the event loop:
+    results are cached, and identical requests made while the query is still
+    running wait for the same execution instead of running it again.
+    """
+    if function_name not in SERVICE_FUNCTIONS:
+        raise ValueError("Unknown function: " + str(function_name) + ".")
+    stats = service["stats"]
+    stats["calls"] += 1
+    key = (function_name, json.dumps(arguments, sort_keys = True))
+
+    if key in service["cache"]:
+        stats["cache_hits"] += 1
+        service["cache"].move_to_end(key)
+        return service["cache"][key]
+
+    if key in service["in_flight"]:
+        stats["coalesced"] += 1
+    else:
+        stats["executed"] += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(service["executor"], run_query, function_name, arguments)
+        service["in_flight"][key] = future
+        future.add_done_callback(lambda future: finish_query(service, key, future))
+
+    # The shield keeps the query running for the other callers if this one is cancelled.
+    return await asyncio.shield(service["in_flight"][key])
+
+def finish_query(service, key, future):
+    """
+    Callback of the executed queries: removes the query from the in-flight ones
+    and caches its result (errors are not cached).
+    """
+    del service["in_flight"][key]
+    if future.cancelled() or future.exception() != None:
+        service["stats"]["errors"] += 1
+        return
+    service["cache"][key] = future.result()
+    if len(service["cache"]) > service["cache_size"]:
+        service["cache"].popitem(last = False)
+
+async def handle_connection(service, reader, writer):
+    """
+    Serves the requests of a client. The protocol is one json object per line:
+    requests {"id": ..., "function": ..., "arguments": {...}} are answered with
+    {"id": ..., "result": ...} or {"id": ..., "error": ...}. The requests of a
+    connection are handled concurrently, so the answers may come in any order.
+    The special function "stats" returns the stats of the service.
+    """
+    lock = asyncio.Lock()
+    tasks = set()
+
+    async def answer(request):
+        response = {"id": request.get("id") if isinstance(request, dict) else None}
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("The request should be a json object.")
+            if request.get("function") == "stats":
+                response["result"] = dict(service["stats"], in_flight = len(service["in_flight"]),
+                                          cached = len(service["cache"]))
+            else:
+                response["result"] = await call_service(service, request.get("function"),
+                                                        request.get("arguments", {}))
+        except Exception as error:
+            response["error"] = type(error).__name__ + ": " + str(error)
+        async with lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                request = {"function": None}
+            task = asyncio.create_task(answer(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        writer.close()
+
+async def serve(directory, host = "127.0.0.1", port = 8765, executor = "thread",
+                max_workers = None, cache_size = 1024):
+    """
+    Loads the dataset of directory and serves the queries on host and port
+    until it is cancelled. Executor, max_workers and cache_size work as in
+    new_service.
+    """
+    service = new_service(directory, executor = executor, max_workers = max_workers,
+                          cache_size = cache_size)
+    server = await asyncio.start_server(lambda reader, writer:
+                                        handle_connection(service, reader, writer),
+                                        host, port)
+    print("Serving the matches of", directory, "on", host + ":" + str(port),
+          "with a", executor, "pool")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        close_service(service)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Asynchronous server of the WTA queries and rankings.")
+    parser.add_argument("--data", default = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         "data"),
+                        help = "directory with the csv files of the matches")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--executor", choices = ["thread", "process"], default = "process")
+    parser.add_argument("--workers", type = int, default = None,
+                        help = "size of the pool (defaults to the number of CPUs)")
+    parser.add_argument("--cache-size", type = int, default = 1024)
+    arguments = parser.parse_args()
+
+    try:
+        asyncio.run(serve(arguments.data, arguments.host, arguments.port, arguments.executor,
+                          arguments.workers, arguments.cache_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+# Maximum length of a response line (the rankings of all the years are long).
+LINE_LIMIT = 2 ** 26
+
+# Requests used by the load test: cheap queries and heavy rankings, with
+# repetitions so that the cache and the coalescing of the service are exercised.
+LOAD_TEST_REQUESTS = ([("who_won", {"tournament": "Wimbledon", "year": year,
+                                    "tournament_round": "Final"}) for year in range(2008, 2022)] +
+                      [("when_eliminated", {"tournament": "French Open", "year": year,
+                                            "player": "Williams S."}) for year in range(2008, 2017)] +
+                      [("nr_duels_played_won", {"player_1": "Williams S.", "player_2": "Sharapova M."}),
+                       ("nr_duels_played_won", {"player_1": "Halep S.", "player_2": "Kerber A."})] +
+                      [("winners_win_ranking", {"year": year}) for year in range(2008, 2022)] +
+                      [("wbw_ranking", {"year": year}) for year in range(2008, 2022)] +
+                      [("wbw_ranking", {"weeks": 52, "start_date": str(year) + "-06-01",
+                                        "epsilon": 1e-4}) for year in range(2008, 2022)])
+
+async def open_client(host = "127.0.0.1", port = 8765):
+    """
+    Connects to a service started with tennis_service.
+    Returns a client: a dictionary with the "reader" and "writer" of the
+    connection, the "pending" requests (futures keyed by request id), the
+    request "ids" and the task that "receives" the responses.
+    """
+    reader, writer = await asyncio.open_connection(host, port, limit = LINE_LIMIT)
+    client = {"reader": reader, "writer": writer, "pending": {}, "ids": itertools.count()}
+    client["receives"] = asyncio.create_task(receive_responses(client))
+
+    return client
+
+async def receive_responses(client):
+    """
+    Reads the responses of the service and resolves the future of each request.
+    """
+    while True:
+        line = await client["reader"].readline()
+        if not line:
+            break
+        response = json.loads(line)
+        future = client["pending"].pop(response["id"], None)
+        if future == None or future.done():
+            continue
+        if "error" in response:
+            future.set_exception(RuntimeError(response["error"]))
+        else:
+            future.set_result(response["result"])
+
+    for future in client["pending"].values():
+        if not future.done():
+            future.set_exception(ConnectionError("The service closed the connection."))
+
+async def request(client, function_name, **arguments):
+    """
+    Assumes client is a dictionary as returned by open_client, function_name
+    is a function served by tennis_service and arguments are its arguments
+    (dates as '%Y-%m-%d' strings).
+    Returns the result of the query. Many requests can be awaited at once.
+    """
+    request_id = next(client["ids"])
+    future = asyncio.get_running_loop().create_future()
+    client["pending"][request_id] = future
+    client["writer"].write((json.dumps({"id": request_id, "function": function_name,
+                                        "arguments": arguments}) + "\n").encode())
+    await client["writer"].drain()
+
+    return await future
+
+async def close_client(client):
+    """
+    Closes the connection of the client.
+    """
+    client["writer"].close()
+    await client["writer"].wait_closed()
+    client["receives"].cancel()
+
+async def load_test(host = "127.0.0.1", port = 8765, n_requests = 500, concurrency = 20,
+                    seed = 0):
+    """
+    Sends n_requests random requests of LOAD_TEST_REQUESTS to the service, from
+    as many connections as concurrency, each one waiting for its response before
+    sending the next request.
+    Returns a dictionary with the number of "requests", "errors", the total
+    "seconds", the "requests_per_second", the latency percentiles "p50_ms",
+    "p95_ms" and "max_ms", and the "stats" of the service.
+    """
+    rng = random.Random(seed)
+    requests = [rng.choice(LOAD_TEST_REQUESTS) for n_request in range(n_requests)]
+    latencies = []
+    errors = []
+
+    async def worker(worker_requests):
+        client = await open_client(host, port)
+        try:
+            for function_name, arguments in worker_requests:
+                start = time.perf_counter()
+                try:
+                    await request(client, function_name, **arguments)
+                except RuntimeError as error:
+                    errors.append(str(error))
+                latencies.append(time.perf_counter() - start)
+        finally:
+            await close_client(client)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(requests[n_worker::concurrency])
+                           for n_worker in range(concurrency)])
+    seconds = time.perf_counter() - start
+
+    client = await open_client(host, port)
+    stats = await request(client, "stats")
+    await close_client(client)
+
+    latencies.sort()
+    return {"requests": n_requests, "errors": len(errors), "seconds": seconds,
+            "requests_per_second": n_requests / seconds,
+            "p50_ms": latencies[len(latencies) // 2] * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+            "max_ms": latencies[-1] * 1000,
+            "stats": stats}
+
+def main():
+    parser = argparse.ArgumentParser(description = "Client and load test of tennis_service.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--requests", type = int, default = 500)
+    parser.add_argument("--concurrency", type = int, default = 20)
+    parser.add_argument("--seed", type = int, default = 0)
+    arguments = parser.parse_args()
+
+    result = asyncio.run(load_test(arguments.host, arguments.port, arguments.requests,
+                                   arguments.concurrency, arguments.seed))
+    print(json.dumps(result, indent = 2))
+
+
+if __name__ == "__main__":
+    main()
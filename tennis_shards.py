@@ -0,0 +1,241 @@
+def main():
+    print("Tennis shards module")
+
+import os
+from collections import OrderedDict
+from datetime import timedelta
+import tennis_columnar as columnar
+import tennis_data_reading as reading
+import tennis_rounds as rounds
+
+# Arguments of the queries and rankings used to route them to the years they need.
+YEAR_ARGUMENTS = ["year"]
+WINDOW_ARGUMENTS = ["weeks", "start_date"]
+
+def new_manager(max_loaded_shards = None):
+    """
+    Max_loaded_shards is the maximum number of shards kept in memory, counting
+    those read for the boundaries of their neighbours (None for no limit); the
+    least recently used ones are unloaded first. All the sources intern their
+    names in the shared symbol tables (see tennis_data_reading.read_wta_csv), so
+    that the ids of a player are the same in every tour.
+    Returns a dataset manager: a dictionary with the registered "sources", the
+    "shards" (keyed by (tour, level, year)), the "loaded" matches of each shard
+    (in the order they were last used), the keys of the loaded shards that were
+    only read for the boundaries of a neighbour and still need their rounds
+    ("pending_rounds"), the "boundaries" of the shards read (see get_boundaries)
+    and the "stats".
+    """
+    return {"sources": [], "shards": {}, "loaded": OrderedDict(), "pending_rounds": set(),
+            "boundaries": {}, "max_loaded_shards": max_loaded_shards,
+            "stats": {"loads": 0, "reads": 0, "hits": 0, "evictions": 0}}
+
+def get_source_years(path):
+    """
+    Assumes path is a directory of csv files ('%YYYY.csv') or the output of
+    tennis_columnar.export_matches.
+    Returns the format of the source ("csv" or "columnar") and a dictionary with
+    the file of each year (the path itself for the columnar format).
+    """
+    if os.path.isdir(path) and not os.path.exists(os.path.join(path, columnar.NPZ_INDEX_FILE)):
+        return "csv", {int(os.path.basename(file)[:-4]): file
+                       for file in reading.get_csv_files_sorted(path)}
+
+    return "columnar", {year: path for year in columnar.get_stored_years(path)}
+
+def register_source(manager, path, tour = "WTA", level = "main", include_rounds = True):
+    """
+    Assumes manager is a dictionary as returned by new_manager and path is a
+    directory of csv files ('%YYYY.csv') or the output of
+    tennis_columnar.export_matches. Tour and level are the names that identify
+    the source (e.g. "ITF", "junior").
+    Registers one shard per year of the source, without reading any match.
+    Returns the list of keys (tour, level, year) of the shards.
+    """
+    if any(source["tour"] == tour and source["level"] == level
+           for source in manager["sources"]):
+        raise ValueError("The source " + tour + " " + level + " is already registered.")
+
+    file_format, files = get_source_years(path)
+    source = {"tour": tour, "level": level, "path": path, "format": file_format,
+              "include_rounds": include_rounds, "years": sorted(files)}
+    manager["sources"].append(source)
+    keys = []
+    for year in source["years"]:
+        key = (tour, level, year)
+        manager["shards"][key] = {"source": source, "file": files[year]}
+        keys.append(key)
+
+    return keys
+
+def get_shard_keys(manager, tours = None, levels = None, years = None):
+    """
+    Assumes manager is a dictionary as returned by new_manager. Tours, levels
+    and years are None (all of them) or iterables of the values to select.
+    Returns the keys of the selected shards, ordered by source and year.
+    """
+    keys = []
+    for source in manager["sources"]:
+        if ((tours != None and source["tour"] not in tours) or
+            (levels != None and source["level"] not in levels)):
+            continue
+        keys.extend((source["tour"], source["level"], year) for year in source["years"]
+                    if years == None or year in years)
+
+    return keys
+
+def keep_loaded(manager, key, matches):
+    """
+    Assumes key is the key of a registered shard and matches its list of matches.
+    Keeps the matches as the most recently used loaded shard. If more than
+    max_loaded_shards shards are loaded, the least recently used is unloaded.
+    """
+    manager["loaded"][key] = matches
+    manager["loaded"].move_to_end(key)
+    if manager["max_loaded_shards"] != None:
+        while len(manager["loaded"]) > manager["max_loaded_shards"]:
+            evicted, _ = manager["loaded"].popitem(last = False)
+            manager["pending_rounds"].discard(evicted)
+            manager["stats"]["evictions"] += 1
+
+def read_shard(manager, key):
+    """
+    Assumes key is the key of a registered shard.
+    Reads the matches of the shard (without rounds, unless they were stored in
+    the columnar format) and stores its boundaries (see get_boundaries). The
+    matches are kept loaded, pending their rounds, so that load_shard does not
+    read them again unless they were unloaded in between.
+    Returns the list of matches.
+    """
+    shard = manager["shards"][key]
+    manager["stats"]["reads"] += 1
+    if shard["source"]["format"] == "csv":
+        matches = reading.read_wta_csv(shard["file"])
+    else:
+        matches = columnar.load_matches(shard["file"], [key[2]])
+    manager["boundaries"][key] = get_boundaries(matches)
+    manager["pending_rounds"].add(key)
+    keep_loaded(manager, key, matches)
+
+    return matches
+
+def get_boundaries(matches):
+    """
+    Assumes matches is the list of matches of one year, ordered by date.
+    Returns a dictionary with copies of the matches of the tournaments that
+    start on the 1st of January ("head") and of those that end on the 31st of
+    December ("tail"), which add_round joins with the neighbouring years when a
+    tournament is splitted between them.
+    """
+    return {"head": [dict(match) for match in matches if match["is_year_start"]],
+            "tail": [dict(match) for match in matches if match["is_year_end"]]}
+
+def get_neighbour_boundary(manager, key, shift, part):
+    """
+    Assumes key is the key of a registered shard, shift is -1 (previous year) or
+    1 (next year) and part is "head" or "tail".
+    Returns copies of that part of the boundaries of the neighbouring shard of
+    the same source, reading it once if needed (an empty list if there is none).
+    """
+    tour, level, year = key
+    neighbour = (tour, level, year + shift)
+    if neighbour not in manager["shards"]:
+        return []
+    if neighbour not in manager["boundaries"]:
+        read_shard(manager, neighbour)
+
+    return [dict(match) for match in manager["boundaries"][neighbour][part]]
+
+def load_shard(manager, key):
+    """
+    Assumes manager is a dictionary as returned by new_manager and key is the
+    key of a registered shard.
+    Returns the list of matches of the shard, reading it on the first access
+    (or reusing the matches read for the boundaries of a neighbour).
+    The rounds are added with the tournaments splitted with the previous and
+    next years, as read_append_all_csvs would add them. If more than
+    max_loaded_shards shards are loaded, the least recently used is unloaded.
+    """
+    if key in manager["loaded"] and key not in manager["pending_rounds"]:
+        manager["loaded"].move_to_end(key)
+        manager["stats"]["hits"] += 1
+        return manager["loaded"][key]
+
+    if key in manager["loaded"]:
+        matches = manager["loaded"][key]
+    else:
+        matches = read_shard(manager, key)
+    manager["pending_rounds"].discard(key)
+    manager["stats"]["loads"] += 1
+    source = manager["shards"][key]["source"]
+    if source["include_rounds"] and matches != [] and "round" not in matches[0]:
+        previous_tail = get_neighbour_boundary(manager, key, -1, "tail")
+        next_head = get_neighbour_boundary(manager, key, 1, "head")
+        rounds.add_round(previous_tail + matches + next_head)
+    # Reading the neighbours may have unloaded the shard.
+    keep_loaded(manager, key, matches)
+
+    return matches
+
+def unload_shards(manager, keys = None):
+    """
+    Assumes manager is a dictionary as returned by new_manager and keys is None
+    (all the shards) or a list of shard keys.
+    Frees the matches of the shards; they are read again on the next access.
+    """
+    for key in list(manager["loaded"]) if keys == None else keys:
+        manager["loaded"].pop(key, None)
+        manager["pending_rounds"].discard(key)
+
+def get_matches(manager, tours = None, levels = None, years = None):
+    """
+    Assumes manager is a dictionary as returned by new_manager. Tours, levels
+    and years work as in get_shard_keys.
+    Loads the selected shards that were not loaded yet.
+    Returns the list of their matches ordered by date. The matches of a single
+    source keep the order of its files; those of several sources are merged by
+    start date, for cross-shard queries and rankings.
+    """
+    keys = get_shard_keys(manager, tours, levels, years)
+    matches = []
+    for key in keys:
+        matches.extend(load_shard(manager, key))
+    if len(set(key[:2] for key in keys)) > 1:
+        matches.sort(key = lambda match: match["start_ordinal"])
+
+    return matches
+
+def get_query_years(arguments):
+    """
+    Assumes arguments is a dictionary with the arguments of a query or ranking.
+    Returns the set of years of the matches it needs: the year given, the years
+    of the window of weeks before start_date, or None (all the years).
+    """
+    for argument in YEAR_ARGUMENTS:
+        if arguments.get(argument) != None:
+            return {arguments[argument]}
+    if all(arguments.get(argument) != None for argument in WINDOW_ARGUMENTS):
+        first_date = arguments["start_date"] - timedelta(weeks = arguments["weeks"])
+        # Tournaments ending in the window may have started the year before.
+        return set(range(first_date.year - 1, arguments["start_date"].year + 1))
+
+    return None
+
+def run_query(manager, function, tours = None, levels = None, **arguments):
+    """
+    Assumes manager is a dictionary as returned by new_manager, function is a
+    query or ranking that takes the list of matches as first argument (e.g.
+    tennis_queries.who_won or rankings.wbw_ranking) and arguments are the rest
+    of its arguments. Tours and levels select the sources (None for all of them,
+    which gives cross-shard rankings).
+    Only the shards of the years needed by the arguments are loaded (see
+    get_query_years).
+    Returns the result of the function.
+    """
+    matches = get_matches(manager, tours, levels, get_query_years(arguments))
+
+    return function(matches, **arguments)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+def main():
+    print("Tennis symbols module")
+
+def new_symbol_table():
+    """
+    Returns an empty symbol table. A symbol table is a dictionary with two fields:
+    "ids", a dictionary that maps each name to its integer id, and
+    "names", a list where the name of each id is stored in the position of the id.
+    Ids are dense (0, 1, 2, ...) and assigned in order of first appearance.
+    """
+    return {"ids": {}, "names": []}
+
+# Shared symbol tables used by the reading functions. Every match loaded (through
+# tennis_data_reading, tennis_columnar or tennis_shards) always uses these
+# tables, so that the ids of players and tournaments are consistent across years
+# and sources.
+PLAYERS = new_symbol_table()
+TOURNAMENTS = new_symbol_table()
+
+def intern_symbol(table, name):
+    """
+    Assumes table is a symbol table (see new_symbol_table) and name is a string.
+    Returns the integer id of name, assigning the next free id if the name
+    has not been seen before.
+    """
+    symbol_id = table["ids"].get(name)
+    if symbol_id is None:
+        symbol_id = len(table["names"])
+        table["ids"][name] = symbol_id
+        table["names"].append(name)
+
+    return symbol_id
+
+def get_symbol_id(table, name):
+    """
+    Assumes table is a symbol table and name is a string.
+    Returns the integer id of name, or None if the name is not in the table.
+    Unlike intern_symbol, it never modifies the table.
+    """
+    return table["ids"].get(name)
+
+def get_symbol_name(table, symbol_id):
+    """
+    Assumes table is a symbol table and symbol_id is an integer id of the table.
+    Returns the name stored for that id.
+    """
+    return table["names"][symbol_id]
+
+def get_symbol_names(table, symbol_ids):
+    """
+    Assumes table is a symbol table and symbol_ids is an iterable of integer ids.
+    Returns a list with the name of each id, in the same order.
+    """
+    names = table["names"]
+    return [names[symbol_id] for symbol_id in symbol_ids]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+def main():
+    print("Tennis synthetic archive module")
+
+import csv
+import math
+import os
+import random
+from datetime import date, timedelta
+
+# Header of the csv files read by tennis_data_reading.read_wta_csv.
+HEADER = ["Tournament", "Start date", "End date", "Best of", "Player 1", "Player 2",
+          "Rank 1", "Rank 2", "Set 1", "Set 2", "Set 3", "Comment"]
+
+def generate_player_pool(n_players, rng):
+    """
+    Assumes n_players is a positive integer and rng is a random.Random object.
+    Returns a list of n_players dictionaries with the "name" of each player
+    (in the 'Surname I.' format of the WTA data) and her "strength", ordered
+    from the strongest to the weakest player.
+    """
+    letters = "ABCDEFGHIJKLMNOPRSTVWZ"
+    players = []
+    for n_player in range(n_players):
+        name = "Player" + str(n_player + 1) + " " + letters[n_player % len(letters)] + "."
+        players.append({"name": name, "strength": rng.gauss(0, 1)})
+    players.sort(key = lambda player: player["strength"], reverse = True)
+
+    return players
+
+def get_year_rankings(players, rng, max_ranking = 1500):
+    """
+    Assumes players is a list as returned by generate_player_pool and rng is a
+    random.Random object.
+    Returns a list with the WTA ranking of each player for one year, as a string
+    with float format (e.g. '72.0'). Rankings follow the strength of the players
+    with some noise; players beyond max_ranking are unranked ('').
+    """
+    noisy_strengths = [player["strength"] + rng.gauss(0, 0.3) for player in players]
+    order = sorted(range(len(players)), key = lambda n_player: noisy_strengths[n_player],
+                   reverse = True)
+    rankings = [""] * len(players)
+    for ranking, n_player in enumerate(order[:max_ranking]):
+        rankings[n_player] = str(float(ranking + 1))
+
+    return rankings
+
+def play_set(rng, player_1_wins):
+    """
+    Assumes rng is a random.Random object and player_1_wins is a boolean.
+    Returns the score of a set won by player 1 (or 2) as a string ('6-3').
+    """
+    loser_games = rng.choice([0, 1, 2, 2, 3, 3, 4, 4, 5, 6])
+    winner_games = 7 if loser_games >= 5 else 6
+    if player_1_wins:
+        return str(winner_games) + "-" + str(loser_games)
+    else:
+        return str(loser_games) + "-" + str(winner_games)
+
+def play_match(rng, strength_1, strength_2, best_of, retirement_rate):
+    """
+    Assumes rng is a random.Random object, strength_1 and strength_2 are the
+    strengths of both players, best_of is 3 or 5 and retirement_rate is the
+    probability that a player retires during the match.
+    Returns a list with the scores of the sets played, the side of the winner
+    (1 or 2) and the side of the player who retired (0 if nobody retired).
+    """
+    probability_1 = 1 / (1 + math.exp(-(strength_1 - strength_2)))
+    sets_needed = best_of // 2 + 1
+    sets = []
+    sets_1 = 0
+    sets_2 = 0
+    retired_side = 0
+    if rng.random() < retirement_rate:
+        retired_side = rng.choice([1, 2])
+        retirement_set = rng.randrange(best_of)
+
+    while sets_1 < sets_needed and sets_2 < sets_needed:
+        if retired_side != 0 and len(sets) == retirement_set:
+            # The last set is left unfinished.
+            sets.append(str(rng.randrange(6)) + "-" + str(rng.randrange(6)))
+            return sets, 3 - retired_side, retired_side
+        player_1_wins = rng.random() < probability_1
+        sets.append(play_set(rng, player_1_wins))
+        if player_1_wins:
+            sets_1 += 1
+        else:
+            sets_2 += 1
+
+    if retired_side != 0:
+        # The player retired before the match was over, but all the sets
+        # were finished: she is deemed to retire in the next set.
+        retired_side = 2 if sets_1 > sets_2 else 1
+        return sets, 3 - retired_side, retired_side
+    return sets, 1 if sets_1 > sets_2 else 2, 0
+
+def get_match_row(rng, tournament, start_date, end_date, best_of, player_1, player_2,
+                  players, rankings, n_sets, retirement_rate):
+    """
+    Assumes player_1 and player_2 are positions in players (a list as returned by
+    generate_player_pool) and rankings is the list returned by get_year_rankings.
+    Plays the match between both players.
+    Returns the winner (position in players) and the row of the match in the
+    csv format, with n_sets set columns.
+    """
+    sets, winner_side, retired_side = play_match(rng, players[player_1]["strength"],
+                                                 players[player_2]["strength"],
+                                                 best_of, retirement_rate)
+    if retired_side == 0:
+        comment = "Completed"
+    else:
+        comment = players[(player_1, player_2)[retired_side - 1]]["name"] + " Retired"
+    sets = sets + [""] * (n_sets - len(sets))
+    row = ([tournament, start_date.isoformat(), end_date.isoformat(), str(best_of),
+            players[player_1]["name"], players[player_2]["name"],
+            rankings[player_1], rankings[player_2]] + sets + [comment])
+
+    return (player_1, player_2)[winner_side - 1], row
+
+def generate_draw(rng, entrants, tournament, dates, best_of, players, rankings, n_sets,
+                  retirement_rate):
+    """
+    Assumes entrants is a list of positions in players whose length is a power of 2,
+    and dates is a list with one (start_date, end_date) pair per round (rounds
+    of a splitted tournament have different dates).
+    Plays a knockout draw, round by round, from the first round to the final.
+    Returns the list of rows of the matches in the order they were played.
+    """
+    rows = []
+    n_round = 0
+    while len(entrants) > 1:
+        start_date, end_date = dates[min(n_round, len(dates) - 1)]
+        winners = []
+        for n_match in range(0, len(entrants), 2):
+            winner, row = get_match_row(rng, tournament, start_date, end_date, best_of,
+                                        entrants[n_match], entrants[n_match + 1], players,
+                                        rankings, n_sets, retirement_rate)
+            winners.append(winner)
+            rows.append(row)
+        entrants = winners
+        n_round += 1
+
+    return rows
+
+def generate_round_robin(rng, entrants, tournament, start_date, end_date, players, rankings,
+                         n_sets, retirement_rate):
+    """
+    Assumes entrants is a list of 8 positions in players.
+    Plays a tournament with a Round Robin (two groups of four players), two
+    semifinals between the winners and the runners-up of the groups, and the final.
+    Returns the list of rows of the matches in the order they were played.
+    """
+    rows = []
+    group_winners = []
+    for group in [entrants[0::2], entrants[1::2]]:
+        wins = {player: 0 for player in group}
+        for n_player_1 in range(len(group)):
+            for n_player_2 in range(n_player_1 + 1, len(group)):
+                winner, row = get_match_row(rng, tournament, start_date, end_date, 3,
+                                            group[n_player_1], group[n_player_2], players,
+                                            rankings, n_sets, retirement_rate)
+                wins[winner] += 1
+                rows.append(row)
+        group_winners.append(sorted(group, key = lambda player: wins[player], reverse = True))
+
+    semifinalists = [group_winners[0][0], group_winners[1][1],
+                     group_winners[1][0], group_winners[0][1]]
+    rows.extend(generate_draw(rng, semifinalists, tournament, [(start_date, end_date)], 3,
+                              players, rankings, n_sets, retirement_rate))
+    return rows
+
+def choose_entrants(rng, n_players, draw_size):
+    """
+    Assumes n_players is the size of the player pool and draw_size is a power of 2
+    not greater than n_players.
+    Returns draw_size different positions of the pool. Each tournament takes its
+    players from a window of the pool, mostly among the strongest players.
+    """
+    window = min(n_players, draw_size * 6)
+    first = int(rng.random() ** 3 * (n_players - window))
+    entrants = rng.sample(range(first, first + window), draw_size)
+
+    return entrants
+
+def generate_year(rng, year, players, tournaments_per_year, draw_sizes, best_of_5_share,
+                  retirement_rate, n_sets, split_in = None, split_out = False,
+                  round_robin = True):
+    """
+    Assumes rng is a random.Random object, year is an integer and players is a
+    list as returned by generate_player_pool. The rest of the arguments are
+    explained in write_synthetic_archive.
+    Split_in is None, or the list of rows still to be played in the first days of
+    this year by the tournament splitted from the previous year. If split_out is
+    True, the first tournament of the next year starts on the 30th of December.
+
+    Returns the rows of the year in chronological order, and the rows of the
+    splitted tournament to be played next year (or None).
+    """
+    rankings = get_year_rankings(players, rng)
+    rows = []
+    if split_in != None:
+        rows.extend(split_in)
+
+    # Tournaments are spread over 47 weeks, several of them in the same week.
+    first_monday = date(year, 1, 2)
+    for n_tournament in range(tournaments_per_year):
+        week = n_tournament * 47 // tournaments_per_year
+        start_date = first_monday + timedelta(weeks = week)
+        end_date = start_date + timedelta(days = 6)
+        draw_size = min(rng.choice(draw_sizes), 2 ** int(math.log2(len(players))))
+        best_of = 5 if rng.random() < best_of_5_share else 3
+        rows.extend(generate_draw(rng, choose_entrants(rng, len(players), draw_size),
+                                  "Synthetic Open " + str(n_tournament + 1),
+                                  [(start_date, end_date)], best_of, players, rankings,
+                                  n_sets, retirement_rate))
+
+    if round_robin and len(players) >= 8:
+        start_date = date(year, 12, 4)
+        rows.extend(generate_round_robin(rng, list(range(8)), "Synthetic Finals",
+                                         start_date, start_date + timedelta(days = 6),
+                                         players, rankings, n_sets, retirement_rate))
+
+    # The splitted tournament plays its first round in December and the rest of
+    # its rounds from the 1st of January on.
+    split_rows = None
+    if split_out:
+        draw_size = min(32, 2 ** int(math.log2(len(players))))
+        december = (date(year, 12, 30), date(year, 12, 31))
+        january = (date(year + 1, 1, 1), date(year + 1, 1, 6))
+        split_rows = generate_draw(rng, choose_entrants(rng, len(players), draw_size),
+                                   "Synthetic New Year Classic", [december, january], 3,
+                                   players, rankings, n_sets, retirement_rate)
+        n_first_round = draw_size // 2
+        rows.extend(split_rows[:n_first_round])
+        split_rows = split_rows[n_first_round:]
+
+    return rows, split_rows
+
+def write_synthetic_archive(directory, first_year = 2007, n_years = 15, n_players = 1000,
+                            tournaments_per_year = 55, draw_sizes = (32, 32, 32, 64, 128),
+                            best_of_5_share = 0.0, retirement_rate = 0.02,
+                            split_tournaments = True, round_robin = True, seed = 0):
+    """
+    Assumes directory is the path of an existing directory.
+    Writes one csv per year ('%YYYY.csv') of synthetic WTA matches in the format
+    read by tennis_data_reading.read_wta_csv, so that round inference and the
+    rankings can be stress tested at any scale:
+        - n_players is the size of the player pool.
+        - tournaments_per_year knockout tournaments are played each year, with a
+        draw size chosen from draw_sizes (powers of 2) and played round by round.
+        - best_of_5_share is the share of tournaments played to best of 5 sets.
+        When it is positive, the files have five set columns instead of three.
+        - retirement_rate is the probability that a match ends with a retirement.
+        - If split_tournaments is True, each year (except the last one) ends with
+        a tournament played between the 30th of December and the 6th of January.
+        - If round_robin is True, each year has a tournament with a Round Robin.
+        Note that add_round only labels the Round Robin of the tournaments
+        listed in tennis_rounds.has_round_robin.
+    Seed makes the archive reproducible.
+    Returns a dictionary with the number of "matches" and the list of "files" written.
+    """
+    if n_players < 2:
+        raise ValueError("The player pool must have at least two players.")
+    rng = random.Random(seed)
+    players = generate_player_pool(n_players, rng)
+    n_sets = 5 if best_of_5_share > 0 else 3
+    header = HEADER[:8] + ["Set " + str(n_set + 1) for n_set in range(n_sets)] + ["Comment"]
+
+    n_matches = 0
+    files = []
+    split_rows = None
+    for year in range(first_year, first_year + n_years):
+        split_out = split_tournaments and year < first_year + n_years - 1
+        rows, split_rows = generate_year(rng, year, players, tournaments_per_year, draw_sizes,
+                                         best_of_5_share, retirement_rate, n_sets,
+                                         split_in = split_rows, split_out = split_out,
+                                         round_robin = round_robin)
+        file = os.path.join(directory, str(year) + ".csv")
+        with open(file, "w", newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        n_matches += len(rows)
+        files.append(file)
+
+    return {"matches": n_matches, "files": files}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+def main():
+    print("Tennis validation module")
+
+import numpy as np
+
+# Severities of the issues. Rows with an "error" cannot be parsed and are left
+# out of the load; rows with a "warning" are loaded as they are.
+SEVERITIES = ["error", "warning"]
+
+# Days that the start of a tournament can go back with respect to the latest
+# start seen in the file (tournaments of the same weeks are not always sorted).
+CHRONOLOGY_TOLERANCE_DAYS = 7
+
+def add_issues(issues, file, rows, check, severity, message):
+    """
+    Assumes issues is a list, rows is an integer array with the positions of the
+    offending rows in the file (0 being the first row after the header), check
+    and message are strings and severity is one of SEVERITIES.
+    Appends one issue per row: a dictionary with the "file", the "line" of the
+    file (the header is line 1), the "check", the "severity" and the "message".
+    """
+    for row in rows.tolist():
+        issues.append({"file": file, "line": row + 2, "check": check,
+                       "severity": severity, "message": message})
+
+def is_integer_string(values):
+    """
+    Assumes values is an array of strings.
+    Returns a boolean array: True for the non-empty strings made only of digits.
+    """
+    return np.char.isdigit(values)
+
+def is_calendar_date(values):
+    """
+    Assumes values is an array of strings.
+    Returns a boolean array: True for the strings with the format '%Y-%m-%d'
+    that are dates of the calendar (month from 1 to 12 and day within the days
+    of the month, counting the leap years).
+    """
+    parts = np.char.partition(values, "-")
+    day_parts = np.char.partition(parts[:, 2], "-")
+    well_formed = ((np.char.str_len(values) == 10) & is_integer_string(parts[:, 0]) &
+                   is_integer_string(day_parts[:, 0]) & is_integer_string(day_parts[:, 2]))
+
+    year = np.where(well_formed, parts[:, 0], "0").astype(np.int64)
+    month = np.where(well_formed, day_parts[:, 0], "0").astype(np.int64)
+    day = np.where(well_formed, day_parts[:, 2], "0").astype(np.int64)
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_days = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    days = month_days[np.clip(month, 0, 12)] + (leap & (month == 2))
+
+    return well_formed & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days)
+
+def parse_sets(set_values):
+    """
+    Assumes set_values is an array of strings of shape (number of rows, number of
+    sets), each one empty or with the format 'games-games'.
+    Returns a boolean array with the rows whose sets are all well formed, and an
+    integer array of shape (number of rows, number of sets, 2) with the games of
+    each set (-1 for the sets not played, or not well formed).
+    """
+    parts = np.char.partition(set_values, "-")
+    games_1, separator, games_2 = parts[..., 0], parts[..., 1], parts[..., 2]
+    empty = set_values == ""
+    well_formed = (separator == "-") & is_integer_string(games_1) & is_integer_string(games_2)
+
+    sets_games = np.full(set_values.shape + (2,), -1, dtype = np.int64)
+    sets_games[well_formed, 0] = games_1[well_formed].astype(np.int64)
+    sets_games[well_formed, 1] = games_2[well_formed].astype(np.int64)
+
+    return (empty | well_formed).all(axis = 1), sets_games
+
+def get_legal_sets(sets_games):
+    """
+    Assumes sets_games is an integer array as returned by parse_sets.
+    Returns a boolean array marking the completed sets with a legal score: 6-0 to
+    6-4, 7-5, 7-6, advantage sets (8-6, 9-7, ...) and match tie-breaks played
+    as a final set (10-0 to 10-8, 11-9, ...).
+    """
+    high = sets_games.max(axis = -1)
+    low = sets_games.min(axis = -1)
+
+    return (((high == 6) & (low <= 4)) |
+            ((high == 7) & ((low == 5) | (low == 6))) |
+            ((high >= 8) & (high - low == 2)) |
+            ((high == 10) & (low <= 8)))
+
+def validate_rows(header_variables, rows, file = None, issues = None):
+    """
+    Assumes header_variables is the list of the (formatted) names of the columns
+    of a csv of WTA matches, as in tennis_data_reading.read_wta_csv, and rows is
+    the list of its rows (lists of strings).
+    Checks whole columns at once and appends the offending rows to issues (see
+    add_issues):
+        Errors (the row cannot be loaded): wrong number of fields, dates that
+        are not '%Y-%m-%d' dates of the calendar, best_of other than 3 or 5, missing player names,
+        rankings that are not numbers and set scores that are not 'games-games'.
+        Warnings: tournaments that end before they start, both players with the
+        same name, comments that are neither "Completed" nor the retirement of
+        one of the players, illegal set scores, played sets after a set not
+        played, results that do not match best_of, and rows that break the
+        ordering add_round relies on (tournaments not contiguous, or going back
+        in time).
+    Returns a boolean array with the rows that can be loaded.
+    """
+    if issues == None:
+        issues = []
+    n_rows = len(rows)
+    valid = np.array([len(row) == len(header_variables) for row in rows], dtype = bool)
+    add_issues(issues, file, np.flatnonzero(~valid), "field_count", "error",
+               "The row does not have " + str(len(header_variables)) + " fields.")
+    if not valid.any():
+        return valid
+
+    table = np.array([row if len(row) == len(header_variables) else [""] * len(header_variables)
+                      for row in rows], dtype = str).reshape(n_rows, len(header_variables))
+    column = {variable: np.char.strip(table[:, n_column])
+              for n_column, variable in enumerate(header_variables)}
+    sets_columns = [variable for variable in header_variables if variable.startswith("set_")]
+
+    def check(failed, name, severity, message):
+        failed = failed & valid
+        add_issues(issues, file, np.flatnonzero(failed), name, severity, message)
+        return failed
+
+    # Errors.
+    for date_column in ["start_date", "end_date"]:
+        valid &= ~check(~is_calendar_date(column[date_column]), "date_format", "error",
+                        "The " + date_column.replace("_", " ") + " is not a '%Y-%m-%d' date.")
+    valid &= ~check(~np.isin(column["best_of"], ["3", "5"]), "best_of", "error",
+                    "Best of should be 3 or 5.")
+    valid &= ~check((column["player_1"] == "") | (column["player_2"] == ""), "player_names",
+                    "error", "A player name is missing.")
+    for rank_column in ["rank_1", "rank_2"]:
+        number = is_integer_string(np.char.replace(column[rank_column], ".", "", count = 1))
+        valid &= ~check(~(number | (column[rank_column] == "")), "rank_format", "error",
+                        "The " + rank_column.replace("_", " ") + " is not a number.")
+    well_formed, sets_games = parse_sets(np.column_stack([column[set_column]
+                                                          for set_column in sets_columns]))
+    valid &= ~check(~well_formed, "set_format", "error", "A set score is not 'games-games'.")
+
+    # Warnings (only for the rows that can be loaded, as those of the ordering).
+    # Dates with the '%Y-%m-%d' format are sorted as strings.
+    check(column["end_date"] < column["start_date"], "date_order", "warning",
+          "The tournament ends before it starts.")
+    check(column["player_1"] == column["player_2"], "player_names", "warning",
+          "Both players have the same name.")
+    retired = np.char.endswith(column["comment"], "Retired")
+    retired_player = np.char.strip(np.char.replace(column["comment"], "Retired", ""))
+    retired_1 = retired & (retired_player == column["player_1"])
+    retired_2 = retired & (retired_player == column["player_2"])
+    check(~np.char.endswith(column["comment"], "ompleted") & ~retired_1 & ~retired_2, "comment",
+          "warning", "The comment is not 'Completed' or the retirement of one of the players.")
+
+    played = sets_games[:, :, 0] >= 0
+    n_played = played.sum(axis = 1)
+    check((~played[:, :-1] & played[:, 1:]).any(axis = 1), "set_sequence", "warning",
+          "A set was played after a set that was not played.")
+    # The last set played of a retirement may be unfinished.
+    last_set = np.maximum(n_played - 1, 0)
+    unfinished_allowed = np.zeros(played.shape, dtype = bool)
+    unfinished_allowed[np.arange(n_rows), last_set] = retired
+    check((played & ~get_legal_sets(sets_games) & ~unfinished_allowed).any(axis = 1),
+          "set_score", "warning", "A set score is not a legal tennis score.")
+
+    best_of = np.where(column["best_of"] == "5", 5, 3)
+    sets_needed = best_of // 2 + 1
+    won_1 = (played & (sets_games[:, :, 0] > sets_games[:, :, 1])).sum(axis = 1)
+    won_2 = n_played - won_1
+    completed = ~retired
+    decided = ((np.maximum(won_1, won_2) == sets_needed) &
+               (np.minimum(won_1, won_2) < sets_needed))
+    last_won_1 = (sets_games[np.arange(n_rows), last_set, 0] >
+                  sets_games[np.arange(n_rows), last_set, 1])
+    winner_won_last = np.where(won_1 > won_2, last_won_1, ~last_won_1)
+    check((n_played > best_of) | (completed & ~(decided & winner_won_last)), "best_of",
+          "warning", "The sets played do not match the result of the match.")
+
+    # Ordering: each tournament (name and start date) must be one block of rows,
+    # and the blocks must follow the start dates.
+    # The rows left out do not split the blocks.
+    valid_rows = np.flatnonzero(valid)
+    if len(valid_rows) == 0:
+        return valid
+    keys = np.char.add(np.char.add(column["tournament"][valid_rows], "|"),
+                       column["start_date"][valid_rows])
+    block_start = np.r_[True, keys[1:] != keys[:-1]]
+    block_rows = valid_rows[block_start]
+    keys = keys[block_start]
+    _, first_block = np.unique(keys, return_index = True)
+    repeated_block = np.ones(len(block_rows), dtype = bool)
+    repeated_block[first_block] = False
+    add_issues(issues, file, block_rows[repeated_block], "tournament_contiguity", "warning",
+               "The tournament appeared before, separated from its other matches.")
+
+    block_days = column["start_date"][block_rows].astype("datetime64[D]").astype(np.int64)
+    latest_start = np.maximum.accumulate(block_days)
+    add_issues(issues, file,
+               block_rows[block_days < latest_start - CHRONOLOGY_TOLERANCE_DAYS],
+               "chronological_order", "warning",
+               "The tournament starts more than " + str(CHRONOLOGY_TOLERANCE_DAYS) +
+               " days before a previous one.")
+
+    return valid
+
+def summarize_issues(issues):
+    """
+    Assumes issues is a list of issues (see add_issues).
+    Returns a dictionary with the number of issues of each (severity, check).
+    """
+    summary = {}
+    for issue in issues:
+        key = (issue["severity"], issue["check"])
+        summary[key] = summary.get(key, 0) + 1
+
+    return summary
+
+def print_issues(issues, max_issues = 20):
+    """
+    Assumes issues is a list of issues (see add_issues).
+    Prints the number of issues of each kind and the first max_issues of them.
+    """
+    for (severity, check), n_issues in sorted(summarize_issues(issues).items()):
+        print(severity.ljust(8), check.ljust(24), n_issues)
+    for issue in issues[:max_issues]:
+        print(str(issue["file"]) + ":" + str(issue["line"]), issue["severity"], issue["check"],
+              "-", issue["message"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+def main():
+    print("Upset analytics module")
+
+import numpy as np
+import tennis_symbols as symbols
+
+# Lower edges of the rank-gap buckets (the gap between the WTA rankings of the
+# two players); the last bucket has no upper edge.
+RANK_GAP_EDGES = [1, 10, 25, 50, 100, 250, 500]
+
+# Order of the rows of the round table.
+ROUND_ORDER = ["First Round", "Second Round", "Third Round", "Fourth Round", "Fifth Round",
+               "Sixth Round", "Seventh Round", "Eighth Round", "Round Robin", "Quarterfinals",
+               "Semifinals", "Third Place", "Final"]
+
+# Groupings of the upset rates.
+DIMENSIONS = ["rank_gap", "round", "tournament", "year"]
+
+# Counts kept for each player, in this order.
+PLAYER_COUNTS = ["underdog_matches", "upset_wins", "favorite_matches", "upset_losses",
+                 "upset_wins_gap", "biggest_upset_gap"]
+
+def get_rank_gap_label(n_bucket, edges = RANK_GAP_EDGES):
+    """
+    Assumes n_bucket is the position of a bucket in edges.
+    Returns its label, e.g. "10-24" or "500+".
+    """
+    if n_bucket == len(edges) - 1:
+        return str(edges[n_bucket]) + "+"
+
+    return str(edges[n_bucket]) + "-" + str(edges[n_bucket + 1] - 1)
+
+def get_upset_columns(index, mask = None):
+    """
+    Assumes index is a dictionary as returned by tennis_filters.build_match_index
+    and mask is None or a boolean array selecting a subset of the matches.
+    Keeps the matches where both players were ranked with different rankings:
+    the favorite is the player with the better (lower) ranking, and the match is
+    an upset if the underdog won.
+    Returns a dictionary of arrays with one value per kept match: the "match"
+    (its position), "upset", the rank "gap", "underdog_id" and "favorite_id".
+    """
+    columns = index["columns"]
+    rated = (~np.isnan(columns["rank_1"]) & ~np.isnan(columns["rank_2"]) &
+             (columns["rank_1"] != columns["rank_2"]))
+    if mask is not None:
+        rated &= mask
+    match = np.flatnonzero(rated)
+    rank_1 = columns["rank_1"][match]
+    rank_2 = columns["rank_2"][match]
+    underdog_side = np.where(rank_1 > rank_2, 1, 2)
+
+    return {"match": match,
+            "upset": columns["winner_side"][match] == underdog_side,
+            "gap": np.abs(rank_1 - rank_2),
+            "underdog_id": np.where(underdog_side == 1, columns["player_1_id"][match],
+                                    columns["player_2_id"][match]),
+            "favorite_id": np.where(underdog_side == 1, columns["player_2_id"][match],
+                                    columns["player_1_id"][match])}
+
+def new_upset_counts():
+    """
+    Returns empty upset counts: a dictionary with, for each of DIMENSIONS, a
+    dictionary of [matches, upsets] keyed by group, and the "players" counts
+    (see PLAYER_COUNTS) keyed by player name.
+    """
+    counts = {dimension: {} for dimension in DIMENSIONS}
+    counts["players"] = {}
+
+    return counts
+
+def add_group_counts(group_counts, groups, upset, labels):
+    """
+    Assumes group_counts is a dictionary of [matches, upsets], groups is an
+    integer array with the group of each match, upset is a boolean array and
+    labels is a function that turns the array of distinct groups into a list
+    of keys.
+    Adds the matches and upsets of each group, counted in one pass.
+    """
+    distinct, inverse = np.unique(groups, return_inverse = True)
+    n_matches = np.bincount(inverse, minlength = len(distinct))
+    n_upsets = np.bincount(inverse, weights = upset, minlength = len(distinct))
+    for label, matches, upsets in zip(labels(distinct), n_matches.tolist(),
+                                      n_upsets.astype(np.int64).tolist()):
+        counts = group_counts.setdefault(label, [0, 0])
+        counts[0] += matches
+        counts[1] += upsets
+
+def update_upset_counts(counts, index, mask = None):
+    """
+    Assumes counts is a dictionary as returned by new_upset_counts, index is a
+    dictionary as returned by tennis_filters.build_match_index and mask selects
+    the matches to add (None for all of them).
+    The counts are sums, so a report can be refreshed after each round by
+    adding only the matches of that round.
+    Returns counts, with the matches added.
+    """
+    upsets = get_upset_columns(index, mask)
+    match = upsets["match"]
+    upset = upsets["upset"]
+    columns = index["columns"]
+    if len(match) == 0:
+        return counts
+
+    bucket = np.searchsorted(RANK_GAP_EDGES, upsets["gap"], side = "right") - 1
+    add_group_counts(counts["rank_gap"], bucket, upset, lambda groups: groups.tolist())
+    # The matches without a round (-1) are only left out of the round counts.
+    round_id = index["round_id"][match]
+    has_round = round_id >= 0
+    add_group_counts(counts["round"], round_id[has_round], upset[has_round],
+                     lambda groups: symbols.get_symbol_names(index["rounds"], groups.tolist()))
+    add_group_counts(counts["tournament"], columns["tournament_id"][match], upset,
+                     lambda groups: symbols.get_symbol_names(symbols.TOURNAMENTS,
+                                                             groups.tolist()))
+    add_group_counts(counts["year"], columns["year"][match], upset,
+                     lambda groups: groups.tolist())
+
+    # Player counts: each match is counted for its underdog and its favorite.
+    n_ids = int(max(upsets["underdog_id"].max(), upsets["favorite_id"].max())) + 1
+    player_counts = np.zeros((len(PLAYER_COUNTS), n_ids))
+    player_counts[0] = np.bincount(upsets["underdog_id"], minlength = n_ids)
+    player_counts[1] = np.bincount(upsets["underdog_id"], weights = upset, minlength = n_ids)
+    player_counts[2] = np.bincount(upsets["favorite_id"], minlength = n_ids)
+    player_counts[3] = np.bincount(upsets["favorite_id"], weights = upset, minlength = n_ids)
+    player_counts[4] = np.bincount(upsets["underdog_id"], weights = upsets["gap"] * upset,
+                                   minlength = n_ids)
+    np.maximum.at(player_counts[5], upsets["underdog_id"][upset], upsets["gap"][upset])
+
+    player_ids = np.flatnonzero(player_counts[0] + player_counts[2])
+    names = symbols.get_symbol_names(symbols.PLAYERS, player_ids.tolist())
+    for name, values in zip(names, player_counts[:, player_ids].T.tolist()):
+        if name not in counts["players"]:
+            counts["players"][name] = [0] * len(PLAYER_COUNTS)
+        player = counts["players"][name]
+        for n_count in range(len(PLAYER_COUNTS) - 1):
+            player[n_count] += values[n_count]
+        player[-1] = max(player[-1], values[-1])
+
+    return counts
+
+def get_upset_table(counts, dimension, min_matches = 1):
+    """
+    Assumes counts is a dictionary as returned by update_upset_counts and
+    dimension is one of DIMENSIONS.
+    Returns a list of [group, matches, upsets, upset rate] rows with at least
+    min_matches matches: the rank-gap buckets by gap, the rounds by ROUND_ORDER
+    and the tournaments and years in ascending order.
+    """
+    order = lambda label: label
+    if dimension == "round":
+        order = lambda label: (ROUND_ORDER.index(label) if label in ROUND_ORDER
+                               else len(ROUND_ORDER))
+
+    table = []
+    for label in sorted(counts[dimension], key = order):
+        matches, upsets = counts[dimension][label]
+        if matches >= min_matches:
+            if dimension == "rank_gap":
+                label = get_rank_gap_label(label)
+            table.append([label, matches, upsets, upsets / matches])
+
+    return table
+
+def get_upset_report(index, mask = None, min_matches = 1):
+    """
+    Assumes index is a dictionary as returned by tennis_filters.build_match_index
+    and mask is None or a boolean array selecting a subset of the matches (see
+    tennis_filters.get_filter_mask).
+    Returns a dictionary with the table of get_upset_table of each of DIMENSIONS.
+    """
+    counts = update_upset_counts(new_upset_counts(), index, mask)
+
+    return {dimension: get_upset_table(counts, dimension, min_matches)
+            for dimension in DIMENSIONS}
+
+def get_giant_killers(counts, min_upsets = 5, top = 20):
+    """
+    Assumes counts is a dictionary as returned by update_upset_counts.
+    Returns a list of dictionaries, one per player with at least min_upsets
+    upset wins, with the counts of PLAYER_COUNTS (the gap of the upset wins as
+    "mean_upset_gap" instead of its sum), the "underdog_win_rate" and the
+    "favorite_loss_rate", ordered by upset wins and with at most top players.
+    """
+    killers = []
+    for name, values in counts["players"].items():
+        player = dict(zip(PLAYER_COUNTS, values))
+        if player["upset_wins"] < min_upsets:
+            continue
+        player["mean_upset_gap"] = player.pop("upset_wins_gap") / player["upset_wins"]
+        player["underdog_win_rate"] = player["upset_wins"] / player["underdog_matches"]
+        player["favorite_loss_rate"] = (player["upset_losses"] / player["favorite_matches"]
+                                        if player["favorite_matches"] > 0 else 0.0)
+        for count in ["underdog_matches", "upset_wins", "favorite_matches", "upset_losses"]:
+            player[count] = int(player[count])
+        killers.append(dict(player = name, **player))
+
+    killers.sort(key = lambda player: (-player["upset_wins"], -player["underdog_win_rate"]))
+
+    return killers[:top]
+
+
+if __name__ == "__main__":
+    main()
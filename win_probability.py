@@ -0,0 +1,301 @@
+def main():
+    print("Win probability module")
+
+from datetime import datetime as dt, timedelta
+import numpy as np
+import tennis_data_manipulation as manip
+import tennis_symbols as symbols
+import rankings
+
+# Features of a pair of players (player 1 - player 2). All of them change sign
+# when the players are swapped, so the model (a logistic regression without
+# intercept) gives P(1 beats 2) = 1 - P(2 beats 1).
+#     "wbw": difference of the logarithms of their WbW scores.
+#     "winners_dont_lose": difference of their winners don't lose scores.
+#     "head_to_head": (wins of 1 - wins of 2) / (matches between them + 1).
+FEATURES = ["wbw", "winners_dont_lose", "head_to_head"]
+
+# Coefficients used before there are matches to fit the model.
+DEFAULT_COEFFICIENTS = np.array([1.0, 0.0, 0.0])
+
+def get_head_to_head_index(columns):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns.
+    Returns a dictionary with the sorted "keys" (winner, loser, end date) of all
+    the matches, coded as integers, and the number of "ids" used to code them,
+    so that the wins of a player over another up to any date are counted with
+    two binary searches.
+    """
+    n_ids = int(max(columns["winner_id"].max(initial = 0),
+                    columns["loser_id"].max(initial = 0))) + 1
+    days = int(columns["end_ordinal"].max(initial = 0)) + 1
+    keys = (columns["winner_id"] * n_ids + columns["loser_id"]) * days + columns["end_ordinal"]
+
+    return {"keys": np.sort(keys), "n_ids": n_ids, "days": days}
+
+def count_wins(index, winners, losers, ordinals):
+    """
+    Assumes index is a dictionary as returned by get_head_to_head_index and
+    winners, losers and ordinals are arrays of the same length.
+    Returns an integer array with the number of matches that each winner won
+    against each loser, among the matches ended on or before each date ordinal
+    (ids out of the index count 0).
+    """
+    known = ((winners >= 0) & (winners < index["n_ids"]) &
+             (losers >= 0) & (losers < index["n_ids"]))
+    pairs = np.where(known, winners * index["n_ids"] + losers, 0)
+    ordinals = np.minimum(ordinals, index["days"] - 1)
+    first = np.searchsorted(index["keys"], pairs * index["days"])
+    last = np.searchsorted(index["keys"], pairs * index["days"] + ordinals, side = "right")
+
+    return np.where(known, last - first, 0)
+
+def get_snapshot_scores(columns, round_numbers, date, n_weeks = 52, epsilon = 1e-4):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns, round_numbers is the array of
+    rankings.get_round_numbers and date is a datetime.
+    Computes the WbW and winners don't lose scores over the n_weeks before date,
+    with the matches ended strictly before it, so that the matches of a
+    tournament of a single day starting on date are not counted.
+    Returns a dictionary with the "wbw" log scores and "winners_dont_lose"
+    scores, as float arrays indexed by player id. Players without matches in the
+    window get the lowest WbW score and a winners don't lose score of 0.
+    """
+    n_ids = int(max(columns["player_1_id"].max(initial = 0),
+                    columns["player_2_id"].max(initial = 0))) + 1
+    last_date = date - timedelta(days = 1)
+    players, scores, _ = rankings.wbw_ranking_arrays(columns, weeks = n_weeks,
+                                                     start_date = last_date, epsilon = epsilon)
+    wbw = np.full(n_ids, np.log(scores.min()) if len(scores) > 0 else 0.0)
+    wbw[players] = np.log(scores)
+    players, scores, _ = rankings.winners_dont_lose_ranking_arrays(columns, round_numbers,
+                                                                   weeks = n_weeks,
+                                                                   start_date = last_date)
+    winners_dont_lose = np.zeros(n_ids)
+    winners_dont_lose[players] = scores
+
+    return {"wbw": wbw, "winners_dont_lose": winners_dont_lose}
+
+def get_pair_features(snapshot, head_to_head_index, player_1, player_2, ordinal):
+    """
+    Assumes snapshot is a dictionary as returned by get_snapshot_scores and
+    player_1 and player_2 are integer arrays of player ids (-1 for unknown
+    players). Ordinal is the date (integer ordinal) before which the head to
+    head matches are counted (those ended strictly before it).
+    Returns a float array of shape (number of pairs, number of FEATURES).
+    """
+    def lookup(values, players, missing):
+        inside = (players >= 0) & (players < len(values))
+        return np.where(inside, values[np.where(inside, players, 0)], missing)
+
+    wbw_missing = snapshot["wbw"].min(initial = 0)
+    ordinals = np.full(len(player_1), ordinal - 1)
+    wins_1 = count_wins(head_to_head_index, player_1, player_2, ordinals)
+    wins_2 = count_wins(head_to_head_index, player_2, player_1, ordinals)
+
+    return np.column_stack([lookup(snapshot["wbw"], player_1, wbw_missing) -
+                            lookup(snapshot["wbw"], player_2, wbw_missing),
+                            lookup(snapshot["winners_dont_lose"], player_1, 0) -
+                            lookup(snapshot["winners_dont_lose"], player_2, 0),
+                            (wins_1 - wins_2) / (wins_1 + wins_2 + 1)])
+
+def get_match_features(columns, round_numbers, first_year = 2008, n_weeks = 52,
+                       epsilon = 1e-4):
+    """
+    Assumes columns is a dictionary of arrays as returned by
+    tennis_data_manipulation.get_match_columns and round_numbers is the array
+    of rankings.get_round_numbers.
+    Computes the features of every match from first_year on, with the scores
+    and head to head matches known at the start date of its tournament (one
+    snapshot per start date).
+    Returns a dictionary with the "features" array, the "player_1_won" labels,
+    the "year" and the "start_ordinal" of each match.
+    """
+    head_to_head_index = get_head_to_head_index(columns)
+    rows = np.flatnonzero(columns["year"] >= first_year)
+    start_ordinals = columns["start_ordinal"][rows]
+    features = np.zeros((len(rows), len(FEATURES)))
+
+    for ordinal in np.unique(start_ordinals).tolist():
+        in_snapshot = start_ordinals == ordinal
+        snapshot = get_snapshot_scores(columns, round_numbers, dt.fromordinal(ordinal),
+                                       n_weeks = n_weeks, epsilon = epsilon)
+        features[in_snapshot] = get_pair_features(snapshot, head_to_head_index,
+                                                  columns["player_1_id"][rows[in_snapshot]],
+                                                  columns["player_2_id"][rows[in_snapshot]],
+                                                  ordinal)
+
+    return {"features": features, "player_1_won": columns["winner_side"][rows] == 1,
+            "year": columns["year"][rows], "start_ordinal": start_ordinals}
+
+def predict_probabilities(coefficients, features):
+    """
+    Assumes coefficients is an array with one value per feature and features is
+    an array of shape (number of pairs, number of features).
+    Returns the probability that player 1 wins each pair.
+    """
+    return 1 / (1 + np.exp(-(features @ coefficients)))
+
+def fit_coefficients(features, player_1_won, l2 = 1e-3, n_iterations = 25):
+    """
+    Assumes features is an array of shape (number of matches, number of features)
+    and player_1_won is a boolean array with the result of each match.
+    Fits the logistic regression (without intercept, with an l2 penalty) with
+    Newton's method.
+    Returns the array of coefficients (DEFAULT_COEFFICIENTS without matches).
+    """
+    if len(features) == 0:
+        return DEFAULT_COEFFICIENTS.copy()
+
+    # Each feature is scaled, so that the penalty treats all of them alike.
+    scale = features.std(axis = 0)
+    scale[scale == 0] = 1
+    x = features / scale
+    y = player_1_won.astype(float)
+    coefficients = np.zeros(x.shape[1])
+    for n_iteration in range(n_iterations):
+        p = predict_probabilities(coefficients, x)
+        gradient = x.T @ (p - y) + l2 * len(y) * coefficients
+        hessian = (x * (p * (1 - p))[:, None]).T @ x + l2 * len(y) * np.eye(x.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        coefficients -= step
+        if np.abs(step).max() < 1e-8:
+            break
+
+    return coefficients / scale
+
+def get_calibration(probabilities, outcomes, n_bins = 10):
+    """
+    Assumes probabilities is a float array of predicted probabilities and
+    outcomes is a boolean array with what happened.
+    Returns a dictionary with the "brier" score, the "log_loss", the "accuracy"
+    and the calibration table: for each of n_bins equal bins of probability,
+    the number of predictions ("bin_count"), their mean ("bin_predicted") and
+    the share of them that happened ("bin_observed", NaN for empty bins).
+    """
+    outcomes = outcomes.astype(float)
+    clipped = np.clip(probabilities, 1e-12, 1 - 1e-12)
+    bins = np.minimum((probabilities * n_bins).astype(int), n_bins - 1)
+    bin_count = np.bincount(bins, minlength = n_bins)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        bin_predicted = np.bincount(bins, probabilities, n_bins) / bin_count
+        bin_observed = np.bincount(bins, outcomes, n_bins) / bin_count
+
+    return {"n_matches": len(outcomes),
+            "brier": float(np.mean((probabilities - outcomes) ** 2)),
+            "log_loss": float(-np.mean(outcomes * np.log(clipped) +
+                                       (1 - outcomes) * np.log(1 - clipped))),
+            "accuracy": float(np.mean((probabilities > 0.5) == (outcomes == 1))),
+            "bin_count": bin_count, "bin_predicted": bin_predicted,
+            "bin_observed": bin_observed}
+
+def backtest(matches, first_year = 2008, last_year = 2021, n_weeks = 52, epsilon = 1e-4,
+             n_bins = 10):
+    """
+    Assumes matches is a list of dictionaries ordered by date, where each
+    dictionary is a match with its round added.
+    Replays the archive chronologically: the matches of each year from first_year
+    to last_year are predicted with the scores known at the start of their
+    tournament and with the coefficients fitted on the matches of the previous
+    years (DEFAULT_COEFFICIENTS for the first year).
+    Returns a dictionary with the calibration of all the predictions (see
+    get_calibration), the "years" with the calibration and "coefficients" of
+    each year, and the "probabilities" and "outcomes" of every match predicted.
+    """
+    columns = manip.get_match_columns(matches)
+    data = get_match_features(columns, rankings.get_round_numbers(matches),
+                              first_year = first_year, n_weeks = n_weeks, epsilon = epsilon)
+    in_range = data["year"] <= last_year
+    probabilities = np.full(len(data["year"]), np.nan)
+
+    years = {}
+    for year in range(first_year, last_year + 1):
+        train = data["year"] < year
+        test = data["year"] == year
+        coefficients = fit_coefficients(data["features"][train], data["player_1_won"][train])
+        probabilities[test] = predict_probabilities(coefficients, data["features"][test])
+        years[year] = dict(get_calibration(probabilities[test], data["player_1_won"][test],
+                                           n_bins = n_bins),
+                           coefficients = coefficients)
+
+    result = get_calibration(probabilities[in_range], data["player_1_won"][in_range],
+                             n_bins = n_bins)
+    result.update({"years": years, "probabilities": probabilities[in_range],
+                   "outcomes": data["player_1_won"][in_range]})
+    return result
+
+def print_backtest(result):
+    """
+    Assumes result is a dictionary as returned by backtest.
+    Prints the scores of each year and the calibration table.
+    """
+    for year, scores in result["years"].items():
+        print(year, str(scores["n_matches"]).rjust(6), "matches",
+              "brier", round(scores["brier"], 4), "log loss", round(scores["log_loss"], 4),
+              "accuracy", round(scores["accuracy"], 4))
+    print("All", str(result["n_matches"]).rjust(6), "matches",
+          "brier", round(result["brier"], 4), "log loss", round(result["log_loss"], 4),
+          "accuracy", round(result["accuracy"], 4))
+    n_bins = len(result["bin_count"])
+    for n_bin in range(n_bins):
+        print(str(round(n_bin / n_bins, 2)) + "-" + str(round((n_bin + 1) / n_bins, 2)),
+              str(result["bin_count"][n_bin]).rjust(6),
+              "predicted", round(result["bin_predicted"][n_bin], 3),
+              "observed", round(result["bin_observed"][n_bin], 3))
+
+def new_predictor(matches, coefficients = None, n_weeks = 52, epsilon = 1e-4):
+    """
+    Assumes matches is a list of dictionaries ordered by date, where each
+    dictionary is a match with its round added.
+    If coefficients is None, they are fitted on all the matches from the second
+    year of the archive on.
+    Returns a predictor: a dictionary with the "columns", "round_numbers" and
+    head to head index of the matches, the "coefficients", n_weeks and epsilon,
+    and a cache of the "snapshots" of scores already computed (by date).
+    """
+    columns = manip.get_match_columns(matches)
+    round_numbers = rankings.get_round_numbers(matches)
+    if coefficients is None:
+        data = get_match_features(columns, round_numbers,
+                                  first_year = int(columns["year"].min(initial = 0)) + 1,
+                                  n_weeks = n_weeks, epsilon = epsilon)
+        coefficients = fit_coefficients(data["features"], data["player_1_won"])
+
+    return {"columns": columns, "round_numbers": round_numbers,
+            "head_to_head": get_head_to_head_index(columns),
+            "coefficients": np.asarray(coefficients, dtype = float),
+            "n_weeks": n_weeks, "epsilon": epsilon, "snapshots": {}}
+
+def predict_win_probabilities(predictor, date, pairs):
+    """
+    Assumes predictor is a dictionary as returned by new_predictor, date is a
+    datetime and pairs is a list of (player_1, player_2) names.
+    Returns a float array with the probability that player 1 beats player 2 in
+    each pair, with the scores of the n_weeks before date and the head to head
+    matches ended before it. Unknown players are treated as players without
+    matches in the window.
+    """
+    ordinal = date.toordinal()
+    if ordinal not in predictor["snapshots"]:
+        predictor["snapshots"][ordinal] = get_snapshot_scores(predictor["columns"],
+                                                              predictor["round_numbers"], date,
+                                                              n_weeks = predictor["n_weeks"],
+                                                              epsilon = predictor["epsilon"])
+
+    def get_ids(names):
+        ids = [symbols.get_symbol_id(symbols.PLAYERS, name) for name in names]
+        return np.array([-1 if player_id == None else player_id for player_id in ids],
+                        dtype = np.int64)
+
+    player_1 = get_ids([pair[0] for pair in pairs])
+    player_2 = get_ids([pair[1] for pair in pairs])
+    features = get_pair_features(predictor["snapshots"][ordinal], predictor["head_to_head"],
+                                 player_1, player_2, ordinal)
+
+    return predict_probabilities(predictor["coefficients"], features)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime as dt, timedelta
+
+import comparisons
+import rankings
+import tennis_columnar as columnar
+import tennis_data_reading as reading
+import tennis_dates as dates
+import tennis_profiling as profiling
+import tennis_service as service
+import tennis_validation as validation
+
+DEFAULT_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Matches of this process, loaded once by load_job_matches (which is also the
+# initializer of the worker processes).
+JOB_DATA = {"source": None, "matches": None}
+
+def rating_ranking_list(matches, system, year = None, weeks = None, start_date = None):
+    """
+    Assumes matches is a list of dictionaries ordered by date and system is one
+    of rankings.RATING_SYSTEMS.
+    Returns the ranking list of rankings.rating_ranking at start_date, at the
+    end of year, or after all the matches if both are None. The ratings come
+    from all the matches until then, but only the players who played in the
+    window (the weeks before start_date, or the year) are ranked.
+    """
+    date = start_date
+    active_since = None
+    if date != None and weeks != None:
+        active_since = date - timedelta(weeks = weeks)
+    elif date == None and year != None:
+        date = dt(year, 12, 31)
+        active_since = dt(year, 1, 1)
+    state = rankings.update_ratings(matches, rankings.new_rating_state(system), until_date = date)
+
+    return rankings.rating_ranking(state, date, active_since = active_since)[0]
+
+# Rankings of the rank command, keyed by name. All of them take the list of
+# matches as first argument and the window as keyword arguments.
+RANKINGS = {"winners_win": rankings.winners_win_ranking,
+            "winners_dont_lose": rankings.winners_dont_lose_ranking,
+            "wbw": service.wbw_ranking_list,
+            "elo": lambda matches, **window: rating_ranking_list(matches, "elo", **window),
+            "glicko": lambda matches, **window: rating_ranking_list(matches, "glicko", **window)}
+
+def load_job_matches(data, cache = None):
+    """
+    Assumes data is a directory with the csv files of WTA matches ('%YYYY.csv')
+    and cache is None or the path of a columnar export (see tennis_columnar).
+    Loads the matches into JOB_DATA, unless they were already loaded from the
+    same source: from the cache if it exists, or from the csv files otherwise
+    (writing the cache if a path was given).
+    Returns the list of matches.
+    """
+    if JOB_DATA["source"] != (data, cache):
+        if cache != None and os.path.exists(cache):
+            with profiling.profile_stage("load_cache"):
+                matches = columnar.load_matches(cache)
+        else:
+            matches = reading.read_append_all_csvs(data)
+            if cache != None:
+                with profiling.profile_stage("write_cache"):
+                    columnar.export_matches(matches, cache)
+        JOB_DATA["matches"] = matches
+        JOB_DATA["source"] = (data, cache)
+
+    return JOB_DATA["matches"]
+
+def start_worker(data, cache, profile):
+    """
+    Initializer of the worker processes of the rank command: enables the
+    profiling if profile is True (discarding the records copied from the parent
+    process) and loads the matches (see load_job_matches).
+    """
+    if profile:
+        profiling.enable_profiling()
+    load_job_matches(data, cache)
+
+def run_ranking(ranking, window):
+    """
+    Assumes ranking is a key of RANKINGS and window is a dictionary with the
+    year or the weeks and start date of the ranking.
+    Runs the ranking over the matches of this process.
+    Returns a list of [window label, player, score, ranking] rows.
+    """
+    if window.get("year") != None:
+        label = str(window["year"])
+    else:
+        label = window["start_date"].strftime("%Y-%m-%d")
+        if window.get("weeks") != None:
+            label += " (" + str(window["weeks"]) + " weeks)"
+
+    with profiling.profile_stage("ranking"):
+        rows = [[label] + list(row) for row in RANKINGS[ranking](JOB_DATA["matches"], **window)]
+
+    return rows
+
+def run_worker_ranking(ranking, window):
+    """
+    Runs run_ranking in a worker process.
+    Returns the rows and the profile stages recorded in the worker since its
+    previous task (empty if the profiling is disabled), which are then reset.
+    """
+    rows = run_ranking(ranking, window)
+    stages = profiling.PROFILE["stages"]
+    profiling.PROFILE["stages"] = {}
+
+    return rows, stages
+
+def get_windows(arguments):
+    """
+    Assumes arguments are the parsed arguments of the rank command.
+    Returns the list of windows to rank: one per year, or one per start date
+    (with the weeks before it).
+    """
+    if arguments.years != None:
+        return [{"year": year} for year in arguments.years]
+
+    return [{"start_date": dates.parse_iso_date(start_date), "weeks": arguments.weeks}
+            for start_date in arguments.start_dates]
+
+def is_iso_date(date_string):
+    """
+    Assumes date_string is a string.
+    Returns True if it is a date with the format '%Y-%m-%d'.
+    """
+    try:
+        dt.strptime(date_string, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return len(date_string) == 10
+
+def validate_arguments(parser, arguments):
+    """
+    Assumes parser is the parser of the command line and arguments are the
+    arguments it parsed.
+    Checks the values that argparse cannot check, exiting with a usage error
+    (see argparse.ArgumentParser.error) if one is wrong.
+    """
+    if arguments.command == "rank":
+        if arguments.years == None and arguments.start_dates == None:
+            parser.error("the rank command needs --years or --start-dates")
+        for start_date in arguments.start_dates or []:
+            if not is_iso_date(start_date):
+                parser.error("the start date " + start_date + " is not '%Y-%m-%d'")
+        if arguments.workers < 1:
+            parser.error("--workers must be at least 1")
+    if arguments.command in ["rank", "compare"] and arguments.weeks <= 0:
+        parser.error("--weeks must be positive")
+    if arguments.command == "query":
+        try:
+            query_arguments = json.loads(arguments.arguments)
+        except ValueError:
+            parser.error("the arguments of the query are not valid json")
+        if not isinstance(query_arguments, dict):
+            parser.error("the arguments of the query should be a json object")
+        for argument in service.DATE_ARGUMENTS:
+            value = query_arguments.get(argument)
+            if isinstance(value, str) and not is_iso_date(value):
+                parser.error("the " + argument + " " + value + " is not '%Y-%m-%d'")
+
+def write_rows(rows, header, output = None):
+    """
+    Assumes rows is a list of lists, header is the list of their column names
+    and output is None (standard output, as csv) or the path of a '.json' file
+    (a list of dictionaries) or of a csv file.
+    Writes the rows.
+    """
+    if output != None and output.endswith(".json"):
+        with open(output, "w") as f:
+            json.dump([dict(zip(header, row)) for row in rows], f, indent = 2)
+        return
+
+    f = open(output, "w", newline = "") if output != None else sys.stdout
+    try:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    finally:
+        if output != None:
+            f.close()
+
+def ingest(arguments):
+    """
+    Reads and validates the csv files, writes the columnar cache if asked and
+    prints a summary of the matches and the issues found.
+    """
+    issues = []
+    matches = reading.read_append_all_csvs(arguments.data, issues = issues)
+    if arguments.cache != None:
+        with profiling.profile_stage("write_cache", len(matches)):
+            file_format = columnar.export_matches(matches, arguments.cache)
+        print("Cache written to", arguments.cache, "(" + file_format + ")")
+
+    if matches != []:
+        years = sorted(set(match["year"] for match in matches))
+        print(len(matches), "matches from", years[0], "to", years[-1])
+    else:
+        print("No matches were read from", arguments.data)
+    validation.print_issues(issues, arguments.max_issues)
+    if arguments.output != None:
+        header = ["file", "line", "check", "severity", "message"]
+        write_rows([[issue[column] for column in header] for issue in issues], header,
+                   arguments.output)
+
+    if any(issue["severity"] == "error" for issue in issues) and arguments.strict:
+        return 1
+    return 0
+
+def rank(arguments):
+    """
+    Computes the ranking of each window, in parallel with arguments.workers
+    processes, and writes the rows. The profile stages of the workers are
+    merged into the report of this process.
+    """
+    windows = get_windows(arguments)
+    load_job_matches(arguments.data, arguments.cache)
+    if arguments.workers > 1 and len(windows) > 1:
+        # Each worker process loads its own copy of the matches once.
+        with ProcessPoolExecutor(max_workers = arguments.workers, initializer = start_worker,
+                                 initargs = (arguments.data, arguments.cache,
+                                             profiling.PROFILE["enabled"])) as pool:
+            results = []
+            for rows, stages in pool.map(run_worker_ranking, [arguments.ranking] * len(windows),
+                                         windows):
+                results.append(rows)
+                profiling.merge_profile_stages(stages)
+    else:
+        results = [run_ranking(arguments.ranking, window) for window in windows]
+
+    rows = [row for result in results for row in result]
+    write_rows(rows, ["window", "player", "score", "ranking"], arguments.output)
+    return 0
+
+def compare(arguments):
+    """
+    Compares the WTA and WbW rankings of each player at each tournament (see
+    comparisons.compare_wta_wbw_rankings) and writes the rows.
+    """
+    matches = load_job_matches(arguments.data, arguments.cache)
+    comparison = comparisons.compare_wta_wbw_rankings(matches, year = arguments.year,
+                                                      n_weeks = arguments.weeks,
+                                                      epsilon = arguments.epsilon,
+                                                      checkpoint = arguments.checkpoint)
+    rows = [[year, None if wta != wta else wta, None if wbw != wbw else wbw]
+            for year, wta, wbw in zip(comparison["year"].tolist(),
+                                      comparison["wta_ranking"].tolist(),
+                                      comparison["wbw_ranking"].tolist())]
+    write_rows(rows, ["year", "wta_ranking", "wbw_ranking"], arguments.output)
+    return 0
+
+def query(arguments):
+    """
+    Runs a query of tennis_service.SERVICE_FUNCTIONS with arguments given as a
+    json object (dates as '%Y-%m-%d' strings) and writes its result as json.
+    """
+    query_arguments = json.loads(arguments.arguments)
+    for argument in service.DATE_ARGUMENTS:
+        if isinstance(query_arguments.get(argument), str):
+            query_arguments[argument] = dates.parse_iso_date(query_arguments[argument])
+    matches = load_job_matches(arguments.data, arguments.cache)
+    result = service.SERVICE_FUNCTIONS[arguments.function](matches, **query_arguments)
+
+    if arguments.output != None:
+        with open(arguments.output, "w") as f:
+            json.dump(result, f, indent = 2)
+    else:
+        print(json.dumps(result, indent = 2))
+    return 0
+
+COMMANDS = {"ingest": ingest, "rank": rank, "compare": compare, "query": query}
+
+def main(argv = None):
+    # The common options are accepted after any command.
+    common = argparse.ArgumentParser(add_help = False)
+    common.add_argument("--data", default = DEFAULT_DATA,
+                        help = "directory with the csv files of the matches")
+    common.add_argument("--cache", default = None,
+                        help = "columnar export of the matches, read instead of the csv files "
+                               "if it exists and written otherwise")
+    common.add_argument("--output", default = None,
+                        help = "csv or '.json' file of the results (standard output by default)")
+    common.add_argument("--profile", action = "store_true",
+                        help = "report the time of each stage on the standard error")
+    common.add_argument("--profile-output", default = None,
+                        help = "json file where the profile report is also written")
+    parser = argparse.ArgumentParser(prog = "python -m wta",
+                                     description = "Batch jobs of the WTA tennis software.")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    ingest_parser = commands.add_parser("ingest", parents = [common],
+                                        help = "read, validate and cache the csv files")
+    ingest_parser.add_argument("--max-issues", type = int, default = 20,
+                               help = "issues printed (all of them are written to --output)")
+    ingest_parser.add_argument("--strict", action = "store_true",
+                               help = "exit with an error if any row could not be loaded")
+
+    rank_parser = commands.add_parser("rank", parents = [common],
+                                      help = "compute rankings over windows of matches")
+    rank_parser.add_argument("--ranking", choices = list(RANKINGS), default = "wbw")
+    rank_parser.add_argument("--years", type = int, nargs = "+", default = None)
+    rank_parser.add_argument("--start-dates", nargs = "+", default = None,
+                             help = "dates ('%%Y-%%m-%%d') of the rankings over --weeks")
+    rank_parser.add_argument("--weeks", type = int, default = 52,
+                             help = "weeks before each start date; the elo and glicko ratings "
+                                    "use all the previous matches, but only rank the players "
+                                    "who played in them (in the year for --years)")
+    rank_parser.add_argument("--workers", type = int, default = 1,
+                             help = "processes computing the windows in parallel (their "
+                                    "stages are added to the --profile report)")
+
+    compare_parser = commands.add_parser("compare", parents = [common],
+                                         help = "compare the WTA and WbW rankings")
+    compare_parser.add_argument("--year", type = int, default = 2008)
+    compare_parser.add_argument("--weeks", type = int, default = 52)
+    compare_parser.add_argument("--epsilon", type = float, default = 1e-4)
+    compare_parser.add_argument("--checkpoint", default = None,
+                                help = "'.npz' file to resume the snapshots from")
+
+    query_parser = commands.add_parser("query", parents = [common],
+                                       help = "run one of the queries of the service")
+    query_parser.add_argument("function", choices = list(service.SERVICE_FUNCTIONS))
+    query_parser.add_argument("arguments", nargs = "?", default = "{}",
+                              help = "json object with the arguments of the query")
+    arguments = parser.parse_args(argv)
+    validate_arguments(parser, arguments)
+
+    if arguments.profile or arguments.profile_output != None:
+        profiling.enable_profiling()
+    with profiling.profile_stage(arguments.command):
+        status = COMMANDS[arguments.command](arguments)
+    if arguments.profile:
+        with contextlib.redirect_stdout(sys.stderr):
+            profiling.print_profile_report()
+    if arguments.profile_output != None:
+        profiling.write_profile_report(arguments.profile_output)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())